@@ -0,0 +1,220 @@
+import io
+import os
+import json
+import mmap
+import zlib
+import hashlib
+import shutil
+import logging
+import tempfile
+import threading
+import urllib.parse
+
+# records http traffic to a directory and plays it back
+#
+# --record (directory) saves every response helpers.sendRequest gets.
+# --replay (directory) answers every request from the recording instead of
+# the network. the bodies are appended to archive.dat, compressed when that
+# helps. archive.idx has one json line per response with its position in
+# archive.dat. if the same request was made more than once, the recorded
+# responses are played back in the same order. streamed downloads are copied
+# as they're read instead of all at once before.
+
+class ReplayResponse:
+    # just enough of requests.Response for this app
+    def __init__(self, url, statusCode, headers, content):
+        from requests.structures import CaseInsensitiveDict
+
+        self.url = url
+        self.status_code = statusCode
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = None
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class HttpArchive:
+    def getKey(self, method, url, data):
+        if isinstance(data, dict):
+            data = urllib.parse.urlencode(sorted(data.items()))
+        elif isinstance(data, bytes):
+            data = data.decode('utf-8', errors='replace')
+
+        return hashlib.sha1(f'{method} {url} {data or ""}'.encode('utf-8')).hexdigest()
+
+    def record(self, method, url, data, response, stream=False):
+        if stream:
+            self.recordStream(method, url, data, response)
+            return
+
+        content = response.content
+
+        compressed = zlib.compress(content, 1)
+        isCompressed = len(compressed) < len(content)
+
+        if isCompressed:
+            content = compressed
+
+        self.addEntry(method, url, data, response, io.BytesIO(content), len(content), isCompressed)
+
+    # copies the body as the caller reads it, so it still sees each chunk as it arrives
+    def recordStream(self, method, url, data, response):
+        body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        state = {'done': False}
+
+        iterContent = response.iter_content
+        close = response.close
+
+        def finish(failed):
+            if state['done']:
+                return
+
+            state['done'] = True
+
+            try:
+                # a body that broke off part way isn't recorded, so replaying it fails too
+                if not failed:
+                    body.seek(0, os.SEEK_END)
+                    length = body.tell()
+                    body.seek(0)
+
+                    # pdf files are compressed already
+                    self.addEntry(method, url, data, response, body, length, False)
+            finally:
+                body.close()
+
+        def recordingIterContent(chunk_size=1, decode_unicode=False):
+            try:
+                for chunk in iterContent(chunk_size, decode_unicode):
+                    body.write(chunk)
+                    yield chunk
+            except Exception:
+                finish(True)
+                raise
+
+            finish(False)
+
+        # the caller can stop reading early, like after the first bytes of something that isn't a pdf
+        def recordingClose():
+            try:
+                close()
+            finally:
+                finish(False)
+
+        response.iter_content = recordingIterContent
+        response.close = recordingClose
+
+    # file is the body, already compressed if isCompressed
+    def addEntry(self, method, url, data, response, file, length, isCompressed):
+        entry = {
+            'key': self.getKey(method, url, data),
+            'method': method,
+            'url': url,
+            'status': response.status_code,
+            'contentType': response.headers.get('content-type', ''),
+            'offset': 0,
+            'length': length,
+            'compressed': isCompressed
+        }
+
+        with self.lock:
+            entry['offset'] = self.dataFile.tell()
+
+            shutil.copyfileobj(file, self.dataFile)
+            self.dataFile.flush()
+
+            self.indexFile.write(json.dumps(entry) + '\n')
+            self.indexFile.flush()
+
+    def replay(self, method, url, data):
+        key = self.getKey(method, url, data)
+
+        with self.lock:
+            entries = self.index.get(key)
+
+            if not entries:
+                raise Exception(f'Not in the archive: {method} {url}')
+
+            # same order as when it was recorded. keep repeating the last one.
+            count = self.replayCounts.get(key, 0)
+            self.replayCounts[key] = count + 1
+
+            entry = entries[min(count, len(entries) - 1)]
+
+        content = self.data[entry['offset']:entry['offset'] + entry['length']] if self.data else b''
+
+        if entry['compressed']:
+            content = zlib.decompress(content)
+
+        return ReplayResponse(url, entry['status'], {'content-type': entry['contentType']}, content)
+
+    def load(self):
+        with open(self.indexFileName, encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+
+                try:
+                    entry = json.loads(line)
+                except Exception as e:
+                    # the last line can be incomplete if the recording was interrupted
+                    logging.error(e)
+                    continue
+
+                self.index.setdefault(entry['key'], []).append(entry)
+
+        self.dataFile = open(self.dataFileName, 'rb')
+
+        if os.path.getsize(self.dataFileName) > 0:
+            self.data = mmap.mmap(self.dataFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        logging.info(f'Replaying {sum(len(entries) for entries in self.index.values())} responses from {self.directory}')
+
+    def close(self):
+        if self.data:
+            self.data.close()
+
+        if self.dataFile:
+            self.dataFile.close()
+
+        if self.indexFile:
+            self.indexFile.close()
+
+    def __init__(self, directory, mode):
+        self.directory = directory
+        self.mode = mode
+        self.dataFileName = os.path.join(directory, 'archive.dat')
+        self.indexFileName = os.path.join(directory, 'archive.idx')
+
+        self.lock = threading.Lock()
+        self.index = {}
+        self.replayCounts = {}
+        self.data = None
+        self.dataFile = None
+        self.indexFile = None
+
+        if mode == 'record':
+            os.makedirs(directory, exist_ok=True)
+
+            # adds to an existing recording
+            self.dataFile = open(self.dataFileName, 'ab')
+            self.indexFile = open(self.indexFileName, 'a', encoding='utf-8')
+
+            logging.info(f'Recording http traffic to {directory}')
+        else:
+            self.load()
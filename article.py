@@ -0,0 +1,97 @@
+import sys
+import json
+import tempfile
+import threading
+
+# one search result
+#
+# the large text fields can be moved to a SpillFile while the article waits
+# to be downloaded and freed once it's logged. siteName and keyword are
+# interned because every article of a search shares them.
+class Article:
+    __slots__ = ['articleId', 'pdfUrl', 'title', 'dateSubmitted', 'siteName', 'keyword', 'abstract', 'allAuthors', 'allLocations', 'firstAuthor', 'firstAuthorLocation', 'lastAuthor', 'lastAuthorLocation', 'citations', 'spillOffset', 'spillLength']
+
+    # the fields worth moving to disk
+    largeFields = ['abstract', 'allAuthors', 'allLocations', 'citations']
+
+    # the columns after "FileNamePath" in the pdf log
+    detailFields = ['allAuthors', 'allLocations', 'firstAuthor', 'firstAuthorLocation', 'lastAuthor', 'lastAuthorLocation', 'citations']
+
+    def getDetails(self):
+        return [getattr(self, field) or '' for field in self.detailFields]
+
+    # call after it's logged
+    def release(self):
+        for field in self.largeFields:
+            setattr(self, field, None)
+
+        self.spillOffset = -1
+        self.spillLength = 0
+
+    # details is a dictionary with the keys in detailFields
+    def __init__(self, articleId, pdfUrl, title='', dateSubmitted='', abstract='', details=None, siteName='', keyword=''):
+        if not details:
+            details = {}
+
+        self.articleId = articleId
+        self.pdfUrl = pdfUrl
+        self.title = title
+        self.dateSubmitted = dateSubmitted or ''
+        self.siteName = sys.intern(siteName)
+        self.keyword = sys.intern(keyword)
+        self.abstract = abstract
+
+        for field in self.detailFields:
+            setattr(self, field, details.get(field, ''))
+
+        self.spillOffset = -1
+        self.spillLength = 0
+
+# temporary file that holds the large fields of articles waiting to be downloaded
+class SpillFile:
+    def spill(self, article):
+        values = {field: getattr(article, field) for field in Article.largeFields}
+
+        data = json.dumps(values).encode('utf-8')
+
+        # not worth it
+        if len(data) < self.minimumBytes:
+            return
+
+        with self.lock:
+            self.file.seek(0, 2)
+
+            article.spillOffset = self.file.tell()
+            article.spillLength = len(data)
+
+            self.file.write(data)
+
+        for field in Article.largeFields:
+            setattr(article, field, None)
+
+    def restore(self, article):
+        if article.spillOffset < 0:
+            return
+
+        with self.lock:
+            self.file.seek(article.spillOffset)
+
+            data = self.file.read(article.spillLength)
+
+        values = json.loads(data.decode('utf-8'))
+
+        for field in Article.largeFields:
+            setattr(article, field, values.get(field, ''))
+
+        article.spillOffset = -1
+        article.spillLength = 0
+
+    def close(self):
+        self.file.close()
+
+    def __init__(self, minimumBytes=1000):
+        self.minimumBytes = minimumBytes
+        self.lock = threading.Lock()
+
+        # deleted when closed
+        self.file = tempfile.TemporaryFile()
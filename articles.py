@@ -8,6 +8,7 @@ import datetime
 import os
 import random
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import lxml.html as lh
 from pathlib import Path
@@ -15,94 +16,672 @@ import traceback
 import re
 import arxiv
 import helpers
+import metrics
+import concurrency
+import retries
+import transfers
+import transport
+import proxypool
 from database import Database
 from helpers import Api
 from helpers import Downloader
+from verify import PdfVerifier
+from scihub import SciHubPool
+from profiling import Profiler
+from archive import HttpArchive
+from article import Article, SpillFile
+from searchindex import SearchIndex
+from biorxivapi import BiorxivApi
+from outputlayout import OutputLayout
+from blobstore import BlobStore
+from budget import Budget
+from planner import Planner
+
+# the arxiv library fetches the feed itself. this sends its requests through helpers.sendRequest instead.
+class ArxivSearch(arxiv.arxiv.Search):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # a recording doesn't need arxiv's pause between requests
+        if helpers.httpArchive and helpers.httpArchive.mode == 'replay':
+            self.time_sleep = 0
+
+    def _parse(self, url):
+        import feedparser
+
+        try:
+            response = helpers.sendRequest('GET', url, 'arxiv')
+        except Exception as e:
+            logging.error(e)
+            return []
+
+        if response.status_code != 200:
+            logging.error(f'HTTP error {response.status_code} in arxiv query')
+            return []
+
+        return feedparser.parse(response.content)['entries']
 
 class Articles:
     def run(self):
         self.initialize()
 
-        # go through each site
-        for item in self.sites:
-            self.doItem(item)
-            self.onItemIndex += 1
+        if '--verify' in sys.argv:
+            verifier = PdfVerifier(self.options['outputDirectory'], self.options['verifyProcesses'])
+            verifier.run()
+            self.cleanUp()
+            return
+
+        if ('--query' in sys.argv or '--index' in sys.argv) and not self.searchIndex:
+            logging.error('No searchIndexFile in options.ini')
+            self.cleanUp()
+            return
+
+        if '--query' in sys.argv:
+            self.searchIndex.printMatches(helpers.getArgument('--query', True), self.options['searchIndexQueryLimit'])
+            self.cleanUp()
+            return
+
+        if '--plan' in sys.argv:
+            self.printPlan()
+            self.cleanUp()
+            return
+
+        if '--migrate' in sys.argv:
+            self.migrateOutputDirectory()
+            self.cleanUp()
+            return
+
+        if '--collect-garbage' in sys.argv:
+            self.blobStore.collectGarbage()
+            self.cleanUp()
+            return
+
+        if '--index' in sys.argv:
+            self.searchIndex.addCsvFile(os.path.join(self.options['outputDirectory'], 'output_pdf_log.csv'))
+            self.cleanUp()
+            return
+
+        if '--profile' in sys.argv:
+            self.profiler = Profiler('logs', self.logSuffix, self.options['profileSampleMilliseconds'])
+            self.profiler.wrap(self, ['getGenericSearchPage', 'getInformationFromDetailsPage', 'getNihPage', 'getNihDetails', 'arxivSearch'])
+            # batch and id list runs call the parts of outputResult separately, with the downloads in other threads
+            self.profiler.wrap(self, ['outputResult', 'prepareOutput', 'downloadPdf', 'finishOutput'], 'outputResult')
+            self.profiler.start()
+
+        if self.budget.isEnabled():
+            self.doJobsByPriority()
+        else:
+            # go through each site
+            for item in self.sites:
+                self.doItem(item)
+                self.onItemIndex += 1
 
         self.cleanUp()
 
     def doItem(self, item):
-        inputType = 'search terms'
+        self.onKeywordIndex = 0
+
+        if self.isWholeSiteJob(item):
+            self.doWholeSiteJob(item)
+            return
+
+        self.keywords = self.readInputFile(item, 'search terms')
 
-        if self.options.get('useIdLists', ''):
-            inputType = 'ID list'
+        for keyword in self.keywords:
+            if self.budget.shouldStop():
+                break
+
+            self.doKeyword(item, keyword)
+
+            self.onKeywordIndex += 1
+
+    # with a time or download budget. the site and keyword combinations expected to get the most new results per second go first.
+    def doJobsByPriority(self):
+        jobs = []
+
+        for siteIndex, item in enumerate(self.sites):
+            siteName = helpers.getDomainName(item.get('url', ''))
+
+            if self.isWholeSiteJob(item):
+                jobs.append((siteName, '', (siteIndex, item, None, 0)))
+                continue
+
+            keywords = self.readInputFile(item, 'search terms')
+
+            for keywordIndex, keyword in enumerate(keywords):
+                jobs.append((siteName, keyword, (siteIndex, item, keywords, keywordIndex)))
+
+        jobs = self.budget.sortJobs(jobs)
+
+        completedCount = 0
+
+        for siteName, keyword, (siteIndex, item, keywords, keywordIndex) in jobs:
+            if self.budget.shouldStop():
+                break
+
+            self.onItemIndex = siteIndex
+
+            if keywords is None:
+                self.doWholeSiteJob(item)
+            else:
+                self.keywords = keywords
+                self.onKeywordIndex = keywordIndex
+
+                self.doKeyword(item, keyword)
+
+            # a job the budget interrupted isn't marked done
+            if not self.budget.stopped:
+                completedCount += 1
+
+        if completedCount < len(jobs):
+            logging.info(f'Did {completedCount} of {len(jobs)} site and search term combinations. The rest are left for the next run.')
+
+    # id lists and pubmed fan-in go through all of a site's input at once
+    def isWholeSiteJob(self, item):
+        if self.options['useIdLists']:
+            return True
+
+        return self.options['pubmedFanIn'] and helpers.getDomainName(item.get('url', '')) == 'nih.gov'
+
+    def doWholeSiteJob(self, item):
+        siteName = helpers.getDomainName(item.get('url', ''))
 
         self.onKeywordIndex = 0
-        self.keywords = self.readInputFile(item, inputType)
+
+        self.budget.startJob()
+
+        if self.options['useIdLists'] and self.options['idListBatchSize'] > 0:
+            self.doIdListInBatches(item)
+        elif self.options['useIdLists']:
+            self.keywords = self.readInputFile(item, 'ID list')
+
+            for keyword in self.keywords:
+                if self.budget.shouldStop():
+                    break
+
+                self.doKeyword(item, keyword)
+
+                self.onKeywordIndex += 1
+        else:
+            self.keywords = self.readInputFile(item, 'search terms')
+
+            self.doNihFanIn(item)
+
+        self.budget.finishJob(siteName, '')
+
+    def doKeyword(self, item, keyword):
+        self.showStatus(item, keyword)
+
+        # already done?
+        if self.isDone(item, keyword):
+            return
+
+        siteName = helpers.getDomainName(item.get('url', ''))
+
+        # each id would be its own job otherwise
+        isSearch = not self.options['useIdLists']
+
+        if isSearch:
+            self.budget.startJob()
+
+        try:
+            # do the search and download the results
+            self.lookUpItem(item, keyword)
+
+            # the rest of it is left for the next run
+            if not self.budget.stopped and not self.searchFailed:
+                self.markDone(item, keyword)
+        except Exception as e:
+            # if something goes wrong, we just go to next keyword
+            logging.error(f'Skipping. Something went wrong.')
+            logging.debug(traceback.format_exc())                
+            logging.error(e)
+
+        if isSearch:
+            self.budget.finishJob(siteName, keyword)
+
+    # reads the id list a batch at a time without loading the whole file. each batch is looked up with a few requests
+    # and downloaded in parallel while the next batch is looked up.
+    def doIdListInBatches(self, site):
+        siteName = helpers.getDomainName(site.get('url', ''))
+        fileName = self.getInputFileName(site, 'ID list')
+
+        self.requeuedArticles = []
+        self.keywords = []
+
+        idCount = 0
+        resultCount = 0
+
+        # the batch that's downloading. its ids and what startDownloads returned.
+        pendingIds = []
+        pending = []
+
+        with ThreadPoolExecutor(max(1, self.options['downloadThreads'])) as executor:
+            for batchIndex, batch in enumerate(helpers.getLinesInBatches(fileName, self.options['idListBatchSize'])):
+                # the batches that aren't marked done are left for the next run
+                if self.budget.shouldStop():
+                    break
+
+                idCount += len(batch)
+
+                ids = self.getIdsNotDone(siteName, batch)
+
+                logging.info('Site %d of %d: %s. Batch %d: %d IDs. %d already done. %d IDs so far.', self.onItemIndex + 1, len(self.sites), siteName, batchIndex + 1, len(batch), len(batch) - len(ids), idCount)
+
+                articles = []
+                lookedUp = False
+
+                if ids:
+                    try:
+                        articles = self.getArticlesForIds(site, siteName, ids)
+                        lookedUp = True
+                    except Exception as e:
+                        # the batch isn't marked done, so the next run tries it again
+                        logging.error(f'Skipping batch {batchIndex + 1}. Something went wrong.')
+                        logging.debug(traceback.format_exc())
+                        logging.error(e)
+
+                    self.totalResults = len(articles)
+                    self.logToCsvFiles(site, os.path.basename(fileName), -1, None, '', False, True, False)
+
+                    metrics.registry.increment('results_total', {'site': siteName}, len(articles))
+
+                resultCount += len(articles)
+
+                self.finishBatch(site, siteName, pending, pendingIds)
+
+                pending = self.startDownloads(site, articles, executor)
+                pendingIds = ids if lookedUp else []
+
+            self.finishBatch(site, siteName, pending, pendingIds)
+
+        # they're only done once they're downloaded or failed for good
+        self.markIdsDone(siteName, self.outputRequeuedArticles(site))
+
+        logging.info(f'{idCount} IDs in {fileName}. {resultCount} results.')
+
+    # marks the ids of a batch done except the ones that will be tried again at the end
+    def finishBatch(self, site, siteName, pending, ids):
+        requeuedIds = set(self.finishDownloads(site, pending))
+
+        self.markIdsDone(siteName, [item for item in ids if not item in requeuedIds])
+
+    # returns a list of (id, article)
+    def getArticlesForIds(self, site, siteName, ids):
+        if siteName == 'nih.gov':
+            return self.getNihArticlesForIds(site, ids)
+        elif siteName == 'arxiv.org':
+            return self.getArxivArticlesForIds(site, ids)
+
+        siteData = self.getSiteData(siteName, '')
+
+        if not siteData:
+            raise Exception(f'Can\'t look up ID\'s on {siteName}')
+
+        items = [(f"{siteData['urlPrefix']}/content/10.1101/{articleId}", articleId, '') for articleId in ids]
+
+        informationList = self.getInformationList(siteData, items)
+
+        results = []
+
+        for (url, articleId, title), information in zip(items, informationList):
+            logging.info('Results: %d. Url: %s. Title: %s.', len(results) + 1, url, self.getShortTitle(information.get('title', '')))
+
+            results.append((articleId, Article(articleId, url + '.full.pdf', information.get('title', ''), information.get('dateSubmitted'), information.get('abstract', ''), information, site.get('name', ''), articleId)))
+
+        return results
+
+    # a long list of ids would make the url too long. ncbi asks for a post then.
+    def getEutilsForIds(self, api, utility, ids, returnMode):
+        url = f'/entrez/eutils/{utility}.fcgi'
+        idString = ','.join(ids)
+
+        if len(ids) <= 200:
+            return api.get(f'{url}?db=pubmed&id={idString}&retmode={returnMode}', utility)
+
+        data = {
+            'db': 'pubmed',
+            'id': idString,
+            'retmode': returnMode
+        }
+
+        return api.post(url, data, returnMode == 'json', utility)
+
+    # one esummary request and one efetch request for all the ids
+    def getNihArticlesForIds(self, site, ids):
+        import xmltodict
+
+        api = Api('http://eutils.ncbi.nlm.nih.gov')
+
+        summaryResponse = self.getEutilsForIds(api, 'esummary', ids, 'json')
+
+        if not isinstance(summaryResponse, dict) or not 'result' in summaryResponse:
+            raise Exception('No response from esummary')
+
+        response = self.getEutilsForIds(api, 'efetch', ids, 'xml')
+
+        if not response:
+            raise Exception('No response from efetch')
+
+        pubmedArticles = helpers.getNested(xmltodict.parse(response), ['PubmedArticleSet', 'PubmedArticle'])
+
+        # a dictionary for one result. list for more than one.
+        if not isinstance(pubmedArticles, list):
+            pubmedArticles = [pubmedArticles]
+
+        pubmedArticlesById = {}
+
+        for pubmedArticle in pubmedArticles:
+            articleId = helpers.getNested(pubmedArticle, ['MedlineCitation', 'PMID'])
+
+            if isinstance(articleId, dict):
+                articleId = articleId.get('#text', '')
+
+            pubmedArticlesById[articleId] = pubmedArticle
+
+        pdfUrls = self.getPdfUrlsFromSciHub(site, ids)
+
+        results = []
+
+        for item, pdfUrl in zip(ids, pdfUrls):
+            try:
+                title = ''
+                abstract = ''
+                dateSubmitted = ''
+                details = {}
+
+                articleSummary = summaryResponse['result'].get(item)
+
+                if articleSummary and item in pubmedArticlesById:
+                    title = articleSummary.get('title', '')
+
+                    dateSubmitted = articleSummary.get('sortpubdate', '')
+                    dateSubmitted = helpers.findBetween(dateSubmitted, '', ' ')
+                    dateSubmitted = dateSubmitted.replace('/', '-')
+
+                    details = self.getNihDetailsFromXml(pubmedArticlesById[item], articleSummary)
+
+                    abstract = details.get('abstract', '')
+
+                    logging.info('Results: %d. Id: %s. Title: %s.', len(results) + 1, item, self.getShortTitle(title))
+
+                    self.logNihResultToCsvFile(site, item, articleSummary, details)
+                else:
+                    logging.error(f'{item} isn\'t in pubmed')
+
+                if not pdfUrl:
+                    continue
+
+                results.append((item, Article(item, pdfUrl, title, dateSubmitted, abstract, details, site.get('name', ''), item)))
+            except Exception as e:
+                logging.error(f'Skipping {item}. Something went wrong.')
+                logging.debug(traceback.format_exc())
+                logging.error(e)
+
+        return results
+
+    # one api request for all the ids
+    def getArxivArticlesForIds(self, site, ids):
+        search = ArxivSearch(query='',
+                    id_list=','.join(ids),
+                    max_results=len(ids),
+                    start=0,
+                    sort_by="relevance",
+                    sort_order="descending",
+                    prune=True,
+                    max_chunk_results=len(ids))
+
+        # arxiv asks for a few seconds between requests. not when replaying.
+        secondsLeft = self.lastArxivRequest + search.time_sleep - time.time()
+
+        if secondsLeft > 0:
+            time.sleep(secondsLeft)
+
+        items = search.download(iterative=False)
+
+        self.lastArxivRequest = time.time()
+
+        # it has an entry even for ids it doesn't know
+        if not items:
+            raise Exception('No response from arxiv')
+
+        # the results have versions. the ids might not.
+        idsWithoutVersion = {re.sub(r'v\d+$', '', item): item for item in ids}
+
+        results = []
+
+        for item in items:
+            article = self.getArxivArticle(site, '', item)
+
+            keyword = idsWithoutVersion.get(re.sub(r'v\d+$', '', article.articleId), article.articleId)
+            article.keyword = sys.intern(keyword)
+
+            logging.info('Results: %d. Id: %s. Title: %s.', len(results) + 1, article.articleId, self.getShortTitle(article.title))
+
+            results.append((keyword, article))
+
+        return results
+
+    # looks up what it can in the main thread and returns a list of (keyword, article, output file name, downloaded, future)
+    def startDownloads(self, site, articles, executor):
+        results = []
+
+        for keyword, article in articles:
+            output = self.prepareOutput(site, article)
+
+            if not output:
+                continue
+
+            outputFileName, downloaded = output
+
+            future = None
+
+            # each thread needs its own downloader
+            if downloaded is None:
+                future = executor.submit(self.downloadPdf, Downloader(), article.pdfUrl, outputFileName)
+
+            results.append((keyword, article, outputFileName, downloaded, future))
+
+        return results
+
+    # logs the results of startDownloads in order. returns the ids that were put in self.requeuedArticles.
+    def finishDownloads(self, site, pending):
+        siteName = helpers.getDomainName(site.get('url', ''))
+
+        requeuedIds = []
+
+        for keyword, article, outputFileName, downloaded, future in pending:
+            failureReason, hash = future.result() if future else ('', '')
+
+            if self.finishOutput(site, keyword, 1, article, None, True, outputFileName, downloaded, failureReason, hash):
+                requeuedIds.append(keyword)
+                continue
+
+            article.release()
+
+            metrics.registry.increment('outputs_total', {'site': siteName})
+
+        return requeuedIds
+
+    # returns the ids that aren't in the history yet, without duplicates
+    def getIdsNotDone(self, siteName, ids):
+        directory = self.options['outputDirectory'].replace("'", "''")
+        idList = ', '.join("'" + item.replace("'", "''") + "'" for item in ids)
+
+        rows = self.database.get('history', 'keyword', f"siteName = '{siteName}' and directory = '{directory}' and keyword in ({idList})", '', '')
+
+        done = set(row['keyword'] for row in rows)
+
+        results = []
+
+        for item in ids:
+            if item in done:
+                continue
+
+            done.add(item)
+            results.append(item)
+
+        return results
+
+    # like markDone for many ids at once
+    def markIdsDone(self, siteName, ids):
+        directory = self.options['outputDirectory'].replace("'", "''")
+        now = str(datetime.datetime.utcnow())
+
+        for i in range(0, len(ids), 500):
+            values = ', '.join(f"('{siteName}', '{item.replace(chr(39), chr(39) * 2)}', '{directory}', '{now}')" for item in ids[i:i + 500])
+
+            self.database.execute(f'insert or replace into history (siteName, keyword, directory, gmDate) values {values}')
+
+    # runs the searches for all the keywords first. then gets each article once and logs it under every keyword it matched.
+    def doNihFanIn(self, site):
+        siteName = 'nih.gov'
+
+        api = Api('http://eutils.ncbi.nlm.nih.gov')
+
+        # id -> list of (keyword, result number)
+        matches = OrderedDict()
+        searchesStarted = []
+        self.requeuedArticles = []
+        resultCount = 0
 
         for keyword in self.keywords:
-            self.showStatus(item, keyword)
+            if self.budget.shouldStop():
+                break
+
+            self.showStatus(site, keyword)
         
             # already done?
-            if self.isDone(item, keyword):
+            if self.isDone(site, keyword):
                 self.onKeywordIndex += 1
                 continue
 
             try:
-                # do the search and download the results
-                self.lookUpItem(item, keyword)
-                self.markDone(item, keyword)
+                self.totalResults = 0
+                self.searchSortedByDate = False
+                self.searchStarted = datetime.datetime.utcnow()
+                self.sinceDate = self.getSinceDate(siteName, keyword)
+
+                ids = []
+
+                for pageIndex in range(0, 1000):
+                    idList = self.getNihIdList(site, keyword, api, pageIndex)
+
+                    if not idList:
+                        break
+
+                    for item in idList:
+                        if not item in matches or matches[item][-1][0] != keyword:
+                            ids.append(item)
+
+                            matches.setdefault(item, []).append((keyword, len(ids)))
+
+                        if self.shouldStopForThisKeyword(len(ids), False):
+                            break
+
+                    if self.shouldStopForThisKeyword(len(ids)):
+                        break
+
+                resultCount += len(ids)
+
+                searchesStarted.append((keyword, self.searchStarted, self.totalResults))
             except Exception as e:
-                # if something goes wrong, we just go to next keyword
                 logging.error(f'Skipping. Something went wrong.')
                 logging.debug(traceback.format_exc())                
                 logging.error(e)
 
             self.onKeywordIndex += 1
 
+        logging.info(f'{resultCount} results for {len(searchesStarted)} search terms. {len(matches)} different articles.')
+
+        i = 0
+
+        for item, itemMatches in matches.items():
+            if self.budget.shouldStop():
+                break
+
+            metrics.registry.setGauge('articles_waiting', len(matches) - i, {'site': siteName})
+
+            i += 1
+
+            logging.info('Site %d of %d: %s. Downloading item %d of %d: %s. Matches %d search terms.', self.onItemIndex + 1, len(self.sites), siteName, i, len(matches), item, len(itemMatches))
+
+            try:
+                article = self.getNihArticle(site, [keyword for keyword, resultNumber in itemMatches], api, item, i)
+
+                if not article:
+                    continue
+
+                if self.outputResult(site, itemMatches[0][0], itemMatches[0][1], article, itemMatches):
+                    continue
+
+                article.release()
+
+                metrics.registry.increment('outputs_total', {'site': siteName})
+            except Exception as e:
+                logging.error(f'Skipping {item}. Something went wrong.')
+                logging.debug(traceback.format_exc())                
+                logging.error(e)
+
+        self.outputRequeuedArticles(site)
+
+        metrics.registry.setGauge('articles_waiting', 0, {'site': siteName})
+        metrics.registry.increment('results_total', {'site': siteName}, len(matches))
+
+        # the next run does them again. the files it already got are skipped.
+        if self.budget.stopped:
+            return
+
+        for keyword, searchStarted, totalResults in searchesStarted:
+            self.searchStarted = searchStarted
+            self.totalResults = totalResults
+            self.markDone(site, keyword)
+
+            metrics.registry.increment('keywords_total', {'site': siteName})
+
     def lookUpItem(self, site, keyword):
         siteName = helpers.getDomainName(site.get('url', ''))
 
         self.totalResults = 0
-        
+        self.searchSortedByDate = False
+        self.searchFailed = False
+        self.requeuedArticles = []
+
+        self.searchStarted = datetime.datetime.utcnow()
+        self.sinceDate = self.getSinceDate(siteName, keyword)
+
+        if self.sinceDate:
+            logging.info(f'Only getting results since {self.sinceDate}')
+
+        # holds the abstracts, etc. until the articles are logged
+        if self.options['spillArticleText']:
+            self.spillFile = SpillFile()
+
+        try:
+            self.searchAndOutput(site, keyword, siteName)
+        finally:
+            if self.spillFile:
+                self.spillFile.close()
+                self.spillFile = None
+
+    def searchAndOutput(self, site, keyword, siteName):
         articles = []
 
+        if self.options['useSearchIndexResults']:
+            articles = self.getArticlesFromSearchIndex(site, keyword)
+
+        # already have enough results locally
+        if articles:
+            pass
         # use pubmed's api
-        if siteName == 'nih.gov':
+        elif siteName == 'nih.gov':
             articles = self.nihSearch(site, keyword)
         # use arxiv's api
         elif siteName == 'arxiv.org':
             articles = self.arxivSearch(site, keyword)
         # get the website and parse it
         else:
-            siteData = {}
-            
-            keywordWithPlusSigns = urllib.parse.quote_plus(keyword);
-            keywordWithPlusSigns = keywordWithPlusSigns.replace('%20', '+')
-            
-            if siteName == 'biorxiv.org':
-                siteData = {
-                    'url': f'https://www.biorxiv.org/search/{keywordWithPlusSigns}%20numresults%3A75%20sort%3Arelevance-rank',
-                    'resultsXpath': "//a[@class = 'highwire-cite-linked-title']",
-                    'totalResultsXpath': "//*[@id = 'search-summary-wrapper']",
-                    'titleXpath': "./span[@class = 'highwire-cite-title']",
-                    'dateSubmittedXpath': "//div[@class = 'pane-content' and contains(., 'Posted')]",
-                    'urlPrefix': 'https://www.biorxiv.org',
-                    'afterFirstPageSuffix': '?page={}',
-                    'abstractXpath' : "//*[@id = 'abstract-1']//*[@id = 'p-2']",
-                    'titleInDetailsPageXpath' : "//*[@id = 'page-title']"
-                }
-            elif siteName == 'medrxiv.org':
-                siteData = {
-                    'url': f'https://www.medrxiv.org/search/{keywordWithPlusSigns}%20numresults%3A75%20sort%3Arelevance-rank',
-                    'resultsXpath': "//a[@class = 'highwire-cite-linked-title']",
-                    'totalResultsXpath': "//*[@id = 'search-summary-wrapper']",
-                    'titleXpath': "./span[@class = 'highwire-cite-title']",
-                    'dateSubmittedXpath': "//div[@class = 'pane-content' and contains(., 'Posted')]",
-                    'urlPrefix': 'https://www.medrxiv.org',
-                    'afterFirstPageSuffix': '?page={}',
-                    'abstractXpath' : "//*[@id = 'abstract-1']//*[@id = 'p-2']",
-                    'titleInDetailsPageXpath' : "//*[@id = 'page-title']"
-                }
+            siteData = self.getSiteData(siteName, self.getKeywordWithPlusSigns(keyword, self.sinceDate))
 
             articles = self.genericSearch(site, keyword, siteData)
 
@@ -110,12 +689,200 @@ class Articles:
         
         # download all the pdf url's we found
         for article in articles:
-            logging.info(f'Site {self.onItemIndex + 1} of {len(self.sites)}: {siteName}. Keyword {self.onKeywordIndex + 1} of {len(self.keywords)}: {keyword}. Downloading item {i + 1} of {len(articles)}: {article[0]}.')
-                        
-            self.outputResult(site, keyword, i + 1, article)
+            if self.budget.shouldStop():
+                break
+
+            metrics.registry.setGauge('articles_waiting', len(articles) - i, {'site': siteName})
 
+            logging.info('Site %d of %d: %s. Keyword %d of %d: %s. Downloading item %d of %d: %s.', self.onItemIndex + 1, len(self.sites), siteName, self.onKeywordIndex + 1, len(self.keywords), keyword, i + 1, len(articles), article.articleId)
+                        
             i += 1
 
+            if self.outputResult(site, keyword, i, article):
+                continue
+
+            # don't need the text anymore
+            article.release()
+
+            metrics.registry.increment('outputs_total', {'site': siteName})
+
+        self.outputRequeuedArticles(site)
+
+        metrics.registry.setGauge('articles_waiting', 0, {'site': siteName})
+        metrics.registry.increment('keywords_total', {'site': siteName})
+        metrics.registry.increment('results_total', {'site': siteName}, len(articles))
+
+    # for the biorxiv and medrxiv search urls
+    def getKeywordWithPlusSigns(self, keyword, sinceDate):
+        keywordWithPlusSigns = urllib.parse.quote_plus(keyword);
+        keywordWithPlusSigns = keywordWithPlusSigns.replace('%20', '+')
+
+        # only what was posted since the last run
+        if sinceDate:
+            today = datetime.datetime.now().strftime('%Y-%m-%d')
+            keywordWithPlusSigns += f'%20limit_from%3A{sinceDate}%20limit_to%3A{today}'
+
+        return keywordWithPlusSigns
+
+    # counts the results of every site and search term at once without getting them and prints how much work a run would be
+    def printPlan(self):
+        start = time.time()
+
+        planner = Planner(self.database, self.options['maximumResultsPerKeyword'])
+
+        jobs = []
+        doneCount = 0
+
+        for site in self.sites:
+            siteName = helpers.getDomainName(site.get('url', ''))
+
+            # no network needed
+            if self.options['useIdLists']:
+                fileName = self.getInputFileName(site, 'ID list')
+
+                idCount = 0
+                notDoneCount = 0
+
+                for batch in helpers.getLinesInBatches(fileName, 1000):
+                    idCount += len(batch)
+                    notDoneCount += len(self.getIdsNotDone(siteName, batch))
+
+                planner.add(siteName, os.path.basename(fileName), idCount, idCount - notDoneCount)
+                continue
+
+            for keyword in self.readInputFile(site, 'search terms'):
+                if self.isDone(site, keyword):
+                    doneCount += 1
+                    continue
+
+                jobs.append((site, keyword, self.getSinceDate(siteName, keyword)))
+
+        with ThreadPoolExecutor(max(1, self.getDetailsPageThreads())) as executor:
+            counts = list(executor.map(lambda job: self.getResultCount(job[0], job[1], job[2]), jobs))
+
+        for (site, keyword, sinceDate), count in zip(jobs, counts):
+            siteName = helpers.getDomainName(site.get('url', ''))
+
+            if count is None:
+                logging.error(f'Can\'t count the results for {keyword} on {siteName}')
+                continue
+
+            alreadyHave = 0
+
+            if self.searchIndex:
+                alreadyHave = self.searchIndex.getFileCount(site.get('name', ''), keyword)
+
+            planner.add(siteName, keyword, count, alreadyHave)
+
+        planner.printPlan(doneCount, time.time() - start)
+
+    # only uses the network, so it can run in any thread. None if the site can't say.
+    def getResultCount(self, site, keyword, sinceDate):
+        siteName = helpers.getDomainName(site.get('url', ''))
+
+        try:
+            if siteName == 'nih.gov':
+                dateRange = ''
+
+                if sinceDate:
+                    dateRange = '&datetype=edat&mindate={}&maxdate=3000'.format(sinceDate.replace('-', '/'))
+
+                api = Api('http://eutils.ncbi.nlm.nih.gov')
+
+                response = api.get(f'/entrez/eutils/esearch.fcgi?db=pubmed&retmode=json&rettype=count&term={keyword}{dateRange}', 'esearch')
+
+                return int(response['esearchresult']['count'])
+            # an upper bound for incremental searches. arxiv can't search by date.
+            elif siteName == 'arxiv.org':
+                search = ArxivSearch(query=keyword, id_list='', max_results=0, sort_by='relevance', sort_order='descending')
+
+                response = helpers.sendRequest('GET', search._get_url(0, 0), 'arxiv')
+
+                return int(helpers.findBetween(response.text, '<opensearch:totalResults', '</opensearch:totalResults>').split('>')[-1])
+            else:
+                siteData = self.getSiteData(siteName, self.getKeywordWithPlusSigns(keyword, sinceDate))
+
+                if not siteData:
+                    return None
+
+                page = Downloader().get(siteData['url'], 'search page')
+
+                return int(helpers.numbersOnly(Downloader().getXpath(page, siteData['totalResultsXpath'], True)) or 0)
+        except Exception as e:
+            logging.error(e)
+
+        return None
+
+    # downloads that timed out or stalled get one more try
+    # returns the keywords of the ones it got to. with id lists, those are the ids.
+    def outputRequeuedArticles(self, site):
+        requeuedArticles = self.requeuedArticles
+        self.requeuedArticles = []
+
+        done = []
+
+        for i, (keyword, resultNumber, article, matches) in enumerate(requeuedArticles):
+            if self.budget.shouldStop():
+                break
+
+            logging.info('Trying again. Item %d of %d: %s.', i + 1, len(requeuedArticles), article.articleId)
+
+            self.outputResult(site, keyword, resultNumber, article, matches, False)
+
+            article.release()
+
+            done.append(keyword)
+
+            metrics.registry.increment('outputs_total', {'site': helpers.getDomainName(site.get('url', ''))})
+
+        return done
+
+    # the results in the search index, if there are enough of them to not need to search the site
+    def getArticlesFromSearchIndex(self, site, keyword):
+        if not self.searchIndex:
+            return []
+
+        maximumResults = self.options['maximumResultsPerKeyword']
+
+        rows = self.searchIndex.getMatches(keyword, site.get('name', ''), maximumResults)
+
+        if len(rows) < maximumResults:
+            return []
+
+        logging.info(f'Using {len(rows)} results from the search index instead of searching the site')
+
+        self.totalResults = len(rows)
+
+        self.logToCsvFiles(site, keyword, -1, None, '', False, True, False)
+
+        articles = [self.searchIndex.getArticle(row) for row in rows]
+
+        self.lookUpMissingPdfUrls(site, [article for article in articles if not article.pdfUrl])
+
+        return articles
+
+    # for results from the search index that don't have a pdf url that still means something
+    def lookUpMissingPdfUrls(self, site, articles):
+        if not articles:
+            return
+
+        siteName = helpers.getDomainName(site.get('url', ''))
+
+        if siteName == 'nih.gov':
+            pdfUrls = self.getPdfUrlsFromSciHub(site, [article.articleId for article in articles])
+        elif siteName == 'arxiv.org':
+            pdfUrls = [f'https://arxiv.org/pdf/{article.articleId}' for article in articles]
+        else:
+            siteData = self.getSiteData(siteName, '')
+
+            if siteData:
+                pdfUrls = [f"{siteData['urlPrefix']}/content/10.1101/{article.articleId}.full.pdf" for article in articles]
+            else:
+                pdfUrls = [''] * len(articles)
+
+        for article, pdfUrl in zip(articles, pdfUrls):
+            article.pdfUrl = pdfUrl or 'Error: No pdf url in the search index'
+
     def showStatus(self, item, keyword):
         siteName = helpers.getDomainName(item.get('url', ''))
 
@@ -132,6 +899,9 @@ class Articles:
                 logging.info(f'Stopping. Reached the maximum of {maximum} results for this keyword.')
             
             result = True
+        # no point getting more results than there's time to download
+        elif self.budget.shouldStop():
+            result = True
 
         return result
 
@@ -141,7 +911,13 @@ class Articles:
         api = Api('http://eutils.ncbi.nlm.nih.gov')
 
         for i in range(0, 1000):
-            pageResults = self.getNihPage(site, keyword, api, i, results, len(results))
+            try:
+                pageResults = self.getNihPage(site, keyword, api, i, results, len(results))
+            except Exception as e:
+                # downloads what it has. the next run does the search again.
+                logging.error(f'Stopping the search. {e}')
+                self.searchFailed = True
+                break
 
             if not pageResults:
                 logging.debug('Reached end of search results')
@@ -157,6 +933,39 @@ class Articles:
         
         return results
 
+    # the urls and xpaths for biorxiv and medrxiv. the search terms go in the search url.
+    def getSiteData(self, siteName, keywordWithPlusSigns):
+        siteData = {}
+
+        if siteName == 'biorxiv.org':
+            siteData = {
+                'url': f'https://www.biorxiv.org/search/{keywordWithPlusSigns}%20numresults%3A75%20sort%3Arelevance-rank',
+                'resultsXpath': "//a[@class = 'highwire-cite-linked-title']",
+                'totalResultsXpath': "//*[@id = 'search-summary-wrapper']",
+                'titleXpath': "./span[@class = 'highwire-cite-title']",
+                'dateSubmittedXpath': "//div[@class = 'pane-content' and contains(., 'Posted')]",
+                'urlPrefix': 'https://www.biorxiv.org',
+                'apiServer': 'biorxiv',
+                'afterFirstPageSuffix': '?page={}',
+                'abstractXpath' : "//*[@id = 'abstract-1']//*[@id = 'p-2']",
+                'titleInDetailsPageXpath' : "//*[@id = 'page-title']"
+            }
+        elif siteName == 'medrxiv.org':
+            siteData = {
+                'url': f'https://www.medrxiv.org/search/{keywordWithPlusSigns}%20numresults%3A75%20sort%3Arelevance-rank',
+                'resultsXpath': "//a[@class = 'highwire-cite-linked-title']",
+                'totalResultsXpath': "//*[@id = 'search-summary-wrapper']",
+                'titleXpath': "./span[@class = 'highwire-cite-title']",
+                'dateSubmittedXpath': "//div[@class = 'pane-content' and contains(., 'Posted')]",
+                'urlPrefix': 'https://www.medrxiv.org',
+                'apiServer': 'medrxiv',
+                'afterFirstPageSuffix': '?page={}',
+                'abstractXpath' : "//*[@id = 'abstract-1']//*[@id = 'p-2']",
+                'titleInDetailsPageXpath' : "//*[@id = 'page-title']"
+            }
+
+        return siteData
+
     def getGenericSearchPage(self, site, keyword, siteData, pageIndex, existingResults, resultCount):
         results = []
         ids = []
@@ -173,7 +982,7 @@ class Articles:
         total = 0
 
         if not self.options['useIdLists']:
-            page = self.downloader.get(siteData['url'] + suffix)
+            page = self.downloader.get(siteData['url'] + suffix, 'search page')
 
             elements = self.downloader.getXpath(page, siteData['resultsXpath'])
         
@@ -196,12 +1005,13 @@ class Articles:
             self.showResultCount()
 
             # log the search now because the download might fail
-            self.logToCsvFiles(site, keyword, -1, [], '', False, True, False)
+            self.logToCsvFiles(site, keyword, -1, None, '', False, True, False)
 
         urls = []
+        items = []
         i = resultCount
         
-        # get information about each item
+        # find the new items on this page
         for element in elements:
             try:
                 if self.shouldStopForThisKeyword(i, False):
@@ -218,16 +1028,30 @@ class Articles:
 
                 urls.append(url)
 
-                pdfUrl = url + '.full.pdf'
-                    
                 articleId = self.getLastAfterSplit(url, '/')
 
+                # this allows us to know when we reached the final page
+                if self.isInArticleList(existingResults, articleId):
+                    continue
+
                 title = ''
                 
                 if not self.options['useIdLists']:
                     title = self.downloader.getXpathInElement(element, siteData['titleXpath'])
 
-                information = self.getInformationFromDetailsPage(siteData, url)
+                items.append((url, articleId, title))
+            except Exception as e:
+                # if something goes wrong, we just go to next keyword
+                logging.error(f'Skipping. Something went wrong.')
+                logging.debug(traceback.format_exc())                
+                logging.error(e)
+
+        informationList = self.getInformationList(siteData, items)
+
+        # get information about each item
+        for (url, articleId, title), information in zip(items, informationList):
+            try:
+                pdfUrl = url + '.full.pdf'
 
                 if not title:
                     title = information.get('title', '')
@@ -239,26 +1063,11 @@ class Articles:
                 if len(shortTitle) > 50:
                     shortTitle = shortTitle[0:50] + '...'
 
-                logging.info(f'Results: {len(urls)}. Url: {url}. Title: {shortTitle}.')
-                
-                # this allows us to know when we reached the final page
-                if self.isInArticleList(existingResults, articleId):
-                    continue
+                logging.info('Results: %d. Url: %s. Title: %s.', resultCount + len(results) + 1, url, shortTitle)
+
+                result = Article(articleId, pdfUrl, title, information.get('dateSubmitted'), abstract, information, site.get('name', ''), keyword)
 
-                result = [
-                    articleId,
-                    pdfUrl,
-                    title,
-                    information.get('dateSubmitted'),
-                    abstract,
-                    information.get('allAuthors', ''),
-                    information.get('allLocations', ''),
-                    information.get('firstAuthor', ''),
-                    information.get('firstAuthorLocation', ''),
-                    information.get('lastAuthor', ''),
-                    information.get('lastAuthorLocation', ''),
-                    information.get('citations', '')              
-                ]
+                self.spillArticle(result)
                 
                 results.append(result)
             except Exception as e:
@@ -269,9 +1078,38 @@ class Articles:
 
         return results
 
+    # items is a list of (url, article id, title)
+    def getInformationList(self, siteData, items):
+        informationList = [None] * len(items)
+
+        if self.biorxivApi and siteData.get('apiServer') and items:
+            informationList = self.biorxivApi.getInformationList(siteData['apiServer'], [articleId for url, articleId, title in items], self.getDetailsPageThreads())
+
+        # the details pages of the rest
+        missing = [i for i, information in enumerate(informationList) if not information]
+
+        if self.biorxivApi and siteData.get('apiServer') and missing:
+            logging.info('%d of %d results aren\'t in the api. Using their details pages.', len(missing), len(items))
+
+        # the concurrency controller decides how many of these are in flight at once
+        with ThreadPoolExecutor(self.getDetailsPageThreads()) as executor:
+            for i, information in zip(missing, executor.map(lambda i: self.getInformationFromDetailsPage(siteData, items[i][0]), missing)):
+                informationList[i] = information
+
+        return informationList
+
+    def getDetailsPageThreads(self):
+        if not self.options['adaptiveConcurrency']:
+            return 1
+
+        return self.options['maximumConcurrency']
+
     def getInformationFromDetailsPage(self, siteData, url):
-        page = self.downloader.get(url)
+        page = self.downloader.get(url, 'details page')
 
+        return self.parseDetailsPage(siteData, page)
+
+    def parseDetailsPage(self, siteData, page):
         title = self.downloader.getXpath(page, siteData['titleInDetailsPageXpath'], True)
         
         dateSubmitted = self.downloader.getXpath(page, siteData['dateSubmittedXpath'], True)
@@ -363,15 +1201,45 @@ class Articles:
         result = False
 
         for article in articleList:
-            if len(article) >= 2 and article[0] == articleId:
+            if article.articleId == articleId:
                 result = True
                 break
 
-        return result
+        return result
+
+    def getNihPage(self, site, keyword, api, pageIndex, existingResults, resultCount):
+        results = []
+
+        idList = self.getNihIdList(site, keyword, api, pageIndex)
+
+        if not idList:
+            return []
+
+        i = resultCount
+        
+        for item in idList:
+            if self.shouldStopForThisKeyword(i, False):
+                break
+
+            # avoid duplicates
+            if self.isInArticleList(existingResults, item):
+                continue
+
+            i += 1
+
+            result = self.getNihArticle(site, [keyword], api, item, i)
+
+            if not result:
+                continue
+
+            self.spillArticle(result)
+            
+            results.append(result)
 
-    def getNihPage(self, site, keyword, api, pageIndex, existingResults, resultCount):
-        results = []
+        return results
 
+    # one page of pubmed id's that match the keyword
+    def getNihIdList(self, site, keyword, api, pageIndex):
         resultsPerPage = 1000
         start = pageIndex * resultsPerPage
         response = ''
@@ -379,11 +1247,17 @@ class Articles:
         if not self.options.get('useIdLists', ''):
             logging.info(f'Getting page {pageIndex + 1}')
     
-            response = api.get(f'/entrez/eutils/esearch.fcgi?db=pubmed&retmode=json&retstart={start}&retmax={resultsPerPage}&term={keyword}')
+            dateRange = ''
+
+            # only what was added to pubmed since the last run
+            if self.sinceDate:
+                dateRange = '&datetype=edat&mindate={}&maxdate=3000'.format(self.sinceDate.replace('-', '/'))
 
+            response = api.get(f'/entrez/eutils/esearch.fcgi?db=pubmed&retmode=json&retstart={start}&retmax={resultsPerPage}&term={keyword}{dateRange}', 'esearch')
+
+            # an empty list has to mean there are no more results, not that esearch didn't answer
             if not response:
-                logging.error('No response')
-                return []
+                raise Exception('No response from esearch')
 
             if not self.totalResults:
                 self.totalResults = response['esearchresult']['count']
@@ -391,7 +1265,7 @@ class Articles:
                 self.showResultCount()
             
                 # log the search now because the download might fail
-                self.logToCsvFiles(site, keyword, -1, [], '', False, True, False)
+                self.logToCsvFiles(site, keyword, -1, None, '', False, True, False)
         else:
             if pageIndex == 0:
                 response = {
@@ -402,81 +1276,75 @@ class Articles:
             else:
                 return []
 
-        i = resultCount
-        
-        for item in response['esearchresult']['idlist']:
-            if self.shouldStopForThisKeyword(i, False):
-                break
-
-            # avoid duplicates
-            if self.isInArticleList(existingResults, item):
-                continue
-
-            i += 1
+        return response['esearchresult']['idlist']
 
-            try:
-                summaryResponse = api.get(f'/entrez/eutils/esummary.fcgi?db=pubmed&id={item}&retmode=json')
+    # gets the summary, details and pdf url of one pubmed id. keywords are all the keywords it matched.
+    def getNihArticle(self, site, keywords, api, item, resultNumber):
+        try:
+            summaryResponse = api.get(f'/entrez/eutils/esummary.fcgi?db=pubmed&id={item}&retmode=json', 'esummary')
 
-                title = ''
-                abstract = ''
+            title = ''
+            abstract = ''
+            dateSubmitted = ''
+            details = {}
 
-                if 'result' in summaryResponse and item in summaryResponse['result']:
-                    articleSummary = summaryResponse['result'][item]
-                    
-                    title = articleSummary.get('title', '')
-                    
-                    shortTitle = title
+            if 'result' in summaryResponse and item in summaryResponse['result']:
+                articleSummary = summaryResponse['result'][item]
+                
+                title = articleSummary.get('title', '')
+                
+                shortTitle = title
 
-                    if len(shortTitle) > 50:
-                        shortTitle = shortTitle[0:50] + '...'
+                if len(shortTitle) > 50:
+                    shortTitle = shortTitle[0:50] + '...'
 
-                    dateSubmitted = articleSummary.get('sortpubdate', '')
-                    dateSubmitted = helpers.findBetween(dateSubmitted, '', ' ')
-                    dateSubmitted = dateSubmitted.replace('/', '-')
+                dateSubmitted = articleSummary.get('sortpubdate', '')
+                dateSubmitted = helpers.findBetween(dateSubmitted, '', ' ')
+                dateSubmitted = dateSubmitted.replace('/', '-')
 
-                    details = self.getNihDetails(api, item, articleSummary)
-                   
-                    abstract = details.get('abstract', '')
+                details = self.getNihDetails(api, item, articleSummary)
+               
+                abstract = details.get('abstract', '')
 
-                    logging.info(f'Results: {i}. Id: {item}. Title: {shortTitle}.')
+                logging.info('Results: %s. Id: %s. Title: %s.', resultNumber, item, shortTitle)
 
-                    # write these results to a separate csv
+                # write these results to a separate csv
+                for keyword in keywords:
                     self.logNihResultToCsvFile(site, keyword, articleSummary, details)
 
-                pdfUrl = self.getPdfUrlFromSciHub(site, item)
+            pdfUrl = self.getPdfUrlFromSciHub(site, item)
 
-                if not pdfUrl:
-                    continue
-            except Exception as e:
-                # if something goes wrong, we just go to next keyword
-                logging.error(f'Skipping {item}. Something went wrong.')
-                logging.debug(traceback.format_exc())                
-                logging.error(e)
-                continue
-            
-            result = [item, pdfUrl, title, dateSubmitted, abstract]
+            if not pdfUrl:
+                return None
+        except Exception as e:
+            # if something goes wrong, we just go to next keyword
+            logging.error(f'Skipping {item}. Something went wrong.')
+            logging.debug(traceback.format_exc())                
+            logging.error(e)
+            return None
 
-            fields = ['allAuthors', 'allLocations', 'firstAuthor', 'firstAuthorLocation', 'lastAuthor', 'lastAuthorLocation', 'citations']
+        return Article(item, pdfUrl, title, dateSubmitted, abstract, details, site.get('name', ''), keywords[0])
 
-            for field in fields:
-                result.append(details.get(field, ''))
-            
-            results.append(result)
+    def getNihDetails(self, api, articleId, article):
+        response = api.get(f'/entrez/eutils/efetch.fcgi?db=pubmed&id={articleId}&retmode=xml', 'efetch')
 
-        return results
+        return self.parseNihDetails(response, article)
 
-    def getNihDetails(self, api, articleId, article):
+    # response is the efetch xml. article is the esummary result.
+    def parseNihDetails(self, response, article):
         import xmltodict
-        
-        response = api.get(f'/entrez/eutils/efetch.fcgi?db=pubmed&id={articleId}&retmode=xml')
-        
+
         details = xmltodict.parse(response)
 
-        referenceList = helpers.getNested(details, ['PubmedArticleSet', 'PubmedArticle', 'PubmedData', 'ReferenceList'])
+        return self.getNihDetailsFromXml(helpers.getNested(details, ['PubmedArticleSet', 'PubmedArticle']), article)
 
-        details = helpers.getNested(details, ['PubmedArticleSet', 'PubmedArticle', 'MedlineCitation', 'Article'])
+    # pubmedArticle is one PubmedArticle element from the efetch xml
+    def getNihDetailsFromXml(self, pubmedArticle, article):
+        referenceList = helpers.getNested(pubmedArticle, ['PubmedData', 'ReferenceList'])
 
-        details['ReferenceList'] = referenceList
+        details = helpers.getNested(pubmedArticle, ['MedlineCitation', 'Article'])
+
+        details['ReferenceList'] = self.getReferences(referenceList)
 
         allAuthors = []
 
@@ -524,9 +1392,6 @@ class Articles:
         allLocations = ' | '.join(allLocations)
 
         for reference in details.get('ReferenceList', ''):
-            if reference.get('Reference', ''):
-                reference = reference.get('Reference', '')
-
             string = reference.get('Citation', '')
 
             id = helpers.getNested(reference, ['ArticleIdList', 'ArticleId', '#text'])
@@ -569,6 +1434,26 @@ class Articles:
 
         return result
     
+    # there can be one or more reference lists, each with one or more references
+    def getReferences(self, referenceList):
+        results = []
+
+        if not isinstance(referenceList, list):
+            referenceList = [referenceList]
+
+        for item in referenceList:
+            if not isinstance(item, dict):
+                continue
+
+            references = item.get('Reference', item)
+
+            if not isinstance(references, list):
+                references = [references]
+
+            results += [reference for reference in references if isinstance(reference, dict)]
+
+        return results
+
     def arxivSearch(self, site, keyword):
         results = []
 
@@ -577,73 +1462,94 @@ class Articles:
         if maximumResults == -1:
             maximumResults = None
 
-        items = arxiv.query(query=keyword,
-                    id_list=[],
+        search = ArxivSearch(query=keyword,
+                    id_list='',
                     max_results=maximumResults,
                     start = 0,
                     sort_by="relevance",
                     sort_order="descending",
                     prune=True,
-                    iterative=False,
                     max_chunk_results=1000)
 
+        if self.sinceDate:
+            # newest first, in small chunks, so it can stop at the first result that's too old
+            search.sort_by = 'submittedDate'
+            search.max_chunk_results = 100
+            self.searchSortedByDate = True
+            items = search.download(iterative=True)()
+        else:
+            items = search.download(iterative=False)
+
         ids = []
 
         for item in items:
-            id = item.get('id', '')
-            id = self.getLastAfterSplit(id, '/')
+            result = self.getArxivArticle(site, keyword, item)
 
             # avoids duplicates
-            if id in ids:
+            if result.articleId in ids:
                 continue
 
-            ids.append(id)
+            ids.append(result.articleId)
 
-            pdfUrl = item.get('pdf_url', '')
+            if self.sinceDate and result.dateSubmitted and result.dateSubmitted < self.sinceDate:
+                logging.info(f'Stopping. The rest of the results were submitted before {self.sinceDate}.')
+                break
 
-            if not pdfUrl:
-                siteName = helpers.getDomainName(site.get('url', ''))
-                message = f'No pdf file found on {siteName} for {id}'
-                logging.error(message)
-                pdfUrl = f'Error: {message}'
+            self.spillArticle(result)
+            
+            results.append(result)
 
-            title = item.get('title', '')
-            title = title.replace('\n', ' ')
-            title = self.squeezeWhitespace(title)
+            logging.info('Results: %d. Id: %s. Title: %s.', len(results), result.articleId, self.getShortTitle(result.title))
 
-            dateSubmitted = item.get('published', '')
+        self.totalResults = len(results)
 
-            dateSubmitted = helpers.findBetween(dateSubmitted, '', 'T')
+        self.showResultCount()
 
-            shortTitle = title
+        # log the search now because the download might fail
+        self.logToCsvFiles(site, keyword, -1, None, '', False, True, False)
 
-            if len(shortTitle) > 50:
-                shortTitle = shortTitle[0:50] + '...'
+        return results
 
-            abstract = item.get('summary', '')
+    # item is one entry from the arxiv api
+    def getArxivArticle(self, site, keyword, item):
+        id = item.get('id', '')
+        id = self.getLastAfterSplit(id, '/')
 
-            allAuthors = '; '.join(item.get('authors', ''))
-            allLocations = ''
-            firstAuthor = self.getFirst(item.get('authors', ''))
-            firstAuthorLocation = ''
-            lastAuthor = self.getLast(item.get('authors', ''))
-            lastAuthorLocation = ''
-            citations = ''
+        pdfUrl = item.get('pdf_url', '')
 
-            result = [id, pdfUrl, title, dateSubmitted, abstract, allAuthors, allLocations, firstAuthor, firstAuthorLocation, lastAuthor, lastAuthorLocation, citations]
-            
-            results.append(result)
+        if not pdfUrl:
+            siteName = helpers.getDomainName(site.get('url', ''))
+            message = f'No pdf file found on {siteName} for {id}'
+            logging.error(message)
+            pdfUrl = f'Error: {message}'
 
-            logging.info(f'Results: {len(results)}. Id: {id}. Title: {shortTitle}.')
+        title = item.get('title', '')
+        title = title.replace('\n', ' ')
+        title = self.squeezeWhitespace(title)
 
-        self.totalResults = len(results)
+        dateSubmitted = item.get('published', '')
 
-        self.showResultCount()
+        dateSubmitted = helpers.findBetween(dateSubmitted, '', 'T')
 
-        # log the search now because the download might fail
-        self.logToCsvFiles(site, keyword, -1, [], '', False, True, False)
+        abstract = item.get('summary', '')
 
-        return results
+        details = {
+            'allAuthors': '; '.join(item.get('authors', '')),
+            'allLocations': '',
+            'firstAuthor': self.getFirst(item.get('authors', '')),
+            'firstAuthorLocation': '',
+            'lastAuthor': self.getLast(item.get('authors', '')),
+            'lastAuthorLocation': '',
+            'citations': ''
+        }
+
+        return Article(id, pdfUrl, title, dateSubmitted, abstract, details, site.get('name', ''), keyword)
+
+    def getShortTitle(self, title):
+        if len(title) > 50:
+            return title[0:50] + '...'
+
+        return title
 
     def getFirst(self, array):
         if isinstance(array, list) and len(array) > 0:
@@ -690,11 +1596,32 @@ class Articles:
         
         return results
 
-    def outputResult(self, site, keyword, resultNumber, article):
+    # matches is a list of (keyword, result number) to log the article under. default is just this keyword.
+    # returns True if the download timed out or stalled and it was put in self.requeuedArticles to try again later.
+    def outputResult(self, site, keyword, resultNumber, article, matches=None, canRequeue=True):
+        output = self.prepareOutput(site, article)
+
+        if not output:
+            return
+
+        outputFileName, downloaded = output
+
+        failureReason = ''
+
+        hash = ''
+
+        if downloaded is None:
+            failureReason, hash = self.downloadPdf(self.downloader, article.pdfUrl, outputFileName)
+
+        return self.finishOutput(site, keyword, resultNumber, article, matches, canRequeue, outputFileName, downloaded, failureReason, hash)
+
+    # returns the output file name and what to log in "Downloaded?". that's None if it needs to be downloaded.
+    # returns None if there's nothing to do.
+    def prepareOutput(self, site, article):
         siteName = helpers.getDomainName(site.get('url', ''))
 
-        articleId = article[0]
-        pdfUrl = article[1]
+        articleId = article.articleId
+        pdfUrl = article.pdfUrl
 
         downloaded = 'Not downloaded'
 
@@ -704,42 +1631,112 @@ class Articles:
             # it's the error message
             downloaded = pdfUrl
         else:
-            subdirectory = f'{siteName}'
             fileName = f'{articleId}.pdf'
 
-            outputFileName = os.path.join(self.options['outputDirectory'], subdirectory, fileName)
+            outputFileName = self.outputLayout.getFileName(siteName, articleId)
 
             helpers.makeDirectory(os.path.dirname(outputFileName))
 
+            existingFileName = ''
+
+            if pdfUrl != 'binary':
+                existingFileName = self.outputLayout.find(siteName, articleId)
+
             # no need to download again. still need to write to csv file.
             if pdfUrl == 'binary':
-                logging.debug(f'Already wrote the binary file to {outputFileName}')
+                logging.debug('Already wrote the binary file to %s', outputFileName)
                 downloaded = 'Downloaded successfully'
             # only download if necessary
-            elif os.path.exists(outputFileName):
-                logging.info(f'Already done. Output file {outputFileName} already exists.')
+            elif existingFileName:
+                logging.info('Already done. Output file %s already exists.', existingFileName)
+
+                outputFileName = existingFileName
 
                 if not '--debug' in sys.argv:
-                    return
+                    return None
             elif not self.existsInDirectory(fileName):
-                logging.debug(f'Downloading. Output file does not exist.')
-                success = self.downloader.downloadBinaryFile(pdfUrl, outputFileName)
-                print('')
+                # another run or site already downloaded it
+                if self.blobStore.linkArticle(siteName, articleId, outputFileName):
+                    logging.info('Linked %s from the pdf store', outputFileName)
+                    downloaded = 'Downloaded successfully'
+                    return outputFileName, downloaded
+
+                logging.debug('Downloading. Output file does not exist.')
 
-                if self.handleCaptcha(siteName, outputFileName):
-                    downloaded = 'Captcha'
+                knownMiss = self.getKnownMiss(siteName, articleId)
+
+                if knownMiss:
+                    logging.info('Skipping download. Cached result: %s', knownMiss)
+                    downloaded = knownMiss
                     outputFileName = 'NaN'
-                elif success:
-                    downloaded = 'Downloaded successfully'
                 else:
-                    downloaded = 'Download failed'
-                    outputFileName = 'NaN'
-        
+                    downloaded = None
+
+        return outputFileName, downloaded
+
+    # only uses the network and the file, so it can run in any thread with its own downloader.
+    # returns the failure reason or an empty string and the file's sha-256 hash.
+    def downloadPdf(self, downloader, pdfUrl, outputFileName):
+        if downloader.downloadBinaryFile(pdfUrl, outputFileName):
+            return '', downloader.lastHash
+
+        # captcha, html page, error page, etc.
+        return downloader.failureReason or 'Download failed', ''
+
+    # downloaded is what prepareOutput returned. failureReason and hash are what downloadPdf returned.
+    def finishOutput(self, site, keyword, resultNumber, article, matches, canRequeue, outputFileName, downloaded, failureReason, hash=''):
+        siteName = helpers.getDomainName(site.get('url', ''))
+
+        articleId = article.articleId
+
+        if downloaded is None and not failureReason:
+            downloaded = 'Downloaded successfully'
+
+            self.budget.addResult(self.getFileSize(outputFileName))
+            self.blobStore.add(siteName, articleId, outputFileName, hash)
+            self.outputLayout.add(siteName, articleId, outputFileName)
+        elif downloaded == 'Downloaded successfully':
+            # sci-hub sent the file itself
+            if article.pdfUrl == 'binary':
+                self.budget.addResult(self.getFileSize(outputFileName))
+                self.blobStore.add(siteName, articleId, outputFileName)
+            # linked from the pdf store
+            else:
+                self.budget.addResult(0)
+
+            self.outputLayout.add(siteName, articleId, outputFileName)
+        elif downloaded is None:
+            downloaded = failureReason
+            outputFileName = 'NaN'
+
+            # try it again after the other results
+            if canRequeue and failureReason in ['Timed out', 'Stalled']:
+                logging.info('Will try %s again later', articleId)
+                self.requeuedArticles.append((keyword, resultNumber, article, matches))
+                return True
+
+            # network errors, rate limits and server errors are worth retrying next time
+            if not helpers.isTemporaryFailure(failureReason):
+                self.addKnownMiss(siteName, articleId, downloaded, self.options['negativeCacheFailedDownloadDays'])
+
+        self.restoreArticle(article)
+
+        if not matches:
+            matches = [(keyword, resultNumber)]
+
         # log to the csv file anyway
-        self.logToCsvFiles(site, keyword, resultNumber, article, outputFileName, downloaded, False, True)
+        for matchKeyword, matchResultNumber in matches:
+            self.logToCsvFiles(site, matchKeyword, matchResultNumber, article, outputFileName, downloaded, False, True)
 
         self.waitBetween()
 
+    # 0 if it's not there
+    def getFileSize(self, fileName):
+        if not os.path.exists(fileName):
+            return 0
+
+        return os.path.getsize(fileName)
+
     # log to search log and/or pdf log
     def logToCsvFiles(self, site, keyword, resultNumber, article, outputFileName, downloaded, searchLog, pdfLog):
         helpers.makeDirectory(self.options['outputDirectory'])
@@ -757,30 +1754,32 @@ class Articles:
 
         siteName = site.get('name', '')
 
-        articleId = ''
-        title = ''
-        dateSubmitted = ''
-        abstract = ''
+        if searchLog:
+            searchLogLine = [now, keyword, siteName, self.totalResults, self.options['maximumResultsPerKeyword']]
 
-        if len(article) >= 4:
-            articleId = article[0]
-            title = article[2]
-            dateSubmitted = article[3]
+            self.appendCsvFile(searchLogLine, searchLogFileName)
 
-        if len(article) >= 5:
-            abstract = article[4]
+        if pdfLog:
+            self.appendCsvFile(self.getPdfLogLine(now, keyword, siteName, resultNumber, article, outputFileName, downloaded), pdfLogFileName)
 
-        searchLogLine = [now, keyword, siteName, self.totalResults, self.options['maximumResultsPerKeyword']]
-        pdfLogLine = [now, keyword, siteName, resultNumber, self.options['maximumResultsPerKeyword'], articleId, title, dateSubmitted, abstract, downloaded, outputFileName]
+            if self.searchIndex:
+                self.searchIndex.add(siteName, keyword, article, outputFileName)
 
-        if searchLog:
-            self.appendCsvFile(searchLogLine, searchLogFileName)
+    def getPdfLogLine(self, now, keyword, siteName, resultNumber, article, outputFileName, downloaded):
+        result = [now, keyword, siteName, resultNumber, self.options['maximumResultsPerKeyword'], article.articleId, article.title, article.dateSubmitted, article.abstract or '', downloaded, outputFileName]
 
-        if pdfLog:
-            if len(article) >= 6:
-                pdfLogLine += article[5:]
+        result += article.getDetails()
+
+        return result
+
+    # moves the large fields to disk until it's time to log the article
+    def spillArticle(self, article):
+        if self.spillFile:
+            self.spillFile.spill(article)
 
-            self.appendCsvFile(pdfLogLine, pdfLogFileName)
+    def restoreArticle(self, article):
+        if self.spillFile:
+            self.spillFile.restore(article)
 
     # writes article details to a csv file
     def logNihResultToCsvFile(self, site, keyword, article, articleDetails):
@@ -792,8 +1791,9 @@ class Articles:
             helpers.makeDirectory(os.path.dirname(csvFileName))
             helpers.toFile('DateTime,Keyword,Title,Date_Submitted,URL,Abstract,Description,Details,ShortDetails,Resource,Type,Identifiers,Db,EntrezUID,Properties,all_authors,all_locations,first_author,firstauthor_location,lastauthor,last_author_location,citations', csvFileName)
 
-        siteName = site.get('name', '')
+        self.appendCsvFile(self.getNihResultLine(keyword, article, articleDetails), csvFileName)
 
+    def getNihResultLine(self, keyword, article, articleDetails):
         articleId = article.get('uid', '')
 
         dateSubmitted = article.get('sortpubdate', '')
@@ -838,8 +1838,8 @@ class Articles:
             articleDetails.get('lastAuthorLocation', ''),
             articleDetails.get('citations', '')
         ]
-        
-        self.appendCsvFile(line, csvFileName)
+
+        return line
 
     def appendCsvFile(self, line, fileName):
         import csv
@@ -847,49 +1847,103 @@ class Articles:
             writer = csv.writer(csv_file, delimiter=',')
             writer.writerow(line)
 
-    def handleCaptcha(self, siteName, outputFileName):
-        result = False
+    # moves the pdf files to the outputLayout layout and updates the paths in the pdf log and the search index
+    def migrateOutputDirectory(self):
+        siteNames = [helpers.getDomainName(site.get('url', '')) for site in self.sites]
 
-        if siteName != 'nih.gov':
-            return result
+        moved = self.outputLayout.migrate(siteNames, [self.options['pdfStoreDirectory']])
 
-        try:
-            statinfo = os.stat(outputFileName)
-        
-            if statinfo.st_size < 1000 * 1000:
-                file = helpers.getBinaryFile(outputFileName)
+        if not moved:
+            return
 
-                if not file.startswith(b'%PDF'):
-                    logging.error(f'Can\'t download this file. There is a captcha.')
+        pdfLogFileName = os.path.join(self.options['outputDirectory'], 'output_pdf_log.csv')
 
-                    # delete the file
-                    if os.path.exists(outputFileName):
-                        os.remove(outputFileName)
-                    result = True
-        except Exception as e:
-            logging.error(e)
+        if os.path.exists(pdfLogFileName):
+            import csv
 
-        return result
+            temporaryFileName = pdfLogFileName + '.part'
+
+            with open(pdfLogFileName, newline='', encoding='utf-8') as inputFile, open(temporaryFileName, 'w', newline='\n', encoding='utf-8') as outputFile:
+                writer = csv.writer(outputFile, delimiter=',')
+
+                for row in csv.reader(inputFile):
+                    # the FileNamePath column
+                    if len(row) > 10 and row[10] in moved:
+                        row[10] = moved[row[10]]
+
+                    writer.writerow(row)
+
+            os.replace(temporaryFileName, pdfLogFileName)
+
+            logging.info(f'Updated the file names in {pdfLogFileName}')
+
+        if self.searchIndex:
+            self.searchIndex.renameFiles(moved)
 
     def existsInDirectory(self, fileName):
         result = False;
 
         if self.options['directoryToCheckForDuplicates'] != 1:
             return result
+
+        # faster than looking through the whole directory
+        inManifest = self.outputLayout.hasArticle(helpers.fileNameOnly(fileName, False))
+
+        if inManifest is not None:
+            if inManifest:
+                logging.info('Skipping. Output file already exists in %s.', self.options['outputDirectory'])
+
+            return inManifest
         
         for file in helpers.listFiles(self.options['outputDirectory'], False):
             if helpers.fileNameOnly(file, True) == fileName:
                 outputDirectory = self.options['outputDirectory']
-                logging.info(f'Skipping. Output file already exists in {outputDirectory}.')
+                logging.info('Skipping. Output file already exists in %s.', outputDirectory)
                 result = True
                 break
 
         return result
 
     def getPdfUrlFromSciHub(self, site, articleId):
-        result = ''
+        return self.getPdfUrlsFromSciHub(site, [articleId])[0]
+
+    # looks up several at once with downloadThreads threads
+    def getPdfUrlsFromSciHub(self, site, articleIds):
+        results = {}
+        lookups = []
+
+        siteName = helpers.getDomainName(site.get('url', ''))
+
+        for articleId in articleIds:
+            # looked it up recently and it wasn't there
+            reason = self.getKnownMiss('sci-hub', articleId)
+
+            # prepareOutput skips it. no need to ask sci-hub again.
+            if self.outputLayout.find(siteName, articleId):
+                logging.debug('Skipping sci-hub lookup for %s. The output file already exists.', articleId)
+                results[articleId] = 'existing'
+            elif reason:
+                logging.info('Skipping sci-hub lookup for %s. Cached result: %s', articleId, reason)
+                results[articleId] = f'Error: {reason}'
+            else:
+                lookups.append(articleId)
+
+        threads = min(len(lookups), self.options['downloadThreads'])
 
-        api = Api('https://sci-hub.tw')
+        with ThreadPoolExecutor(max(1, threads)) as executor:
+            for articleId, (result, missReason) in zip(lookups, executor.map(lambda articleId: self.lookUpPdfUrlOnSciHub(site, articleId), lookups)):
+                if missReason:
+                    self.addKnownMiss('sci-hub', articleId, missReason, self.options['negativeCacheDays'])
+
+                results[articleId] = result
+
+        return [results.get(articleId, '') for articleId in articleIds]
+
+    # only uses the network, so it can run in any thread. returns the pdf url and the reason to remember it as a miss, if any.
+    def lookUpPdfUrlOnSciHub(self, site, articleId):
+        result = ''
+        missReason = ''
+        mirror = None
 
         body = {
             'sci-hub-plugin-check': '',
@@ -897,39 +1951,128 @@ class Articles:
         }
         
         try:
-            response = api.post('/', body, False)
+            response, mirror = self.sciHubPool.post('/', body, self.isSciHubAnswer)
 
             # sometimes it returns the pdf directly
             if isinstance(response, bytes) and response.startswith(b'%PDF'):
                 siteName = helpers.getDomainName(site.get('url', ''))
-                outputFileName = os.path.join(self.options['outputDirectory'], siteName, f'{articleId}.pdf')
+                outputFileName = self.outputLayout.getFileName(siteName, articleId)
 
-                logging.debug(f'Response is a pdf file. Writing it to {outputFileName}.')
+                logging.debug('Response is a pdf file. Writing it to %s.', outputFileName)
                 
                 helpers.makeDirectory(os.path.dirname(outputFileName))
-                helpers.toBinaryFile(response, outputFileName)
 
-                return 'binary'
+                # the file can be a link into the pdf store. writing through it would change every other link.
+                temporaryFileName = outputFileName + '.part'
 
-            result = self.downloader.getXpath(response, "//*[@id = 'buttons']//a[contains(@onclick, '.pdf')]", True, 'onclick')
+                helpers.toBinaryFile(response, temporaryFileName)
+                os.replace(temporaryFileName, outputFileName)
 
-            result = result.replace("location.href='", '')
+                return 'binary', ''
+
+            if mirror:
+                result = self.getSciHubButton(response)
 
-            if result and not result.startswith('http'):
-                result = 'https:' + result
+            result = result.replace("location.href='", '')
 
             if result.endswith("'"):
                 result = result[0:-1]
+
+            # relative to the mirror that answered
+            if result.startswith('//'):
+                result = urllib.parse.urlparse(mirror.url).scheme + ':' + result
+            elif result and not result.startswith('http'):
+                result = mirror.url + '/' + result.lstrip('/')
         except Exception as e:
             logging.error(e)
 
-        if not result:
-            siteName = helpers.getDomainName(api.urlPrefix)
+        if not mirror:
+            message = f'All sci-hub mirrors failed for {articleId}'
+            logging.error(message)
+            result = f'Error: {message}'
+        elif not result:
+            siteName = helpers.getDomainName(mirror.url)
             message = f'No result found on {siteName} for {articleId}'
             logging.error(message)
             result = f'Error: {message}'
 
-        return result
+            # only remembered when sci-hub says so, not after a captcha or an error
+            if self.isSciHubNotFound(response):
+                missReason = message
+
+        return result, missReason
+
+    # a pdf file, a page with a pdf file or a page that says sci-hub doesn't have it
+    def isSciHubAnswer(self, response):
+        if isinstance(response, bytes):
+            return response.startswith(b'%PDF')
+
+        return bool(self.getSciHubButton(response)) or self.isSciHubNotFound(response)
+
+    def getSciHubButton(self, response):
+        if not isinstance(response, str) or not response:
+            return ''
+
+        return self.downloader.getXpath(response, "//*[@id = 'buttons']//a[contains(@onclick, '.pdf')]", True, 'onclick')
+
+    def isSciHubNotFound(self, response):
+        if not isinstance(response, str):
+            return False
+
+        text = response.lower()
+
+        markers = ['article not found', 'статья не найдена', 'doesn\'t have the requested document', 'does not have the requested document']
+
+        return any(marker in text for marker in markers)
+
+    # returns the reason if this item failed recently and isn't due for a retry yet
+    def getKnownMiss(self, source, articleId):
+        articleId = articleId.replace("'", "''")
+
+        now = str(datetime.datetime.utcnow())
+
+        row = self.database.getFirst('misses', 'reason', f"source = '{source}' and articleId = '{articleId}' and retryAfter > '{now}'", '', '')
+
+        return row.get('reason', '')
+
+    def addKnownMiss(self, source, articleId, reason, days):
+        if days <= 0:
+            return
+
+        # so a batch of misses doesn't all expire at the same time
+        jitter = self.options['negativeCacheJitterPercent'] / 100
+        seconds = days * 24 * 60 * 60 * random.uniform(1 - jitter, 1 + jitter)
+
+        retryAfter = datetime.datetime.utcnow() + datetime.timedelta(seconds=seconds)
+
+        item = {
+            'source': source,
+            'articleId': articleId,
+            'reason': reason,
+            'gmDate': str(datetime.datetime.utcnow()),
+            'retryAfter': str(retryAfter)
+        }
+
+        self.database.insert('misses', item)
+
+    # the date to search from in incremental mode. blank means get everything.
+    def getSinceDate(self, siteName, keyword):
+        if not self.options['incrementalSearch'] or self.options['useIdLists']:
+            return ''
+
+        keyword = keyword.replace("'", "''")
+
+        row = self.database.getFirst('harvests', 'gmDate', f"siteName = '{siteName}' and keyword = '{keyword}'", '', '')
+
+        gmDate = row.get('gmDate', '')
+
+        if not gmDate:
+            return ''
+
+        # sites can take a while to index new items
+        date = datetime.datetime.strptime(gmDate[0:10], '%Y-%m-%d') - datetime.timedelta(days=self.options['incrementalOverlapDays'])
+
+        return date.strftime('%Y-%m-%d')
 
     def download(self, url, site, keyword):
         pass
@@ -955,6 +2098,16 @@ class Articles:
     def markDone(self, site, keyword):
         siteName = helpers.getDomainName(site.get('url', ''))
 
+        # the next incremental search starts from when this one started
+        if not self.options['useIdLists'] and self.isHarvestComplete():
+            harvest = {
+                'siteName': siteName,
+                'keyword': keyword,
+                'gmDate': str(self.searchStarted)
+            }
+
+            self.database.insert('harvests', harvest)
+
         keyword = keyword.replace("'", "''")
 
         item = {
@@ -969,6 +2122,17 @@ class Articles:
             
         self.database.insert('history', item)
 
+    # false if the search stopped at maximumResultsPerKeyword before the results it didn't get.
+    # the next incremental search would skip those otherwise.
+    def isHarvestComplete(self):
+        maximum = self.options['maximumResultsPerKeyword']
+
+        # newest first, so what it didn't get is older than what it got
+        if self.searchSortedByDate or maximum == -1:
+            return True
+
+        return int(self.totalResults or 0) < maximum
+
     def waitBetween(self):
         secondsBetweenItems = self.options['secondsBetweenItems']
 
@@ -982,18 +2146,30 @@ class Articles:
     def readInputFile(self, site, inputType):
         results = []
 
+        fileName = self.getInputFileName(site, inputType)
+
+        file = helpers.getFile(fileName)
+
+        for line in file.splitlines():
+            results.append(line)
+
+        if not results:
+            logging.error('No search terms or ID\'s found')
+            input("Press enter to continue...")
+
+        return results
+
+    def getInputFileName(self, site, inputType):
         fileName = ''
+        siteName = site.get('name').lower()
 
         # the command line parameter takes priority
         if self.options['inputKeywordsFile']:
             fileName = self.options['inputKeywordsFile']
+        elif inputType == 'search terms':
+            fileName = self.keywordsFiles.get(siteName, '')
         else:
-            siteName = site.get('name').lower()    
-            
-            if inputType == 'search terms':
-                fileName = self.keywordsFiles.get(siteName, '')
-            else:
-                fileName = self.idListFiles.get(siteName, '')
+            fileName = self.idListFiles.get(siteName, '')
 
         if not fileName:
             logging.error(f'No {inputType} file specified for {siteName}.')
@@ -1001,16 +2177,7 @@ class Articles:
         
         logging.info(f'Using {inputType} file: {fileName}')
 
-        file = helpers.getFile(fileName)
-
-        for line in file.splitlines():
-            results.append(line)
-
-        if not results:
-            logging.error('No search terms or ID\'s found')
-            input("Press enter to continue...")
-
-        return results
+        return fileName
 
     def setOptionFromParameter(self, optionName, parameterName):
         if not parameterName in sys.argv:
@@ -1026,11 +2193,35 @@ class Articles:
         logging.debug(f'Deleting entries older than {maximumDaysToKeepItems} days')
         self.database.execute(f"delete from history where gmDate < '{minimumDate}'")
 
+        now = str(datetime.datetime.utcnow())
+        self.database.execute(f"delete from misses where retryAfter < '{now}'")
+
     def squeezeWhitespace(self, s):
         return re.sub(r'\s\s+', " ", s)
 
     def cleanUp(self):
         self.database.close()
+        self.outputLayout.close()
+        self.blobStore.close()
+
+        if self.searchIndex:
+            self.searchIndex.close()
+
+        metrics.registry.stop()
+        metrics.registry.logSummary()
+
+        if self.sciHubPool:
+            self.sciHubPool.logStatus()
+
+        proxypool.pool.logStatus()
+
+        if self.profiler:
+            self.profiler.stop()
+
+        if helpers.httpArchive:
+            helpers.httpArchive.close()
+
+        transport.transport.close()
 
         logging.info('Done')
 
@@ -1040,7 +2231,25 @@ class Articles:
         if suffix:
             suffix = '-' + helpers.fileNameOnly(suffix, False)
 
-        helpers.setUpLogging(suffix)
+        # needed before anything is logged
+        loggingOptions = {
+            'asyncLogging': 0,
+            'logFormat': 'text',
+            'logMaximumBytes': 1000 * 1000,
+            'logBackupCount': 1
+        }
+
+        helpers.setOptions('options.ini', loggingOptions)
+        helpers.setUpLogging(suffix, loggingOptions)
+
+        self.logSuffix = suffix
+        self.profiler = None
+        self.spillFile = None
+        self.sinceDate = ''
+        self.requeuedArticles = []
+        self.lastArxivRequest = 0
+        self.searchSortedByDate = False
+        self.searchFailed = False
 
         logging.info('Starting\n')
 
@@ -1050,6 +2259,8 @@ class Articles:
         # to store the time we finished given sites/keyword combinations
         self.database = Database('database.sqlite')
         self.database.execute('create table if not exists history ( siteName text, keyword text, directory text, gmDate text, primary key(siteName, keyword, directory) )')
+        self.database.execute('create table if not exists harvests ( siteName text, keyword text, gmDate text, primary key(siteName, keyword) )')
+        self.database.execute('create table if not exists misses ( source text, articleId text, reason text, gmDate text, retryAfter text, primary key(source, articleId) )')
 
         self.downloader = Downloader()
         self.dateStarted = datetime.datetime.now().strftime('%m%d%y')
@@ -1065,7 +2276,52 @@ class Articles:
             'maximumDaysToKeepItems': 90,
             'maximumResultsPerKeyword': 25000,
             'directoryToCheckForDuplicates': '',
-            'useIdLists': 0
+            'useIdLists': 0,
+            'verifyProcesses': 0,
+            'sciHubMirrors': 'https://sci-hub.tw,https://sci-hub.se,https://sci-hub.st',
+            'sciHubProbeSeconds': 60,
+            'sciHubMaximumErrors': 3,
+            'negativeCacheDays': 7,
+            'negativeCacheFailedDownloadDays': 1,
+            'negativeCacheJitterPercent': 20,
+            'metricsFormats': '',
+            'metricsIntervalSeconds': 30,
+            'profileSampleMilliseconds': 10,
+            'hostOverrides': '',
+            'spillArticleText': 1,
+            'incrementalSearch': 0,
+            'incrementalOverlapDays': 1,
+            'pubmedFanIn': 0,
+            'searchIndexFile': '',
+            'searchIndexQueryLimit': 100,
+            'useSearchIndexResults': 0,
+            'adaptiveConcurrency': 0,
+            'initialConcurrency': 2,
+            'minimumConcurrency': 1,
+            'maximumConcurrency': 8,
+            'concurrencyLatencySpikeFactor': 3,
+            'retryAttempts': 3,
+            'retryBaseSeconds': 1,
+            'retryMaximumSeconds': 30,
+            'retryBudgetPercent': 20,
+            'circuitBreakerFailures': 5,
+            'circuitBreakerSeconds': 60,
+            'connectTimeoutSeconds': 10,
+            'readTimeoutSeconds': 60,
+            'stalledTransferSeconds': 30,
+            'minimumBytesPerSecond': 1000,
+            'http2': 0,
+            'biorxivApi': 0,
+            'idListBatchSize': 200,
+            'downloadThreads': 4,
+            'outputLayout': 'flat',
+            'pdfStoreDirectory': '',
+            'budgetSeconds': 0,
+            'budgetMegabytes': 0,
+            'proxies': '',
+            'proxyRequestsPerSecond': 0,
+            'proxyMaximumErrors': 3,
+            'proxyProbeSeconds': 60
         }
 
         self.keywordsFiles = {}
@@ -1086,6 +2342,29 @@ class Articles:
             logging.info('Downloading by ID list')
             self.options['useIdLists'] = 1
 
+        if '--incremental' in sys.argv:
+            self.options['incrementalSearch'] = 1
+
+        self.outputLayout = OutputLayout(self.options['outputDirectory'], self.options['outputLayout'])
+        self.blobStore = BlobStore(self.options['pdfStoreDirectory'])
+        self.budget = Budget(self.database, self.options['budgetSeconds'], self.options['budgetMegabytes'] * 1000 * 1000)
+
+        helpers.setHostOverrides(self.options['hostOverrides'])
+
+        helpers.setRequestTimeouts(self.options['connectTimeoutSeconds'], self.options['readTimeoutSeconds'])
+        transfers.transferWatchdog.configure(self.options['stalledTransferSeconds'], self.options['minimumBytesPerSecond'])
+        transport.transport.configure(self.options['http2'])
+        proxypool.pool.configure(self.options['proxies'], self.options['proxyRequestsPerSecond'], self.options['proxyMaximumErrors'], self.options['proxyProbeSeconds'])
+
+        retries.policy.configure(self.options['retryAttempts'], self.options['retryBaseSeconds'], self.options['retryMaximumSeconds'], self.options['retryBudgetPercent'], self.options['circuitBreakerFailures'], self.options['circuitBreakerSeconds'])
+
+        concurrency.controller.configure(self.options['adaptiveConcurrency'], self.options['initialConcurrency'], self.options['minimumConcurrency'], self.options['maximumConcurrency'], self.options['concurrencyLatencySpikeFactor'])
+
+        if '--record' in sys.argv:
+            helpers.setHttpArchive(HttpArchive(helpers.getArgument('--record', True), 'record'))
+        elif '--replay' in sys.argv:
+            helpers.setHttpArchive(HttpArchive(helpers.getArgument('--replay', True), 'replay'))
+
         # read websites file
         file = helpers.getFile(self.options['inputWebsitesFile'])
         self.sites = []
@@ -1103,5 +2382,23 @@ class Articles:
 
         self.removeOldEntries()
 
-articles = Articles()
-articles.run()
\ No newline at end of file
+        self.biorxivApi = None
+
+        if self.options['biorxivApi']:
+            self.biorxivApi = BiorxivApi()
+
+        self.searchIndex = None
+
+        if self.options['searchIndexFile']:
+            self.searchIndex = SearchIndex(self.options['searchIndexFile'])
+
+        metrics.registry.start(self.options['outputDirectory'], self.options['metricsFormats'], self.options['metricsIntervalSeconds'])
+
+        self.sciHubPool = None
+
+        if any(helpers.getDomainName(site.get('url', '')) == 'nih.gov' for site in self.sites):
+            self.sciHubPool = SciHubPool(self.options['sciHubMirrors'], self.options['sciHubProbeSeconds'], self.options['sciHubMaximumErrors'])
+
+if __name__ == '__main__':
+    articles = Articles()
+    articles.run()
\ No newline at end of file
@@ -0,0 +1,189 @@
+import os
+import sys
+import csv
+import json
+import time
+import socket
+import logging
+import tempfile
+import subprocess
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, repositoryDirectory)
+
+import helpers
+
+# runs Articles end to end against benchmarks/replayserver.py
+#
+# python benchmarks/benchmark.py --results 200 --latency 0.01 --sites biorxiv,medrxiv,pubmed,arxiv [--failureRate 0.1]
+#
+# no network access is needed. reports results per second, requests per
+# result, peak memory and cpu time. --output appends the report as a json
+# line to a file so runs can be compared.
+
+siteUrls = {
+    'pubmed': 'https://www.ncbi.nlm.nih.gov/pubmed',
+    'biorxiv': 'https://www.biorxiv.org',
+    'arxiv': 'https://arxiv.org',
+    'medrxiv': 'https://www.medrxiv.org'
+}
+
+def getFreePort():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def waitForServer(port, timeout=10):
+    start = time.time()
+
+    while time.time() - start < timeout:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+
+    return False
+
+def getPeakMemory():
+    try:
+        import resource
+
+        # kilobytes on linux, bytes on mac
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        if sys.platform == 'darwin':
+            peak = peak / 1024
+
+        return peak * 1024
+    except ImportError:
+        return 0
+
+def countResults(outputDirectory):
+    fileName = os.path.join(outputDirectory, 'output_pdf_log.csv')
+
+    if not os.path.exists(fileName):
+        return 0
+
+    with open(fileName, newline='', encoding='utf-8') as file:
+        # minus the header
+        return max(0, sum(1 for row in csv.reader(file) if row) - 1)
+
+def writeInputFiles(directory, sites, port, totalResults, extraOptions):
+    server = f'http://127.0.0.1:{port}'
+
+    hostOverrides = [f'{host}={server}' for host in ['www.biorxiv.org', 'www.medrxiv.org', 'api.biorxiv.org', 'eutils.ncbi.nlm.nih.gov', 'export.arxiv.org', 'arxiv.org']]
+
+    options = [
+        '[main]',
+        f'maximumResultsPerKeyword={totalResults}',
+        'directoryToCheckForDuplicates=',
+        f'outputDirectory={os.path.join(directory, "output")}',
+        f'hostOverrides={",".join(hostOverrides)}',
+        f'sciHubMirrors={server}',
+        'metricsFormats=json'
+    ]
+
+    options += extraOptions
+
+    options += ['', '[search terms]']
+
+    for site in sites:
+        options.append(f'{site}=search_terms.txt')
+
+    helpers.toFile('\n'.join(options), os.path.join(directory, 'options.ini'))
+    helpers.toFile('"machine learning" AND heart', os.path.join(directory, 'search_terms.txt'))
+    helpers.toFile('\n'.join(f'{site.capitalize()} {siteUrls[site]}' for site in sites), os.path.join(directory, 'websites.txt'))
+
+def runBenchmark(sites, totalResults, latency, pdfSize, extraOptions, extraArguments, failureRate=0.0):
+    port = getFreePort()
+
+    server = subprocess.Popen([sys.executable, os.path.join(repositoryDirectory, 'benchmarks', 'replayserver.py'), '--port', str(port), '--results', str(totalResults), '--latency', str(latency), '--pdfSize', str(pdfSize), '--failureRate', str(failureRate)])
+
+    try:
+        if not waitForServer(port):
+            raise Exception('The replay server didn\'t start')
+
+        directory = tempfile.mkdtemp(prefix='articles-benchmark-')
+
+        writeInputFiles(directory, sites, port, totalResults, extraOptions)
+
+        # articles.py reads its input from the working directory and the command line
+        os.chdir(directory)
+        sys.argv = ['articles.py', '-w', 'websites.txt', '--optionsFile', 'options.ini'] + extraArguments
+
+        import articles
+        import metrics
+
+        wallStart = time.time()
+        cpuStart = time.process_time()
+
+        articles.Articles().run()
+
+        wallSeconds = time.time() - wallStart
+        cpuSeconds = time.process_time() - cpuStart
+
+        results = countResults(os.path.join(directory, 'output'))
+
+        requests = sum(value for (name, labels), value in metrics.registry.counters.items() if name == 'requests_total')
+
+        report = {
+            'date': str(time.strftime('%Y-%m-%d %H:%M:%S')),
+            'sites': sites,
+            'resultsPerKeyword': totalResults,
+            'latency': latency,
+            'failureRate': failureRate,
+            'results': results,
+            'requests': requests,
+            'wallSeconds': wallSeconds,
+            'cpuSeconds': cpuSeconds,
+            'resultsPerSecond': results / wallSeconds if wallSeconds else 0,
+            'requestsPerResult': requests / results if results else 0,
+            'cpuMillisecondsPerResult': 1000 * cpuSeconds / results if results else 0,
+            'peakMemoryBytes': getPeakMemory(),
+            'directory': directory
+        }
+
+        return report
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    sites = (helpers.getArgument('--sites', False) or 'biorxiv,medrxiv,pubmed,arxiv').split(',')
+    totalResults = int(helpers.getArgument('--results', False) or 100)
+    latency = helpers.stringToFloatingPoint(helpers.getArgument('--latency', False))
+    pdfSize = int(helpers.getArgument('--pdfSize', False) or 200 * 1000)
+    outputFileName = helpers.getArgument('--output', False)
+    failureRate = helpers.stringToFloatingPoint(helpers.getArgument('--failureRate', False))
+
+    # anything after -- goes to articles.py. "option=value" goes to options.ini.
+    extraOptions = []
+    extraArguments = []
+
+    if '--' in sys.argv:
+        for argument in sys.argv[sys.argv.index('--') + 1:]:
+            if '=' in argument and not argument.startswith('-'):
+                extraOptions.append(argument)
+            else:
+                extraArguments.append(argument)
+
+    outputFileName = os.path.abspath(outputFileName) if outputFileName else ''
+
+    report = runBenchmark(sites, totalResults, latency, pdfSize, extraOptions, extraArguments, failureRate)
+
+    # the run's logging is noisy. print the report plainly at the end.
+    print('')
+
+    for key, value in report.items():
+        if isinstance(value, float):
+            value = helpers.fixedDecimals(value, 3)
+
+        print(f'{key}: {value}')
+
+    if outputFileName:
+        helpers.appendToFile(json.dumps(report), outputFileName)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pages
+
+# writes the fixtures microbenchmark.py uses. they're checked in, so only
+# run this to change them.
+
+def write(fileName, s):
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    with open(os.path.join(directory, fileName), 'w', encoding='utf-8', newline='\n') as file:
+        file.write(s)
+
+write('search_page.html', pages.getBiorxivSearchPage('machine+learning', 0, 1000))
+write('details_small.html', pages.getBiorxivDetailsPage('2020.01.01.000001v1'))
+write('details_1000_authors.html', pages.getBiorxivDetailsPage('2020.01.01.000002v1', authorCount=1000))
+write('esummary_small.json', pages.getEsummaryJson('31930947'))
+write('esummary_1000_authors.json', pages.getEsummaryJson('31930948', authorCount=1000))
+write('efetch_small.xml', pages.getEfetchXml('31930947'))
+write('efetch_1000_authors.xml', pages.getEfetchXml('31930948', authorCount=1000, affiliationsPerAuthor=2))
+write('efetch_2000_references.xml', pages.getEfetchXml('31930949', referenceCount=2000))
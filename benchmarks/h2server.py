@@ -0,0 +1,147 @@
+import os
+import sys
+import asyncio
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+import replayserver
+
+# replayserver.py over plain http/2 with prior knowledge
+#
+# python benchmarks/h2server.py --port 8003 --results 200 --latency 0.05
+#
+# needs the h2 package. answers the same requests as replayserver.py. every
+# request on a connection is handled at once, so the latency overlaps like it
+# would on a real http/2 server. use http2=2 in options.ini to talk to it.
+
+class Settings:
+    def __init__(self, totalResults, latency, pdfSize, failureRate):
+        self.totalResults = totalResults
+        self.latency = latency
+        self.pdfSize = pdfSize
+        self.failureRate = failureRate
+        self.requestCount = 0
+        self.connections = set()
+        self.biorxivDays = {}
+
+class Http2Connection:
+    def dataReceived(self, data):
+        import h2.events
+
+        try:
+            events = self.connection.receive_data(data)
+        except Exception as e:
+            logging.debug(e)
+            self.writer.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.requests[event.stream_id] = [dict(event.headers), b'']
+            elif isinstance(event, h2.events.DataReceived):
+                self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+
+                if event.stream_id in self.requests:
+                    self.requests[event.stream_id][1] += event.data
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self.requests.pop(event.stream_id, ({}, b''))
+
+                asyncio.ensure_future(self.reply(event.stream_id, headers, body))
+            elif isinstance(event, h2.events.WindowUpdated):
+                self.windowUpdated.set()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.writer.close()
+
+        self.flush()
+
+    async def reply(self, streamId, headers, body):
+        if self.settings.latency:
+            await asyncio.sleep(self.settings.latency)
+
+        method = headers.get(b':method', b'GET').decode('utf-8')
+        path = headers.get(b':path', b'/').decode('utf-8')
+        host = headers.get(b':authority', b'').decode('utf-8')
+
+        statusCode, contentType, content = replayserver.getResponse(self.settings, method, path, body, host)
+
+        self.settings.requestCount += 1
+
+        self.connection.send_headers(streamId, [
+            (':status', str(statusCode)),
+            ('content-type', contentType),
+            ('content-length', str(len(content)))
+        ])
+
+        # as much as flow control allows at a time
+        while content:
+            window = min(self.connection.local_flow_control_window(streamId), self.connection.max_outbound_frame_size)
+
+            if window <= 0:
+                self.windowUpdated.clear()
+                self.flush()
+                await self.windowUpdated.wait()
+                continue
+
+            self.connection.send_data(streamId, content[:window])
+            content = content[window:]
+
+        self.connection.end_stream(streamId)
+        self.flush()
+
+    def flush(self):
+        data = self.connection.data_to_send()
+
+        if data:
+            self.writer.write(data)
+
+    async def run(self):
+        self.connection.initiate_connection()
+        self.flush()
+
+        while True:
+            data = await self.reader.read(64 * 1024)
+
+            if not data:
+                break
+
+            self.dataReceived(data)
+
+        self.writer.close()
+
+    def __init__(self, reader, writer, settings):
+        import h2.config
+        import h2.connection
+
+        self.reader = reader
+        self.writer = writer
+        self.settings = settings
+        self.requests = {}
+        self.windowUpdated = asyncio.Event()
+
+        self.connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False, header_encoding=None))
+
+        settings.connections.add(writer.get_extra_info('peername'))
+
+def startServer(loop, port, settings):
+    async def onConnection(reader, writer):
+        await Http2Connection(reader, writer, settings).run()
+
+    return loop.run_until_complete(asyncio.start_server(onConnection, '127.0.0.1', port))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    settings = Settings(int(helpers.getArgument('--results', False) or 100),
+        helpers.stringToFloatingPoint(helpers.getArgument('--latency', False)),
+        int(helpers.getArgument('--pdfSize', False) or 200 * 1000),
+        helpers.stringToFloatingPoint(helpers.getArgument('--failureRate', False)))
+
+    loop = asyncio.get_event_loop()
+
+    server = startServer(loop, int(helpers.getArgument('--port', False) or 8003), settings)
+
+    logging.info(f'Listening on http://127.0.0.1:{server.sockets[0].getsockname()[1]} over http/2')
+
+    loop.run_forever()
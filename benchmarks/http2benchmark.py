@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, repositoryDirectory)
+
+import helpers
+import transport
+import concurrency
+from benchmark import getFreePort, waitForServer
+
+# compares http/1.1 with pooled connections to http/2 on details pages
+#
+# python benchmarks/http2benchmark.py --requests 400 --threads 16 --latency 0.05
+#
+# http/1.1 goes to replayserver.py and http/2 goes to h2server.py. both answer
+# the same requests with the same latency. http/2 needs httpx[http2] and h2.
+# it's skipped when they aren't installed.
+
+def runRequests(serverScript, port, http2, requestCount, threads, latency):
+    server = subprocess.Popen([sys.executable, os.path.join(repositoryDirectory, 'benchmarks', serverScript), '--port', str(port), '--latency', str(latency)])
+
+    try:
+        if not waitForServer(port):
+            raise Exception(f'{serverScript} didn\'t start')
+
+        transport.transport.close()
+        transport.transport.configure(http2)
+
+        urls = [f'http://127.0.0.1:{port}/content/10.1101/2020.01.{i:05}v1' for i in range(requestCount)]
+
+        def get(url):
+            return helpers.sendRequest('GET', url, 'page', retry=False).status_code
+
+        start = time.time()
+
+        with ThreadPoolExecutor(threads) as executor:
+            statusCodes = list(executor.map(get, urls))
+
+        seconds = time.time() - start
+
+        return {
+            'requests': requestCount,
+            'ok': statusCodes.count(200),
+            'seconds': seconds,
+            'requestsPerSecond': requestCount / seconds if seconds else 0
+        }
+    finally:
+        transport.transport.close()
+        server.terminate()
+        server.wait()
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+
+    requestCount = int(helpers.getArgument('--requests', False) or 400)
+    threads = int(helpers.getArgument('--threads', False) or 16)
+    latency = helpers.stringToFloatingPoint(helpers.getArgument('--latency', False) or '0.05')
+
+    # measure the transport, not the adaptive limit
+    concurrency.controller.configure(False, 2, 1, 8, 3)
+
+    reports = {
+        'http/1.1': runRequests('replayserver.py', getFreePort(), 0, requestCount, threads, latency)
+    }
+
+    try:
+        import h2
+        import httpx
+
+        reports['http/2'] = runRequests('h2server.py', getFreePort(), 2, requestCount, threads, latency)
+    except ImportError as e:
+        print(f'Skipping http/2. {e}. Install httpx[http2].')
+
+    for protocol, report in reports.items():
+        values = ', '.join(f'{key}: {helpers.fixedDecimals(value, 3) if isinstance(value, float) else value}' for key, value in report.items())
+
+        print(f'{protocol}: {values}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import gc
+import json
+import time
+import tracemalloc
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, repositoryDirectory)
+
+import helpers
+import articles
+from helpers import Downloader
+from article import Article, SpillFile
+
+# times the cpu-heavy parsing and record building functions on the fixtures
+# in benchmarks/fixtures
+#
+# python benchmarks/microbenchmark.py [--filter details] [--seconds 0.5] [--output results.jsonl]
+#
+# ns/op is the best of several rounds. peak bytes/op is the most memory a
+# call had allocated at once. blocks/op is how many memory blocks a call
+# allocated and didn't free, like the objects in its result.
+
+def getFixture(fileName):
+    return helpers.getFile(os.path.join(repositoryDirectory, 'benchmarks', 'fixtures', fileName))
+
+def getArticles():
+    result = articles.Articles()
+    result.downloader = Downloader()
+    result.totalResults = 0
+    result.options = {
+        'maximumResultsPerKeyword': 25000
+    }
+
+    return result
+
+def getArticle(articleId, information):
+    pdfUrl = f'https://www.biorxiv.org/content/10.1101/{articleId}.full.pdf'
+
+    return Article(articleId, pdfUrl, information.get('title', ''), information.get('dateSubmitted', ''), information.get('abstract', ''), information, 'Biorxiv', 'keyword')
+
+def getCases():
+    instance = getArticles()
+    downloader = instance.downloader
+
+    siteData = {
+        'resultsXpath': "//a[@class = 'highwire-cite-linked-title']",
+        'totalResultsXpath': "//*[@id = 'search-summary-wrapper']",
+        'dateSubmittedXpath': "//div[@class = 'pane-content' and contains(., 'Posted')]",
+        'abstractXpath' : "//*[@id = 'abstract-1']//*[@id = 'p-2']",
+        'titleInDetailsPageXpath' : "//*[@id = 'page-title']"
+    }
+
+    searchPage = getFixture('search_page.html')
+    detailsSmall = getFixture('details_small.html')
+    detailsLarge = getFixture('details_1000_authors.html')
+
+    summarySmall = json.loads(getFixture('esummary_small.json'))['result']['31930947']
+    summaryLarge = json.loads(getFixture('esummary_1000_authors.json'))['result']['31930948']
+
+    efetchSmall = getFixture('efetch_small.xml')
+    efetchAuthors = getFixture('efetch_1000_authors.xml')
+    efetchReferences = getFixture('efetch_2000_references.xml')
+
+    import xmltodict
+
+    parsedSmall = xmltodict.parse(efetchSmall)
+    nestedKeys = ['PubmedArticleSet', 'PubmedArticle', 'MedlineCitation', 'Article', 'AuthorList', 'Author']
+
+    detailsSmallResult = instance.parseNihDetails(efetchSmall, summarySmall)
+    detailsLargeResult = instance.parseNihDetails(efetchAuthors, summaryLarge)
+    detailsReferencesResult = instance.parseNihDetails(efetchReferences, summarySmall)
+
+    article = getArticle('2020.01.01.000001v1', instance.parseDetailsPage(siteData, detailsSmall))
+    largeArticle = getArticle('2020.01.01.000002v1', instance.parseDetailsPage(siteData, detailsLarge))
+
+    spillFile = SpillFile()
+
+    return [
+        ('getNested', lambda: helpers.getNested(parsedSmall, nestedKeys)),
+        ('getXpath search results', lambda: downloader.getXpath(searchPage, siteData['resultsXpath'])),
+        ('getXpath first only', lambda: downloader.getXpath(detailsSmall, siteData['titleInDetailsPageXpath'], True)),
+        ('getXpath first only 1000 authors', lambda: downloader.getXpath(detailsLarge, siteData['titleInDetailsPageXpath'], True)),
+        ('parseDetailsPage', lambda: instance.parseDetailsPage(siteData, detailsSmall)),
+        ('parseDetailsPage 1000 authors', lambda: instance.parseDetailsPage(siteData, detailsLarge)),
+        ('xmltodict efetch', lambda: xmltodict.parse(efetchSmall)),
+        ('xmltodict efetch 1000 authors', lambda: xmltodict.parse(efetchAuthors)),
+        ('xmltodict efetch 2000 references', lambda: xmltodict.parse(efetchReferences)),
+        ('parseNihDetails', lambda: instance.parseNihDetails(efetchSmall, summarySmall)),
+        ('parseNihDetails 1000 authors', lambda: instance.parseNihDetails(efetchAuthors, summaryLarge)),
+        ('parseNihDetails 2000 references', lambda: instance.parseNihDetails(efetchReferences, summarySmall)),
+        ('getPdfLogLine', lambda: instance.getPdfLogLine('010120-120000', 'keyword', 'Biorxiv', 1, article, 'file.pdf', 'Downloaded successfully')),
+        ('getPdfLogLine 1000 authors', lambda: instance.getPdfLogLine('010120-120000', 'keyword', 'Biorxiv', 1, largeArticle, 'file.pdf', 'Downloaded successfully')),
+        ('SpillFile spill and restore 1000 authors', lambda: spillAndRestore(spillFile, largeArticle)),
+        ('getNihResultLine', lambda: instance.getNihResultLine('keyword', summarySmall, detailsSmallResult)),
+        ('getNihResultLine 1000 authors', lambda: instance.getNihResultLine('keyword', summaryLarge, detailsLargeResult)),
+        ('getNihResultLine 2000 references', lambda: instance.getNihResultLine('keyword', summarySmall, detailsReferencesResult))
+    ]
+
+def spillAndRestore(spillFile, article):
+    spillFile.spill(article)
+    spillFile.restore(article)
+
+# runs it enough times to take about targetSeconds per round
+def getNanosecondsPerCall(function, targetSeconds, rounds=5):
+    loops = 1
+
+    while True:
+        start = time.perf_counter()
+
+        for i in range(loops):
+            function()
+
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= targetSeconds / 10 or loops >= 1000000:
+            break
+
+        loops *= 10
+
+    loops = max(1, int(loops * targetSeconds / max(elapsed, 1e-9) / 10))
+
+    best = None
+
+    for i in range(rounds):
+        start = time.perf_counter()
+
+        for j in range(loops):
+            function()
+
+        elapsed = (time.perf_counter() - start) / loops
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best * 1e9
+
+def getAllocations(function):
+    gc.collect()
+
+    tracemalloc.start()
+
+    blocksBefore = sys.getallocatedblocks()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    result = function()
+
+    blocks = sys.getallocatedblocks() - blocksBefore
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+
+    tracemalloc.stop()
+
+    del result
+
+    return peak, blocks
+
+def main():
+    nameFilter = helpers.getArgument('--filter', False).lower()
+    targetSeconds = helpers.stringToFloatingPoint(helpers.getArgument('--seconds', False)) or 0.5
+    outputFileName = helpers.getArgument('--output', False)
+
+    # the functions log errors they catch. don't let that skew the timing.
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    print(f'{"benchmark":<36} {"ns/op":>14} {"peak bytes/op":>14} {"blocks/op":>10}')
+
+    for name, function in getCases():
+        if nameFilter and not nameFilter in name.lower():
+            continue
+
+        nanoseconds = getNanosecondsPerCall(function, targetSeconds)
+        peak, blocks = getAllocations(function)
+
+        print(f'{name:<36} {nanoseconds:>14,.0f} {peak:>14,} {blocks:>10,}')
+
+        if outputFileName:
+            report = {
+                'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'benchmark': name,
+                'nanosecondsPerCall': nanoseconds,
+                'peakBytesPerCall': peak,
+                'blocksPerCall': blocks
+            }
+
+            helpers.appendToFile(json.dumps(report), outputFileName)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import json
+import random
+import hashlib
+from xml.sax.saxutils import escape
+
+# builds responses that look like the real sites' responses
+#
+# they only contain the parts articles.py reads, in the same structure.
+# everything is derived from the arguments so the same request always gets
+# the same response.
+
+words = 'cardiac heart learning deep network model patient outcome risk signal analysis cohort clinical prediction failure imaging trial'.split()
+
+def getRandom(*seed):
+    return random.Random(hashlib.md5(repr(seed).encode('utf-8')).hexdigest())
+
+def getSentence(generator, wordCount):
+    return ' '.join(generator.choice(words) for i in range(wordCount)).capitalize()
+
+def getAuthors(generator, authorCount):
+    return [f'{generator.choice(["Anna", "Ben", "Chen", "Dana", "Eli", "Fatima"])} {generator.choice(["Smith", "Garcia", "Wang", "Kumar", "Müller", "Okafor"])} {i}' for i in range(authorCount)]
+
+def getAffiliation(generator, i):
+    return f'Department of {generator.choice(words).capitalize()}, University {i % 50}, City {i % 7}'
+
+def getBiorxivId(query, index):
+    number = int(hashlib.md5(f'{query}-{index}'.encode('utf-8')).hexdigest()[:6], 16)
+    return f'2020.01.{index % 28 + 1:02d}.{number:06d}v1'
+
+def getBiorxivSearchPage(query, pageIndex, totalResults, resultsPerPage=75):
+    items = []
+
+    start = pageIndex * resultsPerPage
+    end = min(totalResults, start + resultsPerPage)
+
+    for i in range(start, end):
+        articleId = getBiorxivId(query, i)
+        title = escape(getSentence(getRandom(articleId), 10))
+
+        items.append(f'''<li class="search-result"><div class="highwire-article-citation">
+<span class="highwire-cite-title"><a href="/content/10.1101/{articleId}" class="highwire-cite-linked-title"><span class="highwire-cite-title">{title}</span></a></span>
+<div class="highwire-cite-authors">Some authors</div></div></li>''')
+
+    return f'''<!DOCTYPE html>
+<html lang="en"><head><title>Search results | bioRxiv</title></head>
+<body><div id="page">
+<div id="search-summary-wrapper">{totalResults:,} Results</div>
+<ul class="highwire-search-results-list">
+{''.join(items)}
+</ul></div></body></html>'''
+
+def getBiorxivDetailsPage(articleId, authorCount=6, affiliationsPerAuthor=2, abstractWords=250):
+    generator = getRandom(articleId)
+
+    title = escape(getSentence(generator, 12))
+    abstract = escape(getSentence(generator, abstractWords))
+
+    authors = []
+
+    for i, name in enumerate(getAuthors(generator, authorCount)):
+        affiliations = ''.join(f'<span class="nlm-aff">{escape(getAffiliation(generator, i + j))}</span>' for j in range(affiliationsPerAuthor))
+
+        authors.append(f'''<div id="hw-article-author-popups-node{i}" style="display:none;">
+<div class="author-tooltip-{i}"><div class="author-tooltip-name">{escape(name)}</div>
+<div class="author-tooltip-affiliation">{affiliations}</div></div></div>''')
+
+    return f'''<!DOCTYPE html>
+<html lang="en"><head><title>{title} | bioRxiv</title></head>
+<body><div id="page">
+<h1 class="highwire-cite-title" id="page-title">{title}</h1>
+<div class="panel-pane pane-custom pane-1"><div class="pane-content">Posted&nbsp;January {generator.randint(1, 28)}, 2020.</div></div>
+<div class="section abstract" id="abstract-1"><h2>Abstract</h2><p id="p-2">{abstract}</p></div>
+{''.join(authors)}
+</div></body></html>'''
+
+# one version of an article in the biorxiv api. the same article as getBiorxivDetailsPage.
+def getBiorxivApiItem(server, articleId, authorCount=6, affiliationsPerAuthor=2, abstractWords=250):
+    generator = getRandom(articleId)
+
+    title = getSentence(generator, 12)
+    abstract = getSentence(generator, abstractWords)
+
+    authors = getAuthors(generator, authorCount)
+    affiliations = [[getAffiliation(generator, i + j) for j in range(affiliationsPerAuthor)] for i in range(len(authors))]
+
+    day = generator.randint(1, 28)
+
+    # "Anna Smith 0" -> "Smith 0, A."
+    apiAuthors = ['{}, {}.'.format(name.split(' ', 1)[1], name[0]) for name in authors]
+
+    return {
+        'doi': '10.1101/' + articleId.rsplit('v', 1)[0],
+        'title': title,
+        'authors': '; '.join(apiAuthors),
+        'author_corresponding': authors[0] if authors else '',
+        'author_corresponding_institution': affiliations[0][0] if affiliations else '',
+        'date': f'2020-01-{day:02d}',
+        'version': articleId.rsplit('v', 1)[1] if 'v' in articleId else '1',
+        'type': 'new results',
+        'license': 'cc_by',
+        'category': 'bioinformatics',
+        'abstract': abstract,
+        'published': 'NA',
+        'server': server
+    }
+
+def getBiorxivApiJson(server, articleIds, total, cursor=0):
+    collection = [getBiorxivApiItem(server, articleId) for articleId in articleIds]
+
+    message = {'status': 'ok', 'count': len(collection), 'total': total, 'cursor': cursor}
+
+    if not collection:
+        message = {'status': 'no posts found'}
+
+    return json.dumps({'messages': [message], 'collection': collection})
+
+def getPubmedId(term, index):
+    return str(30000000 + int(hashlib.md5(f'{term}-{index}'.encode('utf-8')).hexdigest()[:6], 16))
+
+def getEsearchJson(term, retstart, retmax, totalResults):
+    ids = [getPubmedId(term, i) for i in range(retstart, min(totalResults, retstart + retmax))]
+
+    return json.dumps({
+        'header': {'type': 'esearch', 'version': '0.3'},
+        'esearchresult': {
+            'count': str(totalResults),
+            'retmax': str(len(ids)),
+            'retstart': str(retstart),
+            'idlist': ids,
+            'querytranslation': term
+        }
+    })
+
+def getEsummary(articleId, authorCount=6):
+    generator = getRandom(articleId)
+
+    authors = getAuthors(generator, authorCount)
+
+    return {
+        'uid': articleId,
+        'pubdate': '2020 Jan',
+        'source': 'J Test',
+        'authors': [{'name': name, 'authtype': 'Author', 'clusterid': ''} for name in authors],
+        'lastauthor': authors[-1] if authors else '',
+        'title': getSentence(generator, 12) + '.',
+        'sortfirstauthor': authors[0] if authors else '',
+        'fulljournalname': 'Journal of testing',
+        'elocationid': f'doi: 10.1000/test.{articleId}',
+        'pubtype': ['Journal Article'],
+        'sortpubdate': f'2020/01/{generator.randint(10, 28)} 00:00'
+    }
+
+# articleIds is comma separated like the real api
+def getEsummaryJson(articleIds, authorCount=6):
+    articleIds = [articleId for articleId in articleIds.split(',') if articleId]
+
+    result = {'uids': articleIds}
+
+    for articleId in articleIds:
+        result[articleId] = getEsummary(articleId, authorCount)
+
+    return json.dumps({
+        'header': {'type': 'esummary', 'version': '0.3'},
+        'result': result
+    })
+
+def getPubmedArticleXml(articleId, authorCount, affiliationsPerAuthor, referenceCount, abstractSections):
+    generator = getRandom(articleId)
+
+    authors = []
+
+    for i, name in enumerate(getAuthors(generator, authorCount)):
+        foreName, lastName = name.split(' ', 1)
+        affiliations = ''.join(f'<AffiliationInfo><Affiliation>{escape(getAffiliation(generator, i + j))}</Affiliation></AffiliationInfo>' for j in range(affiliationsPerAuthor))
+
+        authors.append(f'<Author ValidYN="Y"><LastName>{escape(lastName)}</LastName><ForeName>{escape(foreName)}</ForeName>{affiliations}</Author>')
+
+    sections = []
+
+    labels = ['BACKGROUND', 'METHODS', 'RESULTS', 'CONCLUSIONS']
+
+    for i in range(abstractSections):
+        sections.append(f'<AbstractText Label="{labels[i % len(labels)]}" NlmCategory="{labels[i % len(labels)]}">{escape(getSentence(generator, 60))}</AbstractText>')
+
+    references = []
+
+    for i in range(referenceCount):
+        references.append(f'<Reference><Citation>{escape(getSentence(generator, 14))}. J Test. 2019;{i}:1-10.</Citation><ArticleIdList><ArticleId IdType="pubmed">{20000000 + i}</ArticleId></ArticleIdList></Reference>')
+
+    referenceList = ''
+
+    if references:
+        referenceList = f'<ReferenceList>{"".join(references)}</ReferenceList>'
+
+    return f'''<PubmedArticle>
+<MedlineCitation Status="Publisher" Owner="NLM"><PMID Version="1">{articleId}</PMID>
+<Article PubModel="Print-Electronic">
+<Journal><Title>Journal of testing</Title></Journal>
+<ArticleTitle>{escape(getSentence(generator, 12))}.</ArticleTitle>
+<Abstract>{''.join(sections)}</Abstract>
+<AuthorList CompleteYN="Y">{''.join(authors)}</AuthorList>
+<Language>eng</Language>
+</Article>
+</MedlineCitation>
+<PubmedData><ArticleIdList><ArticleId IdType="pubmed">{articleId}</ArticleId></ArticleIdList>{referenceList}</PubmedData>
+</PubmedArticle>'''
+
+# articleIds is comma separated like the real api
+def getEfetchXml(articleIds, authorCount=6, affiliationsPerAuthor=1, referenceCount=20, abstractSections=3):
+    articles = [getPubmedArticleXml(articleId, authorCount, affiliationsPerAuthor, referenceCount, abstractSections) for articleId in articleIds.split(',') if articleId]
+
+    return f'''<?xml version="1.0" ?>
+<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2019//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_190101.dtd">
+<PubmedArticleSet>
+{''.join(articles)}
+</PubmedArticleSet>'''
+
+def getArxivId(query, index):
+    number = int(hashlib.md5(f'{query}-{index}'.encode('utf-8')).hexdigest()[:4], 16) % 10000
+    return f'20{index % 12 + 1:02d}.{number:05d}'
+
+def getArxivFeed(query, start, maximumResults, totalResults, authorCount=4, idList=None):
+    if idList:
+        articleIds = idList
+        totalResults = len(idList)
+    else:
+        articleIds = [getArxivId(query, i) for i in range(start, min(totalResults, start + maximumResults))]
+
+    entries = []
+
+    for articleId in articleIds:
+        generator = getRandom(articleId)
+
+        authors = ''.join(f'<author><name>{escape(name)}</name></author>' for name in getAuthors(generator, authorCount))
+
+        entries.append(f'''<entry>
+<id>http://arxiv.org/abs/{articleId}v1</id>
+<updated>2020-01-{generator.randint(10, 28)}T12:00:00Z</updated>
+<published>2020-01-{generator.randint(1, 9):02d}T12:00:00Z</published>
+<title>{escape(getSentence(generator, 10))}</title>
+<summary>{escape(getSentence(generator, 150))}</summary>
+{authors}
+<link href="http://arxiv.org/abs/{articleId}v1" rel="alternate" type="text/html"/>
+<link title="pdf" href="http://arxiv.org/pdf/{articleId}v1" rel="related" type="application/pdf"/>
+<arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+<category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+</entry>''')
+
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>
+<title type="html">ArXiv Query: {escape(query)}</title>
+<id>http://arxiv.org/api/benchmark</id>
+<updated>2020-01-01T00:00:00-05:00</updated>
+<opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{totalResults}</opensearch:totalResults>
+<opensearch:startIndex xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{start}</opensearch:startIndex>
+<opensearch:itemsPerPage xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{len(entries)}</opensearch:itemsPerPage>
+{''.join(entries)}
+</feed>'''
+
+def getSciHubPage(host, articleId):
+    return f'''<!DOCTYPE html>
+<html><head><title>Sci-Hub | {articleId}</title></head>
+<body><div id="menu"><div id="buttons"><ul>
+<li><a href="#" onclick="location.href='//{host}/downloads/{articleId}.pdf?download=true'">&#8659; save</a></li>
+</ul></div></div>
+<div id="article"><iframe src="//{host}/downloads/{articleId}.pdf" id="pdf"></iframe></div>
+</body></html>'''
+
+def getDummyPdf(articleId, size=200 * 1000):
+    header = '%PDF-1.4\n'
+    body = f'1 0 obj\n<< /Title ({articleId}) >>\nendobj\n'
+
+    # pad it to roughly the size of a real paper
+    padding = '%' + 'x' * 78 + '\n'
+    body += padding * max(0, (size - 200) // len(padding))
+
+    xrefOffset = len(header) + len(body)
+
+    return (header + body + f'xref\n0 1\ntrailer\n<< /Size 1 >>\nstartxref\n{xrefOffset}\n%%EOF\n').encode('latin-1')
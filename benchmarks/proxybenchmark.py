@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, repositoryDirectory)
+
+import helpers
+import retries
+import proxypool
+import concurrency
+from benchmark import getFreePort, waitForServer
+
+# requests per second to a site that limits each address, with more and more proxies
+#
+# python benchmarks/proxybenchmark.py --requests 300 --threads 16 --clientRate 20 --proxies 4
+#
+# replayserver.py answers 429 to any client over --clientRate requests a
+# second. the requests go directly, through one stubproxy.py and through
+# --proxies of them, plus one that isn't running to show it being taken out.
+
+def startProcess(script, port, arguments=[]):
+    process = subprocess.Popen([sys.executable, os.path.join(repositoryDirectory, 'benchmarks', script), '--port', str(port)] + arguments)
+
+    if not waitForServer(port):
+        process.terminate()
+        raise Exception(f'{script} didn\'t start')
+
+    return process
+
+def runRequests(serverPort, proxyUrls, requestCount, threads, clientRate):
+    proxypool.pool.configure(','.join(proxyUrls), clientRate, 3, 60)
+
+    urls = [f'http://127.0.0.1:{serverPort}/content/10.1101/2020.01.{i:05}v1' for i in range(requestCount)]
+
+    def get(url):
+        try:
+            return helpers.sendRequest('GET', url, 'page', retry=False).status_code
+        except Exception as e:
+            logging.debug(e)
+            return 0
+
+    start = time.time()
+
+    with ThreadPoolExecutor(threads) as executor:
+        statusCodes = list(executor.map(get, urls))
+
+    seconds = time.time() - start
+
+    ok = statusCodes.count(200)
+
+    return {
+        'requests': requestCount,
+        'ok': ok,
+        'rejected': statusCodes.count(429),
+        'failed': statusCodes.count(0),
+        'seconds': seconds,
+        'okPerSecond': ok / seconds if seconds else 0
+    }
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+
+    requestCount = int(helpers.getArgument('--requests', False) or 300)
+    threads = int(helpers.getArgument('--threads', False) or 16)
+    clientRate = int(helpers.getArgument('--clientRate', False) or 20)
+    proxyCount = int(helpers.getArgument('--proxies', False) or 4)
+
+    # measure the proxies, not the adaptive limit or the retries
+    concurrency.controller.configure(False, 2, 1, 8, 3)
+    retries.policy.configure(0, 1, 30, 20, 1000, 60)
+
+    serverPort = getFreePort()
+    processes = [startProcess('replayserver.py', serverPort, ['--latency', '0.01', '--clientRate', str(clientRate)])]
+
+    try:
+        proxyUrls = []
+
+        for i in range(proxyCount):
+            port = getFreePort()
+            processes.append(startProcess('stubproxy.py', port))
+            proxyUrls.append(f'http://127.0.0.1:{port}')
+
+        deadProxyUrl = f'http://127.0.0.1:{getFreePort()}'
+
+        reports = {
+            'direct': runRequests(serverPort, [], requestCount, threads, clientRate),
+            '1 proxy': runRequests(serverPort, proxyUrls[:1], requestCount, threads, clientRate),
+            f'{proxyCount} proxies': runRequests(serverPort, proxyUrls, requestCount, threads, clientRate),
+            f'{proxyCount} proxies and 1 down': runRequests(serverPort, proxyUrls + [deadProxyUrl], requestCount, threads, clientRate)
+        }
+
+        for name, report in reports.items():
+            values = ', '.join(f'{key}: {helpers.fixedDecimals(value, 2) if isinstance(value, float) else value}' for key, value in report.items())
+
+            print(f'{name}: {values}')
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import os
+import sys
+import time
+import json
+import random
+import datetime
+import logging
+import threading
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+import pages
+
+# a local stand-in for every site articles.py talks to
+#
+# python benchmarks/replayserver.py --port 8002 --results 200 --latency 0.05 --failureRate 0.1 --clientRate 20
+#
+# bioRxiv and medRxiv search and details pages, PubMed E-utilities, the arXiv
+# api, sci-hub and the pdf files themselves. point the sites at it with
+# hostOverrides and sciHubMirrors in options.ini. with --clientRate, each
+# client gets a 429 for any request over that many in a second, like a site
+# that limits each address. requests through stubproxy.py count for the proxy.
+
+# everything in pages.py was posted in january 2020
+def getTotalResultsSince(date, totalResults):
+    if date.replace('/', '-') > '2020-01-31':
+        return 0
+
+    return totalResults
+
+# for each day, the articles search pages have shown from that day, then made up ones
+def getBiorxivApiRange(server, apiServer, fromDate, toDate, cursor, articlesPerDay=150):
+    articleIds = []
+
+    date = datetime.date.fromisoformat(fromDate)
+
+    while date <= datetime.date.fromisoformat(toDate):
+        dayArticleIds = sorted(server.biorxivDays.get(date.isoformat(), set()))
+
+        dateWithDots = date.isoformat().replace('-', '.')
+
+        dayArticleIds += [f'{dateWithDots}.{900000 + i:06d}v1' for i in range(articlesPerDay - len(dayArticleIds))]
+
+        articleIds += dayArticleIds
+
+        date += datetime.timedelta(days=1)
+
+    return pages.getBiorxivApiJson(apiServer, articleIds[cursor:cursor + 100], len(articleIds), cursor)
+
+# returns the status code, content type and body for a request. server has the settings from startServer.
+def getResponse(server, method, url, body, host):
+    # some fraction of requests get a 503
+    if server.failureRate and random.random() < server.failureRate:
+        return 503, 'text/html; charset=utf-8', b'<html><body>Service unavailable</body></html>'
+
+    parsed = urllib.parse.urlparse(url)
+    path = urllib.parse.unquote(parsed.path)
+    query = urllib.parse.parse_qs(parsed.query)
+
+    if method == 'POST':
+        fields = urllib.parse.parse_qs(body.decode('utf-8'))
+
+        # e-utilities take long id lists in the body
+        if path.endswith('.fcgi'):
+            query.update(fields)
+        # sci-hub
+        else:
+            articleId = fields.get('request', [''])[0]
+
+            return 200, 'text/html; charset=utf-8', pages.getSciHubPage(host, articleId).encode('utf-8')
+
+    totalResults = server.totalResults
+
+    statusCode = 200
+    contentType = ''
+    text = ''
+
+    if path.endswith('.pdf') or path.startswith('/pdf/'):
+        return 200, 'application/pdf', pages.getDummyPdf(helpers.fileNameOnly(path, False), server.pdfSize)
+    elif path.startswith('/search/'):
+        pageIndex = int(query.get('page', ['0'])[0])
+        searchTerms = helpers.findBetween(path, '/search/', ' numresults')
+
+        if ' limit_from:' in searchTerms:
+            totalResults = getTotalResultsSince(helpers.findBetween(searchTerms, ' limit_from:', ' '), totalResults)
+            searchTerms = helpers.findBetween(searchTerms, '', ' limit_from:')
+
+        # the api's listings by date have these
+        for i in range(pageIndex * 75, min(totalResults, pageIndex * 75 + 75)):
+            articleId = pages.getBiorxivId(searchTerms, i)
+            server.biorxivDays.setdefault(articleId[:10].replace('.', '-'), set()).add(articleId)
+
+        contentType = 'text/html'
+        text = pages.getBiorxivSearchPage(searchTerms, pageIndex, totalResults)
+    elif path.startswith('/content/'):
+        contentType = 'text/html'
+        text = pages.getBiorxivDetailsPage(helpers.findBetween(path, '/content/10.1101/', ''))
+    elif path.startswith('/details/'):
+        fields = path.split('/')
+        apiServer = fields[2]
+
+        contentType = 'application/json'
+
+        # by doi
+        if fields[3] == '10.1101':
+            text = pages.getBiorxivApiJson(apiServer, [fields[4] + 'v1'], 1)
+        # by date range
+        else:
+            text = getBiorxivApiRange(server, apiServer, fields[3], fields[4], int(fields[5]))
+    elif path.endswith('/esearch.fcgi'):
+        retstart = int(query.get('retstart', ['0'])[0])
+        retmax = int(query.get('retmax', ['20'])[0])
+
+        if 'mindate' in query:
+            totalResults = getTotalResultsSince(query['mindate'][0], totalResults)
+
+        contentType = 'application/json'
+
+        if query.get('rettype', [''])[0] == 'count':
+            text = json.dumps({'esearchresult': {'count': str(totalResults)}})
+        else:
+            text = pages.getEsearchJson(query.get('term', [''])[0], retstart, retmax, totalResults)
+    elif path.endswith('/esummary.fcgi'):
+        contentType = 'application/json'
+        text = pages.getEsummaryJson(query.get('id', [''])[0])
+    elif path.endswith('/efetch.fcgi'):
+        contentType = 'text/xml'
+        text = pages.getEfetchXml(query.get('id', [''])[0])
+    elif path.endswith('/query'):
+        start = int(query.get('start', ['0'])[0])
+        maximumResults = int(query.get('max_results', ['10'])[0])
+        searchTerms = query.get('search_query', [''])[0]
+
+        idList = [articleId for articleId in query.get('id_list', [''])[0].split(',') if articleId]
+
+        contentType = 'application/atom+xml'
+        text = pages.getArxivFeed(searchTerms, start, maximumResults, totalResults, idList=idList)
+    elif path == '/':
+        contentType = 'text/html'
+        text = '<html><body>replay server</body></html>'
+    else:
+        statusCode = 404
+        contentType = 'text/html'
+        text = '<html><body>Not found</body></html>'
+
+    return statusCode, f'{contentType}; charset=utf-8', text.encode('utf-8')
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # the headers and the body are written separately. with nagle's algorithm, a kept alive connection waits for a delayed ack between them.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.wait()
+
+        if self.isOverClientRate():
+            self.reply(429, 'text/html; charset=utf-8', b'<html><body>Too many requests</body></html>')
+            return
+
+        self.reply(*getResponse(self.server, 'GET', self.path, b'', self.headers.get('host', '')))
+
+    def do_POST(self):
+        self.wait()
+
+        length = int(self.headers.get('content-length', 0))
+        body = self.rfile.read(length)
+
+        if self.isOverClientRate():
+            self.reply(429, 'text/html; charset=utf-8', b'<html><body>Too many requests</body></html>')
+            return
+
+        self.reply(*getResponse(self.server, 'POST', self.path, body, self.headers.get('host', '')))
+
+    # the proxy it came through or else the address it came from
+    def isOverClientRate(self):
+        if not self.server.clientRate:
+            return False
+
+        client = self.headers.get('via', self.client_address[0])
+        now = time.time()
+
+        with self.server.lock:
+            times = self.server.clientRequests.setdefault(client, deque())
+
+            while times and times[0] <= now - 1:
+                times.popleft()
+
+            if len(times) >= self.server.clientRate:
+                self.server.rejectedCount += 1
+                return True
+
+            times.append(now)
+
+        return False
+
+    def wait(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def reply(self, statusCode, contentType, body):
+        self.server.requestCount += 1
+        self.server.connections.add(self.client_address)
+
+        self.send_response(statusCode)
+        self.send_header('content-type', contentType)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+def startServer(port=0, totalResults=100, latency=0.0, pdfSize=200 * 1000, failureRate=0.0, clientRate=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), ReplayHandler)
+    server.daemon_threads = True
+    server.totalResults = totalResults
+    server.latency = latency
+    server.pdfSize = pdfSize
+    server.failureRate = failureRate
+    server.requestCount = 0
+
+    # client -> times of its requests in the last second
+    server.clientRate = clientRate
+    server.clientRequests = {}
+    server.rejectedCount = 0
+    server.lock = threading.Lock()
+
+    # date -> biorxiv article ids
+    server.biorxivDays = {}
+
+    # the client addresses that sent requests. one per connection.
+    server.connections = set()
+
+    return server
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    server = startServer(int(helpers.getArgument('--port', False) or 8002),
+        int(helpers.getArgument('--results', False) or 100),
+        helpers.stringToFloatingPoint(helpers.getArgument('--latency', False)),
+        int(helpers.getArgument('--pdfSize', False) or 200 * 1000),
+        helpers.stringToFloatingPoint(helpers.getArgument('--failureRate', False)),
+        int(helpers.getArgument('--clientRate', False) or 0))
+
+    logging.info(f'Listening on http://127.0.0.1:{server.server_address[1]}')
+
+    server.serve_forever()
@@ -0,0 +1,91 @@
+import os
+import sys
+import logging
+import http.client
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers
+
+# a plain http forwarding proxy for trying out the proxies option
+#
+# python benchmarks/stubproxy.py --port 8101
+#
+# forwards each request to the server in its url and adds a via header with
+# the proxy's port, so replayserver.py's --clientRate can tell the proxies
+# apart like a site would tell their addresses apart. no https.
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.forward(b'')
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+
+        self.forward(self.rfile.read(length))
+
+    def forward(self, body):
+        parsed = urllib.parse.urlparse(self.path)
+
+        if parsed.scheme != 'http':
+            self.reply(400, 'text/plain', b'Only absolute http urls')
+            return
+
+        headers = {key: value for key, value in self.headers.items() if key.lower() not in ['proxy-connection', 'connection', 'keep-alive']}
+        headers['via'] = f'1.1 stubproxy-{self.server.server_address[1]}'
+
+        path = parsed.path or '/'
+
+        if parsed.query:
+            path += '?' + parsed.query
+
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+            connection.request(self.command, path, body=body or None, headers=headers)
+
+            response = connection.getresponse()
+
+            content = response.read()
+            contentType = response.getheader('content-type', 'application/octet-stream')
+
+            connection.close()
+        except Exception as e:
+            logging.debug(e)
+            self.reply(502, 'text/plain', b'Bad gateway')
+            return
+
+        self.server.requestCount += 1
+
+        self.reply(response.status, contentType, content)
+
+    def reply(self, statusCode, contentType, body):
+        self.send_response(statusCode)
+        self.send_header('content-type', contentType)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+def startServer(port=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), ProxyHandler)
+    server.daemon_threads = True
+    server.requestCount = 0
+
+    return server
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    server = startServer(int(helpers.getArgument('--port', False) or 8101))
+
+    logging.info(f'Proxying on http://127.0.0.1:{server.server_address[1]}')
+
+    server.serve_forever()
@@ -0,0 +1,296 @@
+import re
+import math
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from helpers import Api
+
+# article metadata from the biorxiv and medrxiv api instead of the details pages
+#
+# /details/(server)/(doi)/na/json has the versions of one article.
+# /details/(server)/(from date)/(to date)/(cursor)/json has every article
+# posted in those dates, 100 at a time. newer dois contain the date they were
+# posted, so a batch's articles can be looked up from the listing of the dates
+# they span instead of one request each. the listing of the whole span is
+# tried first. if that's too long, the articles are split into date ranges
+# that are each cheaper to list than to ask for one by one.
+#
+# the fields differ from the details pages:
+# - author names have initials instead of first names, "J. A. Smith" instead of "Jane A. Smith"
+# - all locations is only the corresponding author's institution
+# - the first or last author location is only set when that author is the corresponding author
+# - citations are always blank, like the details pages
+
+class BiorxivApi:
+    pageSize = 100
+
+    # how many of a batch's articles need to be in a date range to try that range's listing
+    minimumForRange = 2
+
+    # returns the information for each article id in the same order, or None where the api doesn't have it
+    def getInformationList(self, server, articleIds, threads=1):
+        found = self.getFromCache(server, articleIds)
+
+        dated = [articleId for articleId in articleIds if self.getDate(articleId) and articleId not in found]
+        dated = sorted(set(dated), key=self.getDate)
+
+        with ThreadPoolExecutor(max(1, threads)) as executor:
+            if len(dated) >= self.minimumForRange:
+                fromDate = self.getDate(dated[0])
+                toDate = self.getDate(dated[-1])
+
+                # the whole window first
+                items, total = self.getRange(server, fromDate, toDate, dated)
+
+                found.update(self.getMatches(server, items, dated))
+
+                missing = [articleId for articleId in dated if articleId not in found]
+
+                if missing and total:
+                    postsPerDay = total / self.getDayCount(fromDate, toDate)
+
+                    ranges = self.getRanges(missing, postsPerDay)
+
+                    for result in executor.map(lambda group: self.getFromRange(server, group), ranges):
+                        found.update(result)
+
+            remaining = [articleId for articleId in articleIds if articleId not in found]
+
+            for articleId, information in zip(remaining, executor.map(lambda articleId: self.getByDoi(server, articleId), remaining)):
+                found[articleId] = information
+
+        return [found.get(articleId) for articleId in articleIds]
+
+    def getByDoi(self, server, articleId):
+        response = self.api.get(f'/details/{server}/{self.getDoi(articleId)}/na/json', 'api')
+
+        return self.getInformation(self.getCollection(response), articleId)
+
+    # the ones in articleIds that are in ranges other batches already listed
+    def getFromCache(self, server, articleIds):
+        result = {}
+
+        with self.lock:
+            ranges = [(key, items) for key, items in self.ranges.items() if key[0] == server]
+
+        for articleId in articleIds:
+            date = self.getDate(articleId)
+
+            if not date:
+                continue
+
+            for key, items in ranges:
+                if key[1] <= date <= key[2]:
+                    information = self.getInformation(items.get(self.getDoi(articleId), []), articleId)
+
+                    if information:
+                        result[articleId] = information
+                        break
+
+        metrics.registry.increment('biorxiv_api_range_hits_total', {'server': server}, len(result))
+
+        return result
+
+    # articleIds are sorted by date. groups that are each cheaper to list than to ask for one by one.
+    def getRanges(self, articleIds, postsPerDay):
+        ranges = []
+        group = []
+
+        for articleId in articleIds:
+            if group:
+                dayCount = self.getDayCount(self.getDate(group[0]), self.getDate(articleId))
+
+                if math.ceil(postsPerDay * dayCount / self.pageSize) > len(group) + 1:
+                    ranges.append(group)
+                    group = []
+
+            group.append(articleId)
+
+        ranges.append(group)
+
+        return [group for group in ranges if len(group) >= self.minimumForRange]
+
+    def getFromRange(self, server, articleIds):
+        items, total = self.getRange(server, self.getDate(articleIds[0]), self.getDate(articleIds[-1]), articleIds)
+
+        return self.getMatches(server, items, articleIds)
+
+    def getMatches(self, server, items, articleIds):
+        result = {}
+
+        for articleId in articleIds:
+            information = self.getInformation(items.get(self.getDoi(articleId), []), articleId)
+
+            if information:
+                result[articleId] = information
+
+        metrics.registry.increment('biorxiv_api_range_hits_total', {'server': server}, len(result))
+
+        return result
+
+    # doi -> versions and the number of articles in the range. stops early if the rest of the range would take more requests than asking for each article.
+    def getRange(self, server, fromDate, toDate, articleIds):
+        items = {}
+        dois = set(self.getDoi(articleId) for articleId in articleIds)
+        cursor = 0
+        total = 0
+        complete = False
+
+        while True:
+            response = self.api.get(f'/details/{server}/{fromDate}/{toDate}/{cursor}/json', 'api')
+
+            collection = self.getCollection(response)
+
+            for item in collection:
+                items.setdefault(item.get('doi', ''), []).append(item)
+
+            cursor += len(collection)
+
+            total = self.getTotal(response)
+
+            if not collection or cursor >= total:
+                complete = True
+                break
+
+            missingCount = len([doi for doi in dois if doi not in items])
+
+            if math.ceil((total - cursor) / self.pageSize) > missingCount:
+                logging.debug('Not getting the rest of %s to %s for %s. %d more articles.', fromDate, toDate, server, total - cursor)
+                break
+
+        # other batches can have articles from the same dates
+        if complete:
+            with self.lock:
+                self.ranges[(server, fromDate, toDate)] = items
+
+                while len(self.ranges) > self.maximumRanges:
+                    self.ranges.popitem(last=False)
+
+        return items, total
+
+    # including both
+    def getDayCount(self, fromDate, toDate):
+        difference = datetime.date.fromisoformat(toDate) - datetime.date.fromisoformat(fromDate)
+
+        return difference.days + 1
+
+    def getCollection(self, response):
+        if not isinstance(response, dict):
+            return []
+
+        return response.get('collection', []) or []
+
+    def getTotal(self, response):
+        try:
+            return int(response.get('messages', [{}])[0].get('total', 0))
+        except Exception as e:
+            logging.debug(e)
+            return 0
+
+    # the same fields as Articles.parseDetailsPage
+    def getInformation(self, items, articleId):
+        if not items:
+            return None
+
+        version = self.getVersion(articleId)
+
+        # the version in the id or else the latest one
+        matching = [item for item in items if str(item.get('version', '')) == version]
+
+        item = matching[0] if matching else items[-1]
+
+        title = (item.get('title', '') or '').strip()
+
+        if not title:
+            return None
+
+        authors = [self.getName(author) for author in (item.get('authors', '') or '').split(';')]
+        authors = [author for author in authors if author]
+
+        firstAuthor = authors[0] if authors else ''
+
+        # only if the article has a last author
+        lastAuthor = authors[-1] if len(authors) > 1 else ''
+
+        institution = (item.get('author_corresponding_institution', '') or '').strip()
+        corresponding = item.get('author_corresponding', '') or ''
+
+        firstAuthorLocation = ''
+        lastAuthorLocation = ''
+
+        if institution and self.isSamePerson(corresponding, firstAuthor):
+            firstAuthorLocation = institution
+        elif institution and self.isSamePerson(corresponding, lastAuthor):
+            lastAuthorLocation = institution
+
+        return {
+            'title': title,
+            'dateSubmitted': item.get('date', '') or '',
+            'abstract': (item.get('abstract', '') or '').strip(),
+            'allAuthors': '; '.join(authors),
+            'allLocations': institution,
+            'firstAuthor': firstAuthor,
+            'firstAuthorLocation': firstAuthorLocation,
+            'lastAuthor': lastAuthor,
+            'lastAuthorLocation': lastAuthorLocation,
+            'citations': ''
+        }
+
+    # "Smith, J. A." -> "J. A. Smith"
+    def getName(self, s):
+        s = s.strip()
+
+        if ',' not in s:
+            return s
+
+        lastName, firstNames = s.split(',', 1)
+
+        return f'{firstNames.strip()} {lastName.strip()}'.strip()
+
+    # the corresponding author's full name against a name with initials
+    def isSamePerson(self, corresponding, name):
+        corresponding = corresponding.strip().lower()
+        name = name.strip().lower()
+
+        if not corresponding or not name:
+            return False
+
+        return corresponding.split()[-1] == name.split()[-1] and corresponding[0] == name[0]
+
+    # 2020.01.01.123456v2 -> 10.1101/2020.01.01.123456
+    def getDoi(self, articleId):
+        return '10.1101/' + re.sub(r'v\d+$', '', articleId)
+
+    def getVersion(self, articleId):
+        match = re.search(r'v(\d+)$', articleId)
+
+        return match.group(1) if match else ''
+
+    # newer dois start with the date they were posted
+    def getDate(self, articleId):
+        match = re.match(r'^(\d{4})\.(\d{2})\.(\d{2})\.', articleId)
+
+        if not match:
+            return ''
+
+        date = '-'.join(match.groups())
+
+        try:
+            datetime.date.fromisoformat(date)
+        except ValueError:
+            return ''
+
+        return date
+
+    def __init__(self):
+        self.api = Api('https://api.biorxiv.org')
+        self.api.headers['accept'] = 'application/json'
+
+        self.lock = threading.Lock()
+
+        # (server, from date, to date) -> doi -> versions
+        self.ranges = OrderedDict()
+        self.maximumRanges = 30
@@ -0,0 +1,198 @@
+import os
+import errno
+import hashlib
+import logging
+import datetime
+import helpers
+from database import Database
+
+# one copy of each pdf file no matter how many output directories have it
+#
+# the store keeps each file once under its sha-256 hash, like
+# (store)/3f/a2/(hash).pdf. the files in the output directories are hard links
+# to it, so the same paper from another site, another run directory or sci-hub
+# takes no extra disk. the number of links to a file is its reference count.
+# an article the store already has is linked into the next run's output
+# directory instead of downloaded again. hard links need the store and the
+# output directories to be on the same file system. copy-on-write reflinks
+# aren't available from python's standard library, so they aren't used.
+
+class BlobStore:
+    # moves the file into the store, or replaces it with a link if the store already has the same content. returns the hash or an empty string.
+    # hash is the file's sha-256 if the downloader already worked it out. otherwise the file is read to get it.
+    def add(self, siteName, articleId, fileName, hash=''):
+        if not self.enabled or not os.path.exists(fileName):
+            return ''
+
+        try:
+            hash = hash or self.getHash(fileName)
+            blobFileName = self.getBlobFileName(hash)
+
+            if os.path.exists(blobFileName):
+                if not os.path.samefile(fileName, blobFileName):
+                    self.link(blobFileName, fileName)
+
+                    logging.debug('Already in the store. Linked %s to %s.', fileName, blobFileName)
+            else:
+                helpers.makeDirectory(os.path.dirname(blobFileName))
+                os.link(fileName, blobFileName)
+
+            statinfo = os.stat(blobFileName)
+
+            self.getDatabase().insert('blobs', {
+                'hash': hash,
+                'size': statinfo.st_size,
+                'referenceCount': statinfo.st_nlink - 1,
+                'gmDate': str(datetime.datetime.utcnow())
+            })
+
+            self.addArticle(siteName, articleId, hash)
+
+            return hash
+        except Exception as e:
+            self.onLinkError(e)
+
+        return ''
+
+    # links the article's file into fileName if the store has it. returns true if it did.
+    def linkArticle(self, siteName, articleId, fileName):
+        if not self.enabled:
+            return False
+
+        row = self.getDatabase().getFirst('articles', 'hash', self.getWhere(siteName, articleId), '', '')
+
+        if not row:
+            return False
+
+        blobFileName = self.getBlobFileName(row['hash'])
+
+        if not os.path.exists(blobFileName):
+            return False
+
+        try:
+            helpers.makeDirectory(os.path.dirname(fileName))
+            self.link(blobFileName, fileName)
+
+            return True
+        except Exception as e:
+            self.onLinkError(e)
+
+        return False
+
+    # removes the files nothing links to anymore. returns how many it removed and how many bytes that freed.
+    def collectGarbage(self):
+        if not self.enabled:
+            logging.error('No pdfStoreDirectory in options.ini')
+            return 0, 0
+
+        database = self.getDatabase()
+
+        removedCount = 0
+        freedBytes = 0
+        updates = []
+
+        logging.info(f'Looking for unused files in {self.directory}')
+
+        for row in database.get('blobs', 'hash', '', '', ''):
+            hash = row['hash']
+            blobFileName = self.getBlobFileName(hash)
+
+            try:
+                statinfo = os.stat(blobFileName)
+            except FileNotFoundError:
+                statinfo = None
+
+            # the store's own name is one of the links
+            referenceCount = statinfo.st_nlink - 1 if statinfo else 0
+
+            if referenceCount > 0:
+                updates.append((referenceCount, hash))
+                continue
+
+            if statinfo:
+                os.remove(blobFileName)
+
+                removedCount += 1
+                freedBytes += statinfo.st_size
+
+            database.cursor.execute('delete from blobs where hash = ?', (hash,))
+            database.cursor.execute('delete from articles where hash = ?', (hash,))
+
+        database.cursor.executemany('update blobs set referenceCount = ? where hash = ?', updates)
+        database.conn.commit()
+
+        self.removeEmptyDirectories()
+
+        logging.info(f'Removed {removedCount} unused files. Freed {freedBytes} bytes.')
+
+        return removedCount, freedBytes
+
+    def addArticle(self, siteName, articleId, hash):
+        self.getDatabase().insert('articles', {
+            'siteName': siteName,
+            'articleId': articleId,
+            'hash': hash
+        })
+
+    # replaces fileName with a link to blobFileName. a reader never sees it missing.
+    def link(self, blobFileName, fileName):
+        temporaryFileName = fileName + '.link'
+
+        if os.path.exists(temporaryFileName):
+            os.remove(temporaryFileName)
+
+        os.link(blobFileName, temporaryFileName)
+        os.replace(temporaryFileName, fileName)
+
+    def onLinkError(self, e):
+        # the files stay where they are and the run goes on without the store
+        if isinstance(e, OSError) and e.errno in [errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP]:
+            logging.error(f'Can\'t make hard links in {self.directory}. Not using it. It needs to be on the same file system as the output directory. {e}')
+            self.enabled = False
+        else:
+            logging.error(e)
+
+    def getHash(self, fileName):
+        sha256 = hashlib.sha256()
+
+        with open(fileName, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+
+        return sha256.hexdigest()
+
+    def getBlobFileName(self, hash):
+        return os.path.join(self.directory, hash[0:2], hash[2:4], f'{hash}.pdf')
+
+    def getWhere(self, siteName, articleId):
+        siteName = siteName.replace("'", "''")
+        articleId = articleId.replace("'", "''")
+
+        return f"siteName = '{siteName}' and articleId = '{articleId}'"
+
+    def removeEmptyDirectories(self):
+        for root, directories, files in os.walk(self.directory, topdown=False):
+            if root != self.directory and not os.listdir(root):
+                os.rmdir(root)
+
+    # only created once something needs it
+    def getDatabase(self):
+        if not self.database:
+            helpers.makeDirectory(self.directory)
+
+            self.database = Database(os.path.join(self.directory, 'blobs.sqlite'))
+            self.database.execute('create table if not exists blobs ( hash text primary key, size integer, referenceCount integer, gmDate text )')
+            self.database.execute('create table if not exists articles ( siteName text, articleId text, hash text, primary key(siteName, articleId) )')
+            self.database.execute('create index if not exists articlesHash on articles (hash)')
+
+        return self.database
+
+    def close(self):
+        if self.database:
+            self.database.close()
+            self.database = None
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.enabled = bool(directory)
+        self.database = None
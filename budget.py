@@ -0,0 +1,127 @@
+import time
+import logging
+import datetime
+
+# runs that have to fit in a time or download window
+#
+# every site and search term is a job. how long each job took and how many new
+# pdf files it got are remembered in the jobs table. with a budget, the jobs
+# with the most new results per second go first, so a short window gets the
+# most valuable work. a job nobody has run yet is assumed to be like the other
+# jobs on its site. when the budget runs out, the current job stops at the next
+# result and isn't marked done, so the next run picks it up again. the files it
+# already got are skipped then.
+
+class Budget:
+    # seconds and bytes of 0 mean no limit
+    def __init__(self, database, seconds, bytes):
+        self.database = database
+        self.seconds = seconds
+        self.bytes = bytes
+
+        self.database.execute('create table if not exists jobs ( siteName text, keyword text, runs integer, seconds real, newResults real, bytes real, gmDate text, primary key(siteName, keyword) )')
+
+        self.started = time.time()
+        self.bytesUsed = 0
+        self.stopped = False
+
+        self.jobStarted = 0
+        self.jobResults = 0
+        self.jobBytes = 0
+
+    def isEnabled(self):
+        return bool(self.seconds or self.bytes)
+
+    # true once the budget is used up. logs it the first time.
+    def shouldStop(self):
+        if self.stopped:
+            return True
+
+        reason = ''
+
+        if self.seconds and time.time() - self.started >= self.seconds:
+            reason = f'Reached the time budget of {self.seconds} seconds'
+        elif self.bytes and self.bytesUsed >= self.bytes:
+            reason = f'Reached the download budget of {self.bytes} bytes'
+
+        if reason:
+            logging.info(f'Stopping. {reason}.')
+            self.stopped = True
+
+        return self.stopped
+
+    # a new pdf file in the output directory. bytes is 0 if it didn't need downloading.
+    def addResult(self, bytes):
+        self.jobResults += 1
+        self.jobBytes += bytes
+        self.bytesUsed += bytes
+
+    def startJob(self):
+        self.jobStarted = time.time()
+        self.jobResults = 0
+        self.jobBytes = 0
+
+    # remembers how the job went. the last few runs count the most.
+    def finishJob(self, siteName, keyword):
+        seconds = time.time() - self.jobStarted
+
+        row = self.getJob(siteName, keyword)
+
+        runs = 1
+        newResults = self.jobResults
+        bytes = self.jobBytes
+
+        if row:
+            runs = row['runs'] + 1
+            seconds = (row['seconds'] + seconds) / 2
+            newResults = (row['newResults'] + newResults) / 2
+            bytes = (row['bytes'] + bytes) / 2
+
+        self.database.insert('jobs', {
+            'siteName': siteName,
+            'keyword': keyword,
+            'runs': runs,
+            'seconds': seconds,
+            'newResults': newResults,
+            'bytes': bytes,
+            'gmDate': str(datetime.datetime.utcnow())
+        })
+
+    # jobs is a list of (site name, keyword, anything). returns them with the most new results per second first.
+    def sortJobs(self, jobs):
+        rows = self.database.get('jobs', 'siteName, keyword, seconds, newResults', '', '', '')
+
+        rates = {}
+
+        for row in rows:
+            rates[(row['siteName'], row['keyword'])] = self.getRate(row)
+
+        allRates = list(rates.values())
+
+        def getExpectedRate(job):
+            siteName, keyword = job[0], job[1]
+
+            if (siteName, keyword) in rates:
+                return rates[(siteName, keyword)]
+
+            siteRates = [rate for key, rate in rates.items() if key[0] == siteName]
+
+            if siteRates:
+                return sum(siteRates) / len(siteRates)
+
+            if allRates:
+                return sum(allRates) / len(allRates)
+
+            return 0
+
+        # sorted is stable, so jobs that are alike stay in file order
+        return sorted(jobs, key=getExpectedRate, reverse=True)
+
+    def getRate(self, row):
+        return (row['newResults'] or 0) / max(row['seconds'] or 0, 0.1)
+
+    def getJob(self, siteName, keyword):
+        siteName = siteName.replace("'", "''")
+        keyword = keyword.replace("'", "''")
+
+        return self.database.getFirst('jobs', 'runs, seconds, newResults, bytes', f"siteName = '{siteName}' and keyword = '{keyword}'", '', '')
@@ -0,0 +1,129 @@
+import time
+import logging
+import threading
+import urllib.parse
+import metrics
+
+# adaptive limit on the number of requests in flight to each host
+#
+# additive increase, multiplicative decrease. each healthy response raises a
+# host's limit by 1 / limit, so about 1 per round of requests. a 429, a 5xx,
+# no response or a response much slower than usual cuts it in half. it's cut
+# at most once a second so that one slow period doesn't take it to the minimum.
+
+class HostLimit:
+    def __init__(self, host, limit):
+        self.host = host
+        self.limit = float(limit)
+        self.inFlight = 0
+
+        # moving average of healthy response times
+        self.latency = 0.0
+
+        self.lastDecrease = 0.0
+
+class ConcurrencyController:
+    def configure(self, enabled, initial, minimum, maximum, latencySpikeFactor):
+        self.enabled = enabled
+        self.initial = max(1, initial)
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.latencySpikeFactor = latencySpikeFactor
+
+    # waits until the host has room for another request
+    def acquire(self, url):
+        if not self.enabled:
+            return
+
+        with self.condition:
+            hostLimit = self.getHostLimit(url)
+
+            while hostLimit.inFlight >= int(hostLimit.limit):
+                self.condition.wait()
+
+            hostLimit.inFlight += 1
+
+    # seconds is None when it's not a fair measure of the host's speed, like a large download
+    def release(self, url, seconds, statusCode):
+        if not self.enabled:
+            return
+
+        with self.condition:
+            hostLimit = self.getHostLimit(url)
+
+            hostLimit.inFlight = max(0, hostLimit.inFlight - 1)
+
+            reason = self.getDecreaseReason(hostLimit, seconds, statusCode)
+
+            if reason:
+                self.decrease(hostLimit, reason)
+            else:
+                self.increase(hostLimit, seconds)
+
+            self.condition.notify_all()
+
+    def getDecreaseReason(self, hostLimit, seconds, statusCode):
+        if statusCode == 0:
+            return 'No response'
+
+        if statusCode == 429 or statusCode >= 500:
+            return f'HTTP {statusCode}'
+
+        if seconds is not None and hostLimit.latency and seconds > hostLimit.latency * self.latencySpikeFactor:
+            return f'Latency {seconds:.2f} seconds. Usually {hostLimit.latency:.2f}.'
+
+        return ''
+
+    def increase(self, hostLimit, seconds):
+        if seconds is not None:
+            if not hostLimit.latency:
+                hostLimit.latency = seconds
+            else:
+                hostLimit.latency = 0.9 * hostLimit.latency + 0.1 * seconds
+
+        self.setLimit(hostLimit, min(self.maximum, hostLimit.limit + 1 / hostLimit.limit), 'Healthy')
+
+    def decrease(self, hostLimit, reason):
+        now = time.time()
+
+        if now - hostLimit.lastDecrease < 1:
+            return
+
+        hostLimit.lastDecrease = now
+
+        self.setLimit(hostLimit, max(self.minimum, hostLimit.limit / 2), reason)
+
+    def setLimit(self, hostLimit, limit, reason):
+        old = int(hostLimit.limit)
+
+        hostLimit.limit = limit
+
+        if int(limit) != old:
+            logging.info('Concurrency for %s: %d -> %d. %s', hostLimit.host, old, int(limit), reason)
+
+            metrics.registry.setGauge('concurrency_limit', int(limit), {'host': hostLimit.host})
+
+    def getHostLimit(self, url):
+        host = urllib.parse.urlparse(url).netloc
+
+        hostLimit = self.hosts.get(host)
+
+        if not hostLimit:
+            hostLimit = HostLimit(host, self.initial)
+            self.hosts[host] = hostLimit
+
+            metrics.registry.setGauge('concurrency_limit', int(hostLimit.limit), {'host': host})
+
+        return hostLimit
+
+    def getLimit(self, url):
+        with self.condition:
+            return int(self.getHostLimit(url).limit)
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.hosts = {}
+
+        self.configure(False, 2, 1, 8, 3)
+
+controller = ConcurrencyController()
@@ -1,4 +1,5 @@
 import sys
+import re
 import io
 import logging
 import os.path
@@ -9,8 +10,17 @@ import time
 import configparser
 import datetime
 import json
-from logging.handlers import RotatingFileHandler
+import hashlib
+import queue
+import atexit
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from collections import OrderedDict
+import metrics
+import concurrency
+import retries
+import transfers
+import transport
+import proxypool
 
 def getFile(fileName, encoding=None):
     if not os.path.isfile(fileName):
@@ -29,6 +39,29 @@ def getBinaryFile(fileName):
     return f.read()
 
 
+# yields lists of up to batchSize lines that aren't blank. only one batch is in memory at a time.
+def getLinesInBatches(fileName, batchSize):
+    if not os.path.isfile(fileName):
+        return
+
+    batch = []
+
+    with open(fileName, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            batch.append(line)
+
+            if len(batch) >= batchSize:
+                yield batch
+                batch = []
+
+    if batch:
+        yield batch
+
 def getLines(fileName):
     if not os.path.isfile(fileName):
         return []
@@ -183,7 +216,7 @@ def getUrl(url):
 
     try:
         import requests
-        response = requests.get(url)
+        response = requests.get(url, timeout=requestTimeouts)
     except Exception as e:
         logging.error(e)
         return ''
@@ -317,17 +350,49 @@ def addToStartup(fileName):
         file.write('cd ' + directoryName + '\n')
         file.write(r'start /min %s' % startupScriptFileName)
 
-def setUpLogging(fileNameSuffix=''):
+# one json object per line
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        result = {
+            'time': self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'thread': record.threadName,
+            'module': record.module,
+            'message': record.getMessage()
+        }
+
+        if record.exc_info:
+            result['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(result)
+
+# puts records on the queue as they are. the listener thread formats them.
+class LazyQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+logListener = None
+
+# options is a dictionary with asyncLogging, logFormat, logMaximumBytes and logBackupCount
+def setUpLogging(fileNameSuffix='', options=None):
+    global logListener
+
+    if not options:
+        options = {}
+
     logFormatter = logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s', '%Y-%m-%d %H:%M:%S')
     rootLogger = logging.getLogger()
     rootLogger.setLevel(logging.INFO)
 
     consoleHandler = logging.StreamHandler()
     consoleHandler.setFormatter(logFormatter)        
-    rootLogger.addHandler(consoleHandler)
 
     logFileName = os.path.join('logs', f'log{fileNameSuffix}.txt')
 
+    if options.get('logFormat', 'text') == 'json':
+        logFileName = os.path.join('logs', f'log{fileNameSuffix}.jsonl')
+        logFormatter = JsonLogFormatter()
+
     if '--debug' in sys.argv:
         if os.path.exists(logFileName):
             # clear the file
@@ -336,10 +401,35 @@ def setUpLogging(fileNameSuffix=''):
 
     makeDirectory(os.path.dirname(logFileName))
 
-    # 2 rotating files of maximum 1 million bytes each        
-    fileHandler = RotatingFileHandler(logFileName, maxBytes=1000 * 1000, backupCount=1, encoding='utf-8')
+    # rotating files of maximum 1 million bytes each by default
+    fileHandler = RotatingFileHandler(logFileName, maxBytes=options.get('logMaximumBytes', 1000 * 1000), backupCount=options.get('logBackupCount', 1), encoding='utf-8')
     fileHandler.setFormatter(logFormatter)
-    rootLogger.addHandler(fileHandler)
+
+    handlers = [consoleHandler, fileHandler]
+
+    if not options.get('asyncLogging', 0):
+        for handler in handlers:
+            rootLogger.addHandler(handler)
+
+        return
+
+    # the calling thread only puts the record on a queue. a background thread formats and writes it.
+    logQueue = queue.Queue(-1)
+
+    rootLogger.addHandler(LazyQueueHandler(logQueue))
+
+    logListener = QueueListener(logQueue, *handlers, respect_handler_level=True)
+    logListener.start()
+
+    atexit.register(stopLogging)
+
+# writes out anything that's still in the queue
+def stopLogging():
+    global logListener
+
+    if logListener:
+        logListener.stop()
+        logListener = None
 
 def getDateStringSecondsAgo(secondsAgo, useGmTime):
     now = None
@@ -367,16 +457,160 @@ def getDomainName(url):
 
     return result
 
+# host name -> replacement like http://127.0.0.1:8001. see the hostOverrides option.
+hostOverrides = {}
+
+def setHostOverrides(s):
+    hostOverrides.clear()
+
+    for item in s.split(','):
+        host = findBetween(item, '', '=').strip()
+        replacement = findBetween(item, '=', '').strip()
+
+        if host and replacement and '=' in item:
+            hostOverrides[host] = replacement.rstrip('/')
+
+# sends requests for an overridden host to its replacement instead
+def applyHostOverrides(url):
+    if not hostOverrides:
+        return url
+
+    from urllib.parse import urlparse
+    parsed = urlparse(url)
+
+    replacement = hostOverrides.get(parsed.netloc)
+
+    if not replacement:
+        return url
+
+    return replacement + url[len(f'{parsed.scheme}://{parsed.netloc}'):]
+
+# seconds to connect and seconds to wait for each read
+requestTimeouts = (10, 60)
+
+def setRequestTimeouts(connectSeconds, readSeconds):
+    global requestTimeouts
+
+    requestTimeouts = (connectSeconds, readSeconds)
+
+# an archive.HttpArchive when using --record or --replay
+httpArchive = None
+
+def setHttpArchive(archive):
+    global httpArchive
+    httpArchive = archive
+
+# every http request goes through here so it can be measured
+# streamed downloads call this themselves once the body is read
+def reportRequest(stage, url, seconds, byteCount, statusCode, measureLatency=True):
+    metrics.registry.observeRequest(stage, url, seconds, byteCount, statusCode)
+
+    concurrency.controller.release(url, seconds if measureLatency else None, statusCode)
+
+# retries failures with backoff. raises the last exception if they all fail.
+def sendRequest(method, url, stage, headers=None, proxies=None, data=None, stream=False, retry=True):
+    if not retry:
+        return sendRequestOnce(method, url, stage, headers, proxies, data, stream)
+
+    attempt = 0
+
+    while True:
+        retries.policy.beforeRequest(url)
+
+        start = time.time()
+        response = None
+        error = None
+
+        try:
+            response = sendRequestOnce(method, url, stage, headers, proxies, data, stream)
+        except Exception as e:
+            error = e
+
+        delay = None
+
+        # a recording has nothing new to say
+        if not (httpArchive and httpArchive.mode == 'replay'):
+            delay = retries.policy.getRetryDelay(url, attempt, response, error)
+
+        if delay is None:
+            if error:
+                raise error
+
+            return response
+
+        if response is not None:
+            logging.info('Retrying %s in %.1f seconds. HTTP %s.', url, delay, response.status_code)
+        else:
+            logging.info('Retrying %s in %.1f seconds. %s', url, delay, error)
+
+        # a streamed response that's not going to be read
+        if stream and response is not None:
+            response.close()
+            reportRequest(stage, url, time.time() - start, 0, response.status_code, False)
+
+        time.sleep(delay)
+
+        attempt += 1
+
+def sendRequestOnce(method, url, stage, headers, proxies, data, stream):
+    concurrency.controller.acquire(url)
+
+    start = time.time()
+    response = None
+    proxy = None
+
+    try:
+        if httpArchive and httpArchive.mode == 'replay':
+            response = httpArchive.replay(method, url, data)
+        else:
+            # proxies from the caller take precedence over the pool
+            if proxies is None and proxypool.pool.isEnabled():
+                proxy = proxypool.pool.acquire(url)
+                proxies = proxypool.pool.getProxies(proxy)
+
+            response = transport.transport.request(method, applyHostOverrides(url), headers, proxies, data, stream, requestTimeouts)
+
+            if httpArchive:
+                httpArchive.record(method, url, data, response, stream)
+    finally:
+        if proxy:
+            proxypool.pool.release(proxy, url, response.status_code if response is not None else 0)
+
+        # streamed downloads report themselves once the body is read
+        if not stream or response is None:
+            statusCode = 0
+            byteCount = 0
+
+            if response is not None:
+                statusCode = response.status_code
+                byteCount = len(response.content)
+
+            reportRequest(stage, url, time.time() - start, byteCount, statusCode)
+
+    return response
+
 class Api:
-    def get(self, url):
-        import requests
+    def get(self, url, stage='api'):
+        result, self.lastStatusCode = self.getWithStatusCode(url, stage)
+
+        return result
+
+    def post(self, url, data, responseIsJson=True, stage='api'):
+        result, self.lastStatusCode = self.postWithStatusCode(url, data, responseIsJson, stage)
+
+        return result
 
+    # for threads that share this object. lastStatusCode could be another thread's by the time they read it.
+    def getWithStatusCode(self, url, stage='api'):
         result = ''
+        statusCode = 0
 
         try:
-            logging.debug(f'Get {url}')
+            logging.debug('Get %s', url)
+
+            response = sendRequest('GET', self.urlPrefix + url, stage, headers=self.headers, proxies=self.proxies, retry=self.retry)
 
-            response = requests.get(self.urlPrefix + url, headers=self.headers, proxies=self.proxies)
+            statusCode = response.status_code
 
             if response.text[0] == '{' or response.text[0] == '[':
                 result = json.loads(response.text)
@@ -385,17 +619,18 @@ class Api:
         except Exception as e:
             logging.error(e)
 
-        return result
+        return result, statusCode
 
-    def post(self, url, data, responseIsJson=True):
-        import requests
-        
+    def postWithStatusCode(self, url, data, responseIsJson=True, stage='api'):
         result = ''
+        statusCode = 0
 
         try:
-            logging.debug(f'Post {url}')
+            logging.debug('Post %s', url)
 
-            response = requests.post(self.urlPrefix + url, headers=self.headers, proxies=self.proxies, data=data)
+            response = sendRequest('POST', self.urlPrefix + url, stage, headers=self.headers, proxies=self.proxies, data=data, retry=self.retry)
+
+            statusCode = response.status_code
 
             logging.debug(response)
             logging.debug(response.headers)
@@ -409,7 +644,7 @@ class Api:
         except Exception as e:
             logging.error(e)
 
-        return result
+        return result, statusCode
 
     def __init__(self, urlPrefix):
         self.urlPrefix = urlPrefix
@@ -429,7 +664,14 @@ class Api:
             ('te', 'trailers')
         ])
 
+        # None means the proxy pool, if there is one
         self.proxies = None
+
+        # False means the caller handles failures itself
+        self.retry = True
+
+        # 0 means the last request didn't get a response
+        self.lastStatusCode = 0
         
 def fileNameOnly(fileName, includeExtension):
     result = os.path.basename(fileName)
@@ -459,25 +701,58 @@ def addToStartup(fileName):
         file.write('cd ' + directoryName + '\n')
         file.write(r'start /min %s' % startupScriptFileName)
 
-class Downloader:
-    def get(self, url):
-        import requests
+# returns an empty string if the start of a response looks like a pdf file
+def getNonPdfReason(statusCode, contentType, firstBytes):
+    # the pdf header can be anywhere in the first 1024 bytes
+    if statusCode < 400 and b'%PDF' in firstBytes[:1024]:
+        return ''
 
-        userAgent = random.choice(self.userAgentList)
-        
-        self.headers = OrderedDict([
-            ('user-agent', userAgent),
-            ('accept', 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9'),
-            ('accept-language', 'en-US,en;q=0.9')
-        ])
+    if not firstBytes:
+        return 'Empty response'
 
-        self.proxies = None
+    start = firstBytes[:8 * 1024].lower()
+
+    isHtml = 'html' in contentType.lower() or b'<html' in start or b'<!doctype html' in start
+
+    if isHtml:
+        captchaMarkers = [b'captcha', b'are you a robot', b'are you a human', b'unusual traffic', b'cf-chl']
+
+        for marker in captchaMarkers:
+            if marker in start:
+                return 'Captcha'
+
+    if statusCode >= 400:
+        return f'Error page (HTTP {statusCode})'
+
+    if isHtml:
+        return 'Html page'
+
+    return 'Not a pdf'
+
+# download failures that are worth trying again soon
+networkFailureReasons = ['Download failed', 'Timed out', 'Stalled']
+
+# true if the failure might go away by itself, like a network error, a rate limit or a server error
+def isTemporaryFailure(failureReason):
+    if failureReason in networkFailureReasons:
+        return True
+
+    match = re.match(r'Error page \(HTTP (\d+)\)', failureReason)
 
+    if not match:
+        return False
+
+    statusCode = int(match.group(1))
+
+    return statusCode in [408, 429] or statusCode >= 500
+
+class Downloader:
+    def get(self, url, stage='page'):
         response = ''
 
         try:
-            logging.debug(f'Getting {url}')
-            response = requests.get(url, headers=self.headers, proxies=self.proxies)
+            logging.debug('Getting %s', url)
+            response = sendRequest('GET', url, stage, headers=self.headers, proxies=self.proxies)
             response.encoding = 'utf-8'
         except Exception as e:
             logging.error(e)
@@ -485,19 +760,98 @@ class Downloader:
         
         return response.text
 
-    def downloadBinaryFile(self, url, destinationFileName):       
+    def downloadBinaryFile(self, url, destinationFileName, stage='pdf'):
         result = False
-        
-        import wget
-        
-        logging.debug(f'Download {url} to {destinationFileName}')
-        
+
+        self.failureReason = ''
+        self.lastHash = ''
+
+        start = time.time()
+        statusCode = 0
+        byteCount = 0
+
+        # hashed while it's written so the pdf store doesn't have to read it again
+        sha256 = hashlib.sha256()
+
+        logging.debug('Download %s to %s', url, destinationFileName)
+
+        # only rename to the real name once the whole file is here
+        temporaryFileName = destinationFileName + '.part'
+
+        # sendRequest reports it if there's no response at all
+        gotResponse = False
+        transfer = None
+
         try:
-            wget.download(url, destinationFileName)
+            with sendRequest('GET', url, stage, headers=self.headers, proxies=self.proxies, stream=True) as response:
+                gotResponse = True
+                statusCode = response.status_code
+
+                # aborts it if it gets too slow
+                transfer = transfers.transferWatchdog.watch(url, response)
+
+                chunks = response.iter_content(chunk_size=64 * 1024)
+
+                # look at the start of the response before writing anything
+                firstBytes = b''
+
+                for chunk in chunks:
+                    firstBytes += chunk
+                    transfer.progress(len(chunk))
+
+                    if len(firstBytes) >= 8 * 1024:
+                        break
+
+                byteCount = len(firstBytes)
+
+                self.failureReason = getNonPdfReason(statusCode, response.headers.get('content-type', ''), firstBytes)
+
+                if self.failureReason:
+                    logging.error(f'Not downloading {url}. {self.failureReason}.')
+                    reportRequest(stage, url, time.time() - start, byteCount, statusCode, False)
+                    return result
+
+                with open(temporaryFileName, 'wb') as file:
+                    file.write(firstBytes)
+                    sha256.update(firstBytes)
+
+                    for chunk in chunks:
+                        file.write(chunk)
+                        sha256.update(chunk)
+                        byteCount += len(chunk)
+                        transfer.progress(len(chunk))
+
+                # an aborted connection can look like the end of the file
+                if transfer.stalled:
+                    raise Exception(f'Transfer of {url} stalled')
+
+            os.replace(temporaryFileName, destinationFileName)
+
+            self.lastHash = sha256.hexdigest()
+
             result = True
         except Exception as e:
             logging.error(e)
-        
+            self.failureReason = 'Download failed'
+
+            if transfer and transfer.stalled:
+                self.failureReason = 'Stalled'
+            elif 'timed out' in str(e).lower() or 'timeout' in type(e).__name__.lower():
+                self.failureReason = 'Timed out'
+
+            if os.path.exists(temporaryFileName):
+                os.remove(temporaryFileName)
+        finally:
+            if transfer:
+                transfers.transferWatchdog.unwatch(transfer)
+
+        # a status code of 0 means it failed part way
+        if not result:
+            statusCode = 0
+
+        if gotResponse:
+            reportRequest(stage, url, time.time() - start, byteCount, statusCode, False)
+
         return result
 
     def getXpath(self, page, xpath, firstOnly=False, attribute=None):
@@ -547,11 +901,31 @@ class Downloader:
         return result
 
 
+    def getRequestHeaders(self):
+        userAgent = random.choice(self.userAgentList)
+
+        return OrderedDict([
+            ('user-agent', userAgent),
+            ('accept', 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9'),
+            ('accept-language', 'en-US,en;q=0.9')
+        ])
+
     def __init__(self):
         self.userAgentList = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.88 Safari/537.36'
         ]
 
+        self.headers = self.getRequestHeaders()
+
+        # None means the proxy pool, if there is one
+        self.proxies = None
+
+        # why the last binary download was rejected. see isTemporaryFailure.
+        self.failureReason = ''
+
+        # sha-256 of the last binary download that worked
+        self.lastHash = ''
+
 def listFiles(directory, includeDirectories=True):
     result = []
 
@@ -0,0 +1,223 @@
+import os
+import io
+import json
+import time
+import datetime
+import logging
+import threading
+from urllib.parse import urlparse
+
+# counters, gauges and latency histograms for the whole run
+#
+# every http request reports here through helpers.sendRequest. the totals are
+# written to the output directory as a prometheus text file and/or a json
+# snapshot every few seconds.
+class Metrics:
+    def observeRequest(self, stage, url, seconds, byteCount, statusCode):
+        host = urlparse(url).netloc
+
+        if not statusCode:
+            status = 'error'
+        else:
+            status = f'{statusCode // 100}xx'
+
+        self.increment('requests_total', {'stage': stage, 'host': host, 'status': status})
+        self.increment('bytes_total', {'stage': stage, 'host': host}, byteCount)
+        self.observe('request_seconds', {'stage': stage, 'host': host}, seconds)
+
+    def increment(self, name, labels=None, amount=1):
+        key = self.getKey(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def setGauge(self, name, value, labels=None):
+        key = self.getKey(name, labels)
+
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, labels, seconds):
+        key = self.getKey(name, labels)
+
+        with self.lock:
+            histogram = self.histograms.get(key)
+
+            if not histogram:
+                histogram = {
+                    'buckets': [0] * len(self.buckets),
+                    'count': 0,
+                    'sum': 0.0
+                }
+
+                self.histograms[key] = histogram
+
+            for i, bucket in enumerate(self.buckets):
+                if seconds <= bucket:
+                    histogram['buckets'][i] += 1
+
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    def getKey(self, name, labels):
+        if not labels:
+            return (name, ())
+
+        return (name, tuple(sorted(labels.items())))
+
+    def toPrometheus(self):
+        lines = []
+
+        with self.lock:
+            lines.append(f'articles_uptime_seconds {time.time() - self.started}')
+
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'articles_{name}{self.formatLabels(labels)} {value}')
+
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f'articles_{name}{self.formatLabels(labels)} {value}')
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bucket, count in zip(self.buckets, histogram['buckets']):
+                    lines.append(f'articles_{name}_bucket{self.formatLabels(labels + (("le", str(bucket)),))} {count}')
+
+                lines.append(f'articles_{name}_bucket{self.formatLabels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'articles_{name}_sum{self.formatLabels(labels)} {histogram["sum"]}')
+                lines.append(f'articles_{name}_count{self.formatLabels(labels)} {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def formatLabels(self, labels):
+        if not labels:
+            return ''
+
+        fields = []
+
+        for key, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            fields.append(f'{key}="{value}"')
+
+        return '{' + ','.join(fields) + '}'
+
+    # per stage totals plus everything by host
+    def toJson(self):
+        elapsed = time.time() - self.started
+
+        stages = {}
+
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                if not name in ['requests_total', 'bytes_total']:
+                    continue
+
+                labels = dict(labels)
+                stage = stages.setdefault(labels.get('stage', ''), {'requests': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0})
+
+                if name == 'requests_total':
+                    stage['requests'] += value
+
+                    if labels.get('status') in ['error', '4xx', '5xx']:
+                        stage['errors'] += value
+                elif name == 'bytes_total':
+                    stage['bytes'] += value
+
+            for (name, labels), histogram in self.histograms.items():
+                if name != 'request_seconds':
+                    continue
+
+                labels = dict(labels)
+                stage = stages.setdefault(labels.get('stage', ''), {'requests': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0})
+                stage['seconds'] += histogram['sum']
+
+            for stage in stages.values():
+                stage['averageSeconds'] = stage['seconds'] / stage['requests'] if stage['requests'] else 0
+                stage['bytesPerSecond'] = stage['bytes'] / stage['seconds'] if stage['seconds'] else 0
+
+            result = {
+                'date': str(datetime.datetime.now()),
+                'uptimeSeconds': elapsed,
+                'stages': stages,
+                'counters': [self.toDictionary(key, value) for key, value in self.counters.items()],
+                'gauges': [self.toDictionary(key, value) for key, value in self.gauges.items()],
+                'histograms': [self.toDictionary(key, histogram) for key, histogram in self.histograms.items()],
+                'buckets': self.buckets
+            }
+
+        return result
+
+    def toDictionary(self, key, value):
+        name, labels = key
+
+        return {
+            'name': name,
+            'labels': dict(labels),
+            'value': value
+        }
+
+    def write(self):
+        if not self.outputDirectory:
+            return
+
+        try:
+            if self.formats:
+                os.makedirs(self.outputDirectory, exist_ok=True)
+
+            if 'prometheus' in self.formats:
+                self.writeAtomically(self.toPrometheus(), os.path.join(self.outputDirectory, 'metrics.prom'))
+
+            if 'json' in self.formats:
+                self.writeAtomically(json.dumps(self.toJson(), indent=4), os.path.join(self.outputDirectory, 'metrics.json'))
+        except Exception as e:
+            logging.error(e)
+
+    # so a reader never sees a half written file
+    def writeAtomically(self, s, fileName):
+        temporaryFileName = fileName + '.part'
+
+        with io.open(temporaryFileName, 'w', encoding='utf-8') as file:
+            file.write(s)
+
+        os.replace(temporaryFileName, fileName)
+
+    def start(self, outputDirectory, formats, intervalSeconds):
+        self.outputDirectory = outputDirectory
+        self.formats = [format.strip().lower() for format in formats.split(',') if format.strip()]
+
+        if not self.formats or intervalSeconds <= 0:
+            return
+
+        def writePeriodically():
+            while not self.stopped.wait(intervalSeconds):
+                self.write()
+
+        thread = threading.Thread(target=writePeriodically, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.write()
+
+    def logSummary(self):
+        for name, stage in sorted(self.toJson()['stages'].items()):
+            averageSeconds = '{:.3f}'.format(stage['averageSeconds'])
+            kilobytesPerSecond = '{:.1f}'.format(stage['bytesPerSecond'] / 1000)
+
+            logging.info(f'Stage {name}: {stage["requests"]} requests. {stage["errors"]} errors. Average {averageSeconds} seconds. {kilobytesPerSecond} kB/s.')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stopped = threading.Event()
+
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+        # upper bounds in seconds
+        self.buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+        self.outputDirectory = ''
+        self.formats = []
+
+# shared by everything in the process
+registry = Metrics()
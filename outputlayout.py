@@ -0,0 +1,227 @@
+import os
+import hashlib
+import logging
+import datetime
+import helpers
+from database import Database
+
+# where the pdf files go in the output directory
+#
+# flat puts every file in (site name)/(article id).pdf. sharded adds two levels
+# of directories named after the start of the sha-1 hash of the article id,
+# like (site name)/3f/a2/(article id).pdf, so no directory gets more than a few
+# files even with millions of articles. output_manifest.sqlite maps each
+# article id to its file so nothing has to walk the tree to find one. it's only
+# kept for the sharded layout or once --migrate has made it. the manifest is
+# only trusted to have every file once it's marked complete, which is when
+# --migrate finishes or when it was started in an output directory with no pdf
+# files yet.
+
+class OutputLayout:
+    layouts = ['flat', 'sharded']
+
+    # the directories --migrate looks in. other directories in the output directory aren't touched.
+    siteNames = ['biorxiv.org', 'medrxiv.org', 'nih.gov', 'arxiv.org']
+
+    def getFileName(self, siteName, articleId, layout=None):
+        layout = layout or self.layout
+
+        fileName = f'{articleId}.pdf'
+
+        if layout == 'sharded':
+            hash = hashlib.sha1(articleId.encode('utf-8')).hexdigest()
+
+            return os.path.join(self.directory, siteName, hash[0:2], hash[2:4], fileName)
+
+        return os.path.join(self.directory, siteName, fileName)
+
+    # the file if it's anywhere it could be, otherwise an empty string
+    def find(self, siteName, articleId):
+        if self.hasManifest():
+            row = self.getDatabase().getFirst('files', 'fileName', self.getWhere(siteName, articleId), '', '')
+
+            if row and os.path.exists(os.path.join(self.directory, row['fileName'])):
+                return os.path.join(self.directory, row['fileName'])
+
+        # files from before the manifest or before a layout change
+        for layout in [self.layout] + [layout for layout in self.layouts if layout != self.layout]:
+            fileName = self.getFileName(siteName, articleId, layout)
+
+            if os.path.exists(fileName):
+                return fileName
+
+        return ''
+
+    # for directoryToCheckForDuplicates. returns None if the manifest can't tell and the directory needs to be checked.
+    def hasArticle(self, articleId):
+        if not self.hasManifest():
+            return None
+
+        database = self.getDatabase()
+
+        articleId = articleId.replace("'", "''")
+
+        if database.getFirst('files', 'articleId', f"articleId = '{articleId}'", '', ''):
+            return True
+
+        # files from before the manifest aren't in it
+        if not self.isComplete():
+            return None
+
+        return False
+
+    def isComplete(self):
+        return bool(self.getDatabase().getFirst('status', 'value', "name = 'complete'", '', ''))
+
+    def setComplete(self):
+        database = self.getDatabase()
+
+        database.cursor.execute("insert or replace into status (name, value) values ('complete', '1')")
+        database.conn.commit()
+
+    # true if there's a pdf file anywhere in the output directory
+    def hasPdfFiles(self):
+        for fileName in helpers.listFiles(self.directory, False):
+            if fileName.endswith('.pdf'):
+                return True
+
+        return False
+
+    def add(self, siteName, articleId, fileName):
+        if not self.hasManifest():
+            return
+
+        self.addMany([(siteName, articleId, fileName)])
+
+    # items is a list of (site name, article id, file name). one transaction for all of them.
+    def addMany(self, items):
+        now = str(datetime.datetime.utcnow())
+
+        rows = [(siteName, articleId, os.path.relpath(fileName, self.directory), now) for siteName, articleId, fileName in items]
+
+        database = self.getDatabase()
+
+        database.cursor.executemany('insert or replace into files (siteName, articleId, fileName, gmDate) values (?, ?, ?, ?)', rows)
+        database.conn.commit()
+
+    # moves every pdf file in the site directories to where the current layout puts it and adds it to the manifest.
+    # siteNames are more sites to look for. skipDirectories are never touched, like a pdf store inside the output directory.
+    # returns a dictionary of old file name -> new file name.
+    def migrate(self, siteNames=[], skipDirectories=[]):
+        moved = {}
+        items = []
+
+        logging.info(f'Moving the pdf files in {self.directory} to the {self.layout} layout')
+
+        skipDirectories = [os.path.realpath(directory) for directory in skipDirectories if directory]
+
+        for siteName in sorted(set(name for name in self.siteNames + siteNames if name)):
+            siteDirectory = os.path.join(self.directory, siteName)
+
+            if not os.path.isdir(siteDirectory):
+                continue
+
+            if self.isInside(siteDirectory, skipDirectories):
+                logging.info(f'Skipping {siteDirectory}. It\'s the pdf store.')
+                continue
+
+            for fileName in helpers.listFiles(siteDirectory, False):
+                if not fileName.endswith('.pdf'):
+                    continue
+
+                articleId = helpers.fileNameOnly(fileName, False)
+                newFileName = self.getFileName(siteName, articleId)
+
+                if newFileName != fileName:
+                    if os.path.exists(newFileName):
+                        logging.error(f'Not moving {fileName}. {newFileName} already exists.')
+                        continue
+
+                    helpers.makeDirectory(os.path.dirname(newFileName))
+                    os.replace(fileName, newFileName)
+
+                    moved[fileName] = newFileName
+
+                items.append((siteName, articleId, newFileName))
+
+                if len(items) >= 1000:
+                    self.addMany(items)
+                    items = []
+
+            self.removeEmptyDirectories(siteDirectory)
+
+        if items:
+            self.addMany(items)
+
+        # every pdf file is in it now
+        self.setComplete()
+
+        logging.info(f'Moved {len(moved)} files')
+
+        return moved
+
+    # the shard directories the files were moved out of
+    def removeEmptyDirectories(self, directory):
+        for root, directories, files in os.walk(directory, topdown=False):
+            if root != directory and not os.listdir(root):
+                os.rmdir(root)
+
+    # true if directory is one of the others or inside one of them
+    def isInside(self, directory, others):
+        directory = os.path.realpath(directory)
+
+        for other in others:
+            if directory == other or directory.startswith(other + os.sep):
+                return True
+
+        return False
+
+    # only the sharded layout needs it. a flat output directory can still have one from --migrate.
+    def hasManifest(self):
+        return bool(self.database) or self.layout == 'sharded' or os.path.exists(self.getManifestFileName())
+
+    def getManifestFileName(self):
+        return os.path.join(self.directory, 'output_manifest.sqlite')
+
+    def getWhere(self, siteName, articleId):
+        siteName = siteName.replace("'", "''")
+        articleId = articleId.replace("'", "''")
+
+        return f"siteName = '{siteName}' and articleId = '{articleId}'"
+
+    # only created once something needs it
+    def getDatabase(self):
+        if not self.database:
+            helpers.makeDirectory(self.directory)
+
+            self.database = Database(self.getManifestFileName())
+            self.database.execute('create table if not exists files ( siteName text, articleId text, fileName text, gmDate text, primary key(siteName, articleId) )')
+            self.database.execute('create index if not exists filesArticleId on files (articleId)')
+            self.database.execute('create table if not exists status ( name text primary key, value text )')
+
+            # nothing to miss
+            if self.isNew:
+                self.setComplete()
+
+        return self.database
+
+    def close(self):
+        if self.database:
+            self.database.close()
+            self.database = None
+
+    def __init__(self, directory, layout='flat'):
+        self.directory = directory
+        self.database = None
+
+        if not layout in self.layouts:
+            logging.error(f'Unknown output layout: {layout}. Using flat.')
+            layout = 'flat'
+
+        self.layout = layout
+
+        # a sharded output directory that starts out empty gets a complete manifest
+        self.isNew = False
+
+        if self.layout == 'sharded' and not os.path.exists(self.getManifestFileName()):
+            self.isNew = not self.hasPdfFiles()
@@ -0,0 +1,121 @@
+import math
+import logging
+
+# estimates how much work a run would be from the number of results only
+#
+# each site and search term gets how many results the site has, how many of
+# them are already in the search index with a file, and from those the
+# requests, bytes and seconds it would take. bytes and seconds come from the
+# jobs table of past runs when there is one. otherwise they're rough guesses.
+
+class Planner:
+    # search results per search page
+    resultsPerPage = {
+        'nih.gov': 1000,
+        'arxiv.org': 1000
+    }
+
+    defaultResultsPerPage = 75
+
+    # requests to look up a result whether it's downloaded or not. pubmed has esummary, efetch and sci-hub.
+    requestsPerResult = {
+        'nih.gov': 3,
+        'arxiv.org': 0
+    }
+
+    defaultRequestsPerResult = 1
+
+    defaultPdfBytes = 1000 * 1000
+    defaultSecondsPerRequest = 0.5
+
+    # available is how many results the site has. alreadyHave is how many of those there are files for.
+    def add(self, siteName, keyword, available, alreadyHave):
+        maximumResults = self.maximumResults
+
+        toGet = available
+
+        if maximumResults != -1:
+            toGet = min(available, maximumResults)
+
+        newCount = max(0, toGet - alreadyHave)
+
+        requests = math.ceil(toGet / self.resultsPerPage.get(siteName, self.defaultResultsPerPage))
+        requests += toGet * self.requestsPerResult.get(siteName, self.defaultRequestsPerResult)
+
+        # the pdf files
+        requests += newCount
+
+        history = self.getHistory(siteName)
+
+        if history:
+            bytes = newCount * history['bytes']
+            seconds = newCount * history['seconds']
+        else:
+            bytes = newCount * self.defaultPdfBytes
+            seconds = requests * self.defaultSecondsPerRequest
+
+        self.rows.append({
+            'siteName': siteName,
+            'keyword': keyword,
+            'available': available,
+            'toGet': toGet,
+            'alreadyHave': min(alreadyHave, toGet),
+            'newCount': newCount,
+            'requests': requests,
+            'bytes': bytes,
+            'seconds': seconds,
+            'isGuess': not history
+        })
+
+    # bytes and seconds per new result on this site in past runs
+    def getHistory(self, siteName):
+        if siteName in self.histories:
+            return self.histories[siteName]
+
+        result = None
+
+        escapedSiteName = siteName.replace("'", "''")
+
+        rows = self.database.get('jobs', 'sum(seconds) as seconds, sum(newResults) as newResults, sum(bytes) as bytes', f"siteName = '{escapedSiteName}' and newResults > 0", '', '')
+
+        if rows and rows[0]['newResults']:
+            row = rows[0]
+
+            result = {
+                'seconds': row['seconds'] / row['newResults'],
+                'bytes': row['bytes'] / row['newResults']
+            }
+
+        self.histories[siteName] = result
+
+        return result
+
+    def printPlan(self, doneCount, seconds):
+        print('Site\tSearch terms\tAvailable\tTo get\tAlready have\tNew\tRequests\tMegabytes\tMinutes')
+
+        for row in self.rows:
+            minutes = row['seconds'] / 60
+            guess = '?' if row['isGuess'] else ''
+
+            print(f"{row['siteName']}\t{row['keyword']}\t{row['available']}\t{row['toGet']}\t{row['alreadyHave']}\t{row['newCount']}\t{row['requests']}\t{row['bytes'] / 1e6:.1f}{guess}\t{minutes:.1f}{guess}")
+
+        newCount = sum(row['newCount'] for row in self.rows)
+        requests = sum(row['requests'] for row in self.rows)
+        megabytes = sum(row['bytes'] for row in self.rows) / 1e6
+        minutes = sum(row['seconds'] for row in self.rows) / 60
+
+        if doneCount:
+            print(f'{doneCount} site and search term combinations are already done')
+
+        print(f'{newCount} new results. About {requests} requests, {megabytes:.1f} megabytes and {minutes:.1f} minutes.')
+
+        if any(row['isGuess'] for row in self.rows):
+            print('? means there are no past runs of that site to go by')
+
+        logging.info(f'Counted the results of {len(self.rows)} site and search term combinations in {seconds:.1f} seconds')
+
+    def __init__(self, database, maximumResults):
+        self.database = database
+        self.maximumResults = maximumResults
+        self.rows = []
+        self.histories = {}
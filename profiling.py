@@ -0,0 +1,180 @@
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import functools
+import helpers
+
+# used by --profile
+#
+# each stage gets its own cProfile in each thread that runs it. a stage is one
+# or more wrapped methods. only the innermost stage is profiled at any moment,
+# so a stage's numbers don't include the stages it calls. a stage's profiles
+# from all threads are merged at the end. python 3.12 and later allow only one
+# profiler at a time, so there other threads' stages are only sampled.
+# separately, a background thread samples every thread's stack and writes them
+# in the folded format that flamegraph.pl and speedscope read.
+class Profiler:
+    # each method is its own stage unless stage is given
+    def wrap(self, target, methodNames, stage=None):
+        for methodName in methodNames:
+            method = getattr(target, methodName, None)
+
+            if not method:
+                logging.error(f'Can\'t profile {methodName}. No such method.')
+                continue
+
+            self.profiles.setdefault(stage or methodName, [])
+
+            setattr(target, methodName, self.getWrapper(stage or methodName, method))
+
+    def getWrapper(self, stage, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            stack = self.getThreadStack()
+
+            if stack is None:
+                return method(*args, **kwargs)
+
+            if stack:
+                self.getThreadProfile(stack[-1]).disable()
+
+            stack.append(stage)
+
+            if not self.enable(self.getThreadProfile(stage)):
+                stack.pop()
+                return method(*args, **kwargs)
+
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.getThreadProfile(stage).disable()
+                stack.pop()
+
+                if stack:
+                    self.enable(self.getThreadProfile(stack[-1]))
+
+        return wrapper
+
+    # the stages running in this thread, innermost last. None if this thread can't be profiled.
+    def getThreadStack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+            self.local.profiles = {}
+
+        return self.local.stack
+
+    def getThreadProfile(self, stage):
+        profile = self.local.profiles.get(stage)
+
+        if not profile:
+            profile = cProfile.Profile()
+
+            self.local.profiles[stage] = profile
+
+            with self.lock:
+                self.profiles[stage].append(profile)
+
+        return profile
+
+    # false if another thread's profiler is active and python only allows one
+    def enable(self, profile):
+        try:
+            profile.enable()
+            return True
+        except ValueError as e:
+            logging.debug(f'Only sampling {threading.current_thread().name}. {e}')
+
+            self.local.stack = None
+            return False
+
+    def sample(self):
+        while not self.stopped.wait(self.sampleSeconds):
+            threadNames = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for threadId, frame in sys._current_frames().items():
+                # don't include this thread
+                if threadId == threading.get_ident():
+                    continue
+
+                stack = []
+
+                while frame:
+                    code = frame.f_code
+                    stack.append(f'{helpers.fileNameOnly(code.co_filename, True)}:{code.co_name}')
+                    frame = frame.f_back
+
+                stack.append(threadNames.get(threadId, str(threadId)))
+
+                key = ';'.join(reversed(stack))
+
+                with self.lock:
+                    self.samples[key] = self.samples.get(key, 0) + 1
+
+    def start(self):
+        thread = threading.Thread(target=self.sample, daemon=True)
+        thread.start()
+
+        self.started = time.time()
+
+    def stop(self):
+        self.stopped.set()
+
+        helpers.makeDirectory(self.directory)
+
+        for stage, profiles in self.profiles.items():
+            stats = None
+
+            # one for each thread that ran the stage
+            for profile in profiles:
+                try:
+                    if stats:
+                        stats.add(profile)
+                    else:
+                        stats = pstats.Stats(profile)
+                except TypeError:
+                    # never ran
+                    continue
+
+            if not stats:
+                continue
+
+            fileName = os.path.join(self.directory, f'profile{self.suffix}-{stage}.pstats')
+            stats.dump_stats(fileName)
+
+            # readable version
+            s = io.StringIO()
+            stats.stream = s
+            stats.sort_stats('cumulative').print_stats(30)
+            helpers.toFile(s.getvalue(), os.path.join(self.directory, f'profile{self.suffix}-{stage}.txt'))
+
+            logging.info(f'Wrote profile for {stage} to {fileName}')
+
+        fileName = os.path.join(self.directory, f'profile{self.suffix}.folded')
+
+        with self.lock:
+            lines = [f'{key} {count}' for key, count in sorted(self.samples.items())]
+
+        helpers.toFile('\n'.join(lines), fileName)
+
+        seconds = helpers.fixedDecimals(time.time() - self.started, 1)
+
+        logging.info(f'Wrote {sum(self.samples.values())} stack samples over {seconds} seconds to {fileName}')
+
+    def __init__(self, directory, suffix='', sampleMilliseconds=10):
+        self.directory = directory
+        self.suffix = suffix
+        self.sampleSeconds = sampleMilliseconds / 1000
+
+        # stage -> the profiles of the threads that ran it
+        self.profiles = {}
+        self.local = threading.local()
+        self.samples = {}
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.started = time.time()
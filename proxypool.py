@@ -0,0 +1,182 @@
+import time
+import socket
+import logging
+import threading
+import urllib.parse
+import metrics
+
+# spreads requests over several proxies so per-address rate limits add up
+#
+# each host sticks to one proxy, the one with the fewest hosts when the host
+# was first seen, so a site sees the same address for a run. with
+# proxyRequestsPerSecond, each proxy sends at most that many requests per
+# second to each host. a request that would go over goes through the host's
+# next proxy instead, or waits if they're all busy. so the total rate to a
+# host grows with the number of proxies. a proxy that doesn't answer several
+# times in a row is taken out until a background check can connect to it again.
+
+class Proxy:
+    def isDown(self):
+        return time.time() < self.downUntil
+
+    def __init__(self, url):
+        self.url = url
+
+        # without any user name and password
+        self.name = urllib.parse.urlparse(url).netloc.split('@')[-1]
+
+        self.requests = 0
+        self.errors = 0
+        self.consecutiveErrors = 0
+        self.downUntil = 0
+        self.hostCount = 0
+
+class ProxyPool:
+    probeTimeoutSeconds = 10
+
+    def configure(self, urls, requestsPerSecond, maximumErrors, probeSeconds):
+        with self.condition:
+            self.proxies = [Proxy(url.strip()) for url in urls.split(',') if url.strip()]
+            self.requestsPerSecond = requestsPerSecond
+            self.maximumErrors = maximumErrors
+            self.probeSeconds = probeSeconds
+
+            self.hosts = {}
+            self.nextRequestTimes = {}
+
+        if self.proxies and not self.probeThread:
+            self.probeThread = threading.Thread(target=self.probe, daemon=True)
+            self.probeThread.start()
+
+    def isEnabled(self):
+        return bool(self.proxies)
+
+    # waits until one of the host's proxies can send another request and returns it
+    def acquire(self, url):
+        host = urllib.parse.urlparse(url).netloc
+
+        with self.condition:
+            while True:
+                proxies = self.getProxiesInOrder(host)
+
+                if not self.requestsPerSecond:
+                    proxy = proxies[0]
+                    break
+
+                now = time.time()
+                interval = 1 / self.requestsPerSecond
+
+                proxy = None
+                earliest = None
+
+                for candidate in proxies:
+                    nextRequestTime = self.nextRequestTimes.get((candidate.name, host), 0)
+
+                    if nextRequestTime <= now:
+                        proxy = candidate
+                        self.nextRequestTimes[(candidate.name, host)] = max(now, nextRequestTime) + interval
+                        break
+
+                    if earliest is None or nextRequestTime < earliest:
+                        earliest = nextRequestTime
+
+                if proxy:
+                    break
+
+                metrics.registry.increment('proxy_waits_total', {'host': host})
+
+                self.condition.wait(earliest - now)
+
+            proxy.requests += 1
+
+        metrics.registry.increment('proxy_requests_total', {'proxy': proxy.name})
+
+        return proxy
+
+    # statusCode is 0 if there was no response
+    def release(self, proxy, url, statusCode):
+        with self.condition:
+            if statusCode == 0 or statusCode == 407:
+                proxy.errors += 1
+                proxy.consecutiveErrors += 1
+
+                if proxy.consecutiveErrors >= self.maximumErrors and not proxy.isDown():
+                    logging.info(f'Marking proxy {proxy.name} as down')
+                    proxy.downUntil = time.time() + self.probeSeconds
+
+                    metrics.registry.setGauge('proxy_down', 1, {'proxy': proxy.name})
+            else:
+                proxy.consecutiveErrors = 0
+
+            # the host is limiting this address. give it a rest.
+            if statusCode == 429 and self.requestsPerSecond:
+                key = (proxy.name, urllib.parse.urlparse(url).netloc)
+
+                self.nextRequestTimes[key] = max(self.nextRequestTimes.get(key, 0), time.time() + 1)
+
+    def getProxies(self, proxy):
+        return {
+            'http': proxy.url,
+            'https': proxy.url
+        }
+
+    # the host's own proxy first, then the others. down proxies are a last resort.
+    def getProxiesInOrder(self, host):
+        index = self.hosts.get(host)
+
+        if index is None:
+            index = min(range(len(self.proxies)), key=lambda i: self.proxies[i].hostCount)
+
+            self.proxies[index].hostCount += 1
+            self.hosts[host] = index
+
+        ordered = self.proxies[index:] + self.proxies[:index]
+
+        healthy = [proxy for proxy in ordered if not proxy.isDown()]
+        down = sorted([proxy for proxy in ordered if proxy.isDown()], key=lambda proxy: proxy.downUntil)
+
+        return healthy or down
+
+    # checks down proxies in the background so they can come back
+    def probe(self):
+        while True:
+            time.sleep(self.probeSeconds)
+
+            for proxy in list(self.proxies):
+                if not proxy.consecutiveErrors:
+                    continue
+
+                parsed = urllib.parse.urlparse(proxy.url)
+
+                try:
+                    with socket.create_connection((parsed.hostname, parsed.port or 80), timeout=self.probeTimeoutSeconds):
+                        pass
+
+                    logging.info(f'Proxy {proxy.name} is back up')
+
+                    with self.condition:
+                        proxy.consecutiveErrors = 0
+                        proxy.downUntil = 0
+
+                        self.condition.notify_all()
+
+                    metrics.registry.setGauge('proxy_down', 0, {'proxy': proxy.name})
+                except Exception as e:
+                    logging.debug(f'Proxy {proxy.name} is still down. {e}')
+
+                    with self.condition:
+                        proxy.downUntil = time.time() + self.probeSeconds
+
+    def logStatus(self):
+        for proxy in self.proxies:
+            status = 'down' if proxy.isDown() else 'up'
+
+            logging.info(f'Proxy {proxy.name}: {status}. Requests: {proxy.requests}. Errors: {proxy.errors}. Hosts: {proxy.hostCount}.')
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.probeThread = None
+
+        self.configure('', 0, 3, 60)
+
+pool = ProxyPool()
@@ -0,0 +1,131 @@
+import time
+import random
+import logging
+import threading
+import urllib.parse
+import metrics
+
+# decides whether a failed request is worth trying again
+#
+# failures are retried after an exponential backoff with full jitter: a random
+# delay between 0 and base * 2 ^ attempt seconds. every request adds a fraction
+# of a token to its host's retry budget and every retry takes a whole one, so
+# retries can't multiply the load on a host that's failing everything. after
+# enough failures in a row, the host's circuit breaker opens and requests to it
+# fail right away. once it has been open long enough, one request is let
+# through to test it.
+
+class CircuitOpenError(Exception):
+    pass
+
+class HostState:
+    def __init__(self, host, budget):
+        self.host = host
+        self.budget = budget
+        self.failures = 0
+        self.openUntil = 0.0
+
+        # a test request is in flight while it's half open
+        self.testing = False
+
+class RetryPolicy:
+    def configure(self, attempts, baseSeconds, maximumSeconds, budgetPercent, breakerFailures, breakerSeconds):
+        self.attempts = attempts
+        self.baseSeconds = baseSeconds
+        self.maximumSeconds = maximumSeconds
+        self.budgetPercent = budgetPercent
+        self.breakerFailures = breakerFailures
+        self.breakerSeconds = breakerSeconds
+
+    # raises CircuitOpenError if the host isn't being sent requests right now
+    def beforeRequest(self, url):
+        with self.lock:
+            state = self.getHostState(url)
+
+            state.budget = min(self.maximumBudget, state.budget + self.budgetPercent / 100)
+
+            if not state.openUntil:
+                return
+
+            if time.time() < state.openUntil or state.testing:
+                metrics.registry.increment('circuit_rejections_total', {'host': state.host})
+                raise CircuitOpenError(f'Not sending requests to {state.host} for now. Too many failures.')
+
+            # half open
+            state.testing = True
+
+    # returns how many seconds to wait before trying again, or None to give up
+    def getRetryDelay(self, url, attempt, response, error):
+        statusCode = response.status_code if response is not None else 0
+
+        failed = error is not None or statusCode == 429 or statusCode >= 500
+
+        with self.lock:
+            state = self.getHostState(url)
+
+            self.recordResult(state, failed)
+
+            if not failed or isinstance(error, CircuitOpenError):
+                return None
+
+            if attempt >= self.attempts:
+                return None
+
+            if state.budget < 1:
+                metrics.registry.increment('retries_refused_total', {'host': state.host})
+                return None
+
+            state.budget -= 1
+
+        delay = random.uniform(0, min(self.maximumSeconds, self.baseSeconds * 2 ** attempt))
+
+        # the server knows best
+        retryAfter = response.headers.get('retry-after', '') if response is not None else ''
+
+        if retryAfter.isdigit():
+            delay = max(delay, min(self.maximumSeconds, int(retryAfter)))
+
+        metrics.registry.increment('retries_total', {'host': state.host})
+
+        return delay
+
+    def recordResult(self, state, failed):
+        state.testing = False
+
+        if not failed:
+            if state.openUntil:
+                logging.info(f'Circuit breaker for {state.host} closed')
+
+            state.failures = 0
+            state.openUntil = 0.0
+            return
+
+        state.failures += 1
+
+        if state.failures >= self.breakerFailures and (not state.openUntil or time.time() >= state.openUntil):
+            state.openUntil = time.time() + self.breakerSeconds
+
+            logging.info(f'Circuit breaker for {state.host} open for {self.breakerSeconds} seconds. {state.failures} failures in a row.')
+
+            metrics.registry.increment('circuit_opened_total', {'host': state.host})
+
+    def getHostState(self, url):
+        host = urllib.parse.urlparse(url).netloc
+
+        state = self.hosts.get(host)
+
+        if not state:
+            # enough for a few retries right away
+            state = HostState(host, self.maximumBudget)
+            self.hosts[host] = state
+
+        return state
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.maximumBudget = 10
+
+        self.configure(3, 1, 30, 20, 5, 60)
+
+policy = RetryPolicy()
@@ -0,0 +1,124 @@
+import time
+import logging
+import threading
+import helpers
+from helpers import Api
+
+class Mirror:
+    # lower is better. errors count much more than latency.
+    def score(self):
+        return self.latency * (1 + 10 * self.errorRate)
+
+    def isDown(self):
+        return time.time() < self.downUntil
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.api = Api(self.url)
+
+        # the pool tries the next mirror instead
+        self.api.retry = False
+
+        # exponentially weighted averages
+        self.latency = 1.0
+        self.errorRate = 0.0
+
+        self.requests = 0
+        self.consecutiveErrors = 0
+        self.downUntil = 0
+
+class SciHubPool:
+    # returns the response and the mirror that gave it. the response is empty if all mirrors failed.
+    # isAnswer tells a real answer from something like a captcha or an error page. the next mirror is tried then.
+    def post(self, url, data, isAnswer=None):
+        for mirror in self.getMirrorsInOrder():
+            start = time.time()
+
+            # the lookups share the mirror's api
+            response, statusCode = mirror.api.postWithStatusCode(url, data, False, 'sci-hub')
+
+            if response and 200 <= statusCode < 400:
+                if not isAnswer or isAnswer(response):
+                    self.onSuccess(mirror, time.time() - start)
+                    return response, mirror
+
+                logging.error(f'Sci-hub mirror {mirror.url} failed. The page has no pdf file and doesn\'t say the article isn\'t there.')
+            else:
+                logging.error(f'Sci-hub mirror {mirror.url} failed. Status code: {statusCode}.')
+
+            self.onError(mirror, time.time() - start)
+
+        return '', None
+
+    # healthy mirrors first, best score first. down mirrors are a last resort.
+    def getMirrorsInOrder(self):
+        with self.lock:
+            healthy = [mirror for mirror in self.mirrors if not mirror.isDown()]
+            down = [mirror for mirror in self.mirrors if mirror.isDown()]
+
+            healthy.sort(key=lambda mirror: mirror.score())
+            down.sort(key=lambda mirror: mirror.downUntil)
+
+            return healthy + down
+
+    def onSuccess(self, mirror, seconds):
+        with self.lock:
+            mirror.requests += 1
+            mirror.latency = self.smoothing * seconds + (1 - self.smoothing) * mirror.latency
+            mirror.errorRate = (1 - self.smoothing) * mirror.errorRate
+            mirror.consecutiveErrors = 0
+            mirror.downUntil = 0
+
+    def onError(self, mirror, seconds):
+        with self.lock:
+            mirror.requests += 1
+            mirror.latency = self.smoothing * seconds + (1 - self.smoothing) * mirror.latency
+            mirror.errorRate = self.smoothing + (1 - self.smoothing) * mirror.errorRate
+            mirror.consecutiveErrors += 1
+
+            if mirror.consecutiveErrors >= self.maximumErrors:
+                logging.info(f'Marking sci-hub mirror {mirror.url} as down')
+                mirror.downUntil = time.time() + self.probeSeconds
+
+    # checks down mirrors in the background so they can come back
+    def probe(self):
+        while True:
+            time.sleep(self.probeSeconds)
+
+            for mirror in list(self.mirrors):
+                if not mirror.consecutiveErrors:
+                    continue
+
+                # separate object so it doesn't interfere with lookups
+                api = Api(mirror.url)
+
+                start = time.time()
+
+                response, statusCode = api.getWithStatusCode('/', 'sci-hub probe')
+
+                if 200 <= statusCode < 400:
+                    logging.info(f'Sci-hub mirror {mirror.url} is back up')
+                    self.onSuccess(mirror, time.time() - start)
+                else:
+                    self.onError(mirror, time.time() - start)
+
+    def logStatus(self):
+        for mirror in self.getMirrorsInOrder():
+            status = 'down' if mirror.isDown() else 'up'
+            latency = helpers.fixedDecimals(mirror.latency, 2)
+            errorRate = helpers.fixedDecimals(mirror.errorRate, 2)
+
+            logging.info(f'Sci-hub mirror {mirror.url}: {status}. Requests: {mirror.requests}. Latency: {latency} seconds. Error rate: {errorRate}.')
+
+    def __init__(self, urls, probeSeconds=60, maximumErrors=3):
+        self.mirrors = [Mirror(url.strip()) for url in urls.split(',') if url.strip()]
+        self.probeSeconds = probeSeconds
+        self.maximumErrors = maximumErrors
+
+        # weight of the newest sample in the averages
+        self.smoothing = 0.3
+
+        self.lock = threading.Lock()
+
+        thread = threading.Thread(target=self.probe, daemon=True)
+        thread.start()
@@ -0,0 +1,135 @@
+import csv
+import time
+import logging
+import datetime
+from database import Database
+from article import Article
+
+# full-text index of everything that was logged to the pdf log
+#
+# the documents table holds one row per site and article id. documentText is
+# an fts5 index over its title, abstract, authors, locations and citations
+# that the triggers keep up to date.
+
+class SearchIndex:
+    columns = ['siteName', 'articleId', 'keyword', 'pdfUrl', 'title', 'dateSubmitted', 'abstract', 'allAuthors', 'allLocations', 'firstAuthor', 'firstAuthorLocation', 'lastAuthor', 'lastAuthorLocation', 'citations', 'fileName', 'gmDate']
+
+    textColumns = ['title', 'abstract', 'allAuthors', 'allLocations', 'citations']
+
+    def add(self, siteName, keyword, article, fileName):
+        pdfUrl = article.pdfUrl
+
+        # 'binary', 'existing' and errors only mean something in this run and output directory
+        if not pdfUrl.startswith('http'):
+            pdfUrl = ''
+
+        item = {
+            'siteName': siteName,
+            'articleId': article.articleId,
+            'keyword': keyword,
+            'pdfUrl': pdfUrl,
+            'title': article.title or '',
+            'dateSubmitted': article.dateSubmitted or '',
+            'abstract': article.abstract or '',
+            'fileName': fileName,
+            'gmDate': str(datetime.datetime.utcnow())
+        }
+
+        for field, value in zip(Article.detailFields, article.getDetails()):
+            item[field] = value
+
+        # the delete trigger removes it from the text index too
+        self.database.execute(f"delete from documents where {self.getWhere(siteName, article.articleId)}")
+        self.database.insert('documents', item)
+
+    # imports an existing output_pdf_log.csv
+    def addCsvFile(self, fileName):
+        count = 0
+
+        with open(fileName, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+
+            # the header
+            next(reader, None)
+
+            for row in reader:
+                if len(row) < 11:
+                    continue
+
+                details = dict(zip(Article.detailFields, row[11:]))
+
+                article = Article(row[5], '', row[6], row[7], row[8], details)
+
+                self.add(row[2], row[1], article, row[10])
+
+                count += 1
+
+        logging.info(f'Added {count} results from {fileName} to the search index')
+
+    # rows from the documents table that match a full-text query, best first
+    def getMatches(self, query, siteName='', limit=100):
+        query = query.replace("'", "''")
+        siteName = siteName.replace("'", "''")
+
+        where = f"documentText match '{query}'"
+
+        if siteName:
+            where += f" and documents.siteName = '{siteName}'"
+
+        return self.database.get('documentText join documents on documents.id = documentText.rowid', 'documents.*', where, 'rank', '', limit)
+
+    # how many results of a site and keyword have a file
+    def getFileCount(self, siteName, keyword):
+        siteName = siteName.replace("'", "''")
+        keyword = keyword.replace("'", "''")
+
+        rows = self.database.get('documents', 'count(*) as count', f"siteName = '{siteName}' and keyword = '{keyword}' and fileName not in ('', 'NaN', 'Nan')", '', '')
+
+        return rows[0]['count'] if rows else 0
+
+    # the pdf url is empty if it needs looking up again
+    def getArticle(self, row):
+        details = {field: row.get(field, '') for field in Article.detailFields}
+
+        return Article(row.get('articleId', ''), row.get('pdfUrl', '') or '', row.get('title', ''), row.get('dateSubmitted', ''), row.get('abstract', ''), details, row.get('siteName', ''), row.get('keyword', ''))
+
+    def printMatches(self, query, limit):
+        start = time.time()
+
+        rows = self.getMatches(query, '', limit)
+
+        milliseconds = (time.time() - start) * 1000
+
+        for row in rows:
+            print(f"{row['siteName']}\t{row['articleId']}\t{row['dateSubmitted']}\t{row['title']}\t{row['fileName']}")
+
+        print(f'{len(rows)} matches in {milliseconds:.1f} milliseconds')
+
+    # moved is a dictionary of old file name -> new file name
+    def renameFiles(self, moved):
+        self.database.cursor.executemany('update documents set fileName = ? where fileName = ?', [(new, old) for old, new in moved.items()])
+        self.database.conn.commit()
+
+    def getWhere(self, siteName, articleId):
+        siteName = siteName.replace("'", "''")
+        articleId = articleId.replace("'", "''")
+
+        return f"siteName = '{siteName}' and articleId = '{articleId}'"
+
+    def close(self):
+        self.database.close()
+
+    def __init__(self, fileName):
+        self.database = Database(fileName)
+
+        columns = ', '.join(f'{column} text' for column in self.columns)
+        textColumns = ', '.join(self.textColumns)
+        newValues = ', '.join(f'new.{column}' for column in self.textColumns)
+        oldValues = ', '.join(f'old.{column}' for column in self.textColumns)
+
+        self.database.execute(f'create table if not exists documents ( id integer primary key, {columns}, unique(siteName, articleId) )')
+        self.database.execute('create index if not exists documentsFileName on documents (fileName)')
+        self.database.execute(f"create virtual table if not exists documentText using fts5( {textColumns}, content='documents', content_rowid='id', tokenize='porter unicode61' )")
+
+        self.database.execute(f'create trigger if not exists documentsInsert after insert on documents begin insert into documentText(rowid, {textColumns}) values (new.id, {newValues}); end')
+        self.database.execute(f"create trigger if not exists documentsDelete after delete on documents begin insert into documentText(documentText, rowid, {textColumns}) values ('delete', old.id, {oldValues}); end")
@@ -0,0 +1,93 @@
+import time
+import random
+import logging
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import helpers
+
+# a local stand-in for sci-hub mirrors
+#
+# python stubserver.py --port 8001 --latency 0.2 --failureRate 0.1 --missRate 0.3 --captchaRate 0.1
+#
+# then use sciHubMirrors=http://localhost:8001 in options.ini
+
+def getDummyPdf(articleId):
+    body = f'1 0 obj\n<< /Title ({articleId}) >>\nendobj\n'
+    header = '%PDF-1.4\n'
+    xrefOffset = len(header) + len(body)
+
+    return (header + body + f'xref\n0 1\ntrailer\n<< /Size 1 >>\nstartxref\n{xrefOffset}\n%%EOF\n').encode('latin-1')
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.wait()
+
+        path = urllib.parse.urlparse(self.path).path
+
+        if self.shouldFail():
+            self.reply(503, 'text/html', b'<html><body>Service unavailable</body></html>')
+        elif path.startswith('/downloads/') and path.endswith('.pdf'):
+            articleId = helpers.fileNameOnly(path, False)
+            self.reply(200, 'application/pdf', getDummyPdf(articleId))
+        elif path == '/':
+            self.reply(200, 'text/html', b'<html><body>sci-hub stub</body></html>')
+        else:
+            self.reply(404, 'text/html', b'<html><body>Not found</body></html>')
+
+    def do_POST(self):
+        self.wait()
+
+        length = int(self.headers.get('content-length', 0))
+        fields = urllib.parse.parse_qs(self.rfile.read(length).decode('utf-8'))
+        articleId = fields.get('request', [''])[0]
+
+        if self.shouldFail():
+            self.reply(503, 'text/html', b'<html><body>Service unavailable</body></html>')
+        elif random.random() < self.server.captchaRate:
+            self.reply(200, 'text/html', b'<html><body><p>Checking your browser. Are you a robot?</p></body></html>')
+        elif not articleId or random.random() < self.server.missRate:
+            self.reply(200, 'text/html', b'<html><body><p>article not found</p></body></html>')
+        else:
+            host = self.headers.get('host', '')
+            page = f'<html><body><div id="buttons"><ul><li><a href="#" onclick="location.href=\'//{host}/downloads/{articleId}.pdf\'">save</a></li></ul></div></body></html>'
+            self.reply(200, 'text/html', page.encode('utf-8'))
+
+    def wait(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def shouldFail(self):
+        return random.random() < self.server.failureRate
+
+    def reply(self, statusCode, contentType, body):
+        self.send_response(statusCode)
+        self.send_header('content-type', contentType)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+def startServer(port=0, latency=0.0, failureRate=0.0, missRate=0.0, captchaRate=0.0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failureRate = failureRate
+    server.missRate = missRate
+    server.captchaRate = captchaRate
+
+    return server
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    server = startServer(int(helpers.getArgument('--port', False) or 8001),
+        helpers.stringToFloatingPoint(helpers.getArgument('--latency', False)),
+        helpers.stringToFloatingPoint(helpers.getArgument('--failureRate', False)),
+        helpers.stringToFloatingPoint(helpers.getArgument('--missRate', False)),
+        helpers.stringToFloatingPoint(helpers.getArgument('--captchaRate', False)))
+
+    logging.info(f'Listening on http://127.0.0.1:{server.server_address[1]}')
+
+    server.serve_forever()
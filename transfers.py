@@ -0,0 +1,114 @@
+import time
+import socket
+import logging
+import threading
+
+# aborts downloads that are still connected but hardly sending anything
+#
+# a read timeout only catches a connection that goes completely silent. this
+# checks every transfer once a second. if a transfer got less than
+# minimumBytesPerSecond on average over the last windowSeconds, its socket is
+# shut down so the blocked read in the downloading thread fails right away.
+
+class Transfer:
+    def __init__(self, url, response):
+        self.url = url
+        self.response = response
+        self.byteCount = 0
+        self.windowStart = time.time()
+        self.windowByteCount = 0
+        self.stalled = False
+
+    def progress(self, byteCount):
+        self.byteCount += byteCount
+
+class TransferWatchdog:
+    def configure(self, windowSeconds, minimumBytesPerSecond):
+        self.windowSeconds = windowSeconds
+        self.minimumBytesPerSecond = minimumBytesPerSecond
+
+    def watch(self, url, response):
+        transfer = Transfer(url, response)
+
+        if not self.windowSeconds or not self.minimumBytesPerSecond:
+            return transfer
+
+        with self.lock:
+            self.transfers.append(transfer)
+
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, name='transfer watchdog', daemon=True)
+                self.thread.start()
+
+        return transfer
+
+    def unwatch(self, transfer):
+        with self.lock:
+            if transfer in self.transfers:
+                self.transfers.remove(transfer)
+
+    def run(self):
+        while True:
+            time.sleep(1)
+
+            with self.lock:
+                transfers = list(self.transfers)
+
+            now = time.time()
+
+            for transfer in transfers:
+                elapsed = now - transfer.windowStart
+
+                if elapsed < self.windowSeconds:
+                    continue
+
+                bytesPerSecond = (transfer.byteCount - transfer.windowByteCount) / elapsed
+
+                if bytesPerSecond < self.minimumBytesPerSecond:
+                    logging.error(f'Aborting {transfer.url}. {bytesPerSecond:.0f} bytes per second over the last {elapsed:.0f} seconds.')
+
+                    transfer.stalled = True
+
+                    self.unwatch(transfer)
+                    self.abort(transfer.response)
+                else:
+                    transfer.windowStart = now
+                    transfer.windowByteCount = transfer.byteCount
+
+    def abort(self, response):
+        try:
+            # closing isn't enough to wake up a thread that's blocked reading the socket
+            sock = self.getSocket(response)
+
+            if sock:
+                sock.shutdown(socket.SHUT_RDWR)
+        except Exception as e:
+            logging.debug(e)
+
+        try:
+            response.close()
+        except Exception as e:
+            logging.debug(e)
+
+    # the socket under a requests response, if it can be found
+    def getSocket(self, response):
+        raw = getattr(response, 'raw', None)
+
+        sock = getattr(getattr(raw, 'connection', None), 'sock', None)
+
+        if sock:
+            return sock
+
+        # the http.client response's file object
+        fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+
+        return getattr(getattr(fp, 'raw', None), '_sock', None)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transfers = []
+        self.thread = None
+
+        self.configure(30, 1000)
+
+transferWatchdog = TransferWatchdog()
@@ -0,0 +1,115 @@
+import logging
+import threading
+import urllib.parse
+import metrics
+
+# the connections every request goes over
+#
+# http/1.1 requests share one requests.Session, so connections to a host are
+# kept alive and reused instead of opening a new one for every request. with
+# the http2 option, requests without a proxy that aren't streamed go over
+# httpx instead. one http/2 connection per host carries all the requests in
+# flight to it at once. a host that fails over http/2 for any reason other
+# than a timeout gets http/1.1 from then on.
+
+class Transport:
+    # 0 means http/1.1 only. 1 means negotiate http/2 over tls. 2 means http/2 with prior knowledge, for plain http test servers.
+    def configure(self, http2):
+        self.http2 = http2
+
+    def request(self, method, url, headers, proxies, data, stream, timeout):
+        if self.http2 and not stream and not proxies:
+            client = self.getHttp2Client()
+
+            host = urllib.parse.urlparse(url).netloc
+
+            if client and host not in self.http1Hosts:
+                try:
+                    return self.requestHttp2(client, method, url, headers, data, timeout)
+                except Exception as e:
+                    import httpx
+
+                    # the host is there. it's just slow.
+                    if isinstance(e, httpx.TimeoutException):
+                        raise
+
+                    logging.info('Using http/1.1 for %s. Http/2 failed: %s', host, e)
+
+                    with self.lock:
+                        self.http1Hosts.add(host)
+
+        metrics.registry.increment('requests_by_protocol_total', {'protocol': 'http/1.1'})
+
+        return self.getSession().request(method, url, headers=headers, proxies=proxies, data=data, stream=stream, timeout=timeout)
+
+    def requestHttp2(self, client, method, url, headers, data, timeout):
+        import httpx
+        from archive import ReplayResponse
+
+        # httpx sets its own
+        headers = {key: value for key, value in (headers or {}).items() if key.lower() not in ['te', 'connection', 'upgrade-insecure-requests']}
+
+        response = client.request(method, url, headers=headers, data=data, timeout=httpx.Timeout(timeout[1], connect=timeout[0]))
+
+        metrics.registry.increment('requests_by_protocol_total', {'protocol': response.http_version.lower()})
+
+        # just enough of requests.Response for the rest of the app
+        return ReplayResponse(str(response.url), response.status_code, response.headers, response.content)
+
+    def getSession(self):
+        with self.lock:
+            if not self.session:
+                import requests
+                import http.cookiejar
+
+                self.session = requests.Session()
+
+                # every request used to start without cookies
+                self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+                # enough connections for the details page threads and the download threads
+                adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20)
+
+                self.session.mount('http://', adapter)
+                self.session.mount('https://', adapter)
+
+            return self.session
+
+    def getHttp2Client(self):
+        with self.lock:
+            if self.http2Client is None:
+                try:
+                    import httpx
+
+                    if self.http2 == 2:
+                        self.http2Client = httpx.Client(http1=False, http2=True)
+                    else:
+                        self.http2Client = httpx.Client(http2=True)
+                except Exception as e:
+                    logging.error('Can\'t use http/2. Install httpx[http2]. Using http/1.1. %s', e)
+
+                    # don't try again
+                    self.http2Client = False
+
+            return self.http2Client
+
+    def close(self):
+        with self.lock:
+            if self.session:
+                self.session.close()
+                self.session = None
+
+            if self.http2Client:
+                self.http2Client.close()
+
+            self.http2Client = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.session = None
+        self.http2Client = None
+        self.http1Hosts = set()
+
+        self.configure(0)
+
+transport = Transport()
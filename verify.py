@@ -0,0 +1,172 @@
+import os
+import csv
+import logging
+import hashlib
+import multiprocessing
+import helpers
+
+# checks one pdf file. runs in a worker process.
+def verifyPdfFile(fileName):
+    result = {
+        'fileName': fileName,
+        'size': '',
+        'modified': '',
+        'sha256': '',
+        'status': 'OK'
+    }
+
+    try:
+        statinfo = os.stat(fileName)
+
+        result['size'] = str(statinfo.st_size)
+        result['modified'] = str(statinfo.st_mtime_ns)
+
+        sha256 = hashlib.sha256()
+
+        with open(fileName, 'rb') as file:
+            head = file.read(1024)
+
+            sha256.update(head)
+
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+
+            result['sha256'] = sha256.hexdigest()
+
+            # the pdf header can be anywhere in the first 1024 bytes
+            if not b'%PDF-' in head:
+                result['status'] = 'No pdf header'
+                return result
+
+            # the trailer is at the very end, give or take some whitespace
+            tailSize = min(statinfo.st_size, 2048)
+            file.seek(-tailSize, os.SEEK_END)
+            tail = file.read(tailSize)
+
+            if not b'%%EOF' in tail:
+                result['status'] = 'Truncated'
+                return result
+
+            result['status'] = getXrefStatus(file, tail, statinfo.st_size)
+    except Exception as e:
+        logging.error(e)
+        result['status'] = 'Unreadable'
+
+    return result
+
+# startxref points to either a classic xref table or an xref stream object
+def getXrefStatus(file, tail, fileSize):
+    index = tail.rfind(b'startxref')
+
+    # can't check it. the header and trailer are fine though.
+    if index == -1:
+        return 'OK'
+
+    offset = helpers.numbersOnly(tail[index + len('startxref'):].split(b'%%EOF')[0].decode('latin-1'))
+
+    if not offset or int(offset) >= fileSize:
+        return 'Bad xref'
+
+    file.seek(int(offset))
+    start = file.read(32).lstrip()
+
+    if start.startswith(b'xref'):
+        return 'OK'
+
+    # "12 0 obj" for an xref stream
+    fields = start.split()
+
+    if len(fields) >= 3 and fields[0].isdigit() and fields[1].isdigit() and fields[2].startswith(b'obj'):
+        return 'OK'
+
+    return 'Bad xref'
+
+class PdfVerifier:
+    def run(self):
+        logging.info(f'Verifying pdf files in {self.directory}')
+
+        previous = self.readManifest()
+        manifest = {}
+        toCheck = []
+
+        for fileName in helpers.listFiles(self.directory, False):
+            if not fileName.lower().endswith('.pdf'):
+                continue
+
+            relativeName = os.path.relpath(fileName, self.directory)
+
+            row = previous.get(relativeName, {})
+
+            # only check files that changed since the last run
+            try:
+                statinfo = os.stat(fileName)
+
+                if row and row.get('Size') == str(statinfo.st_size) and row.get('Modified') == str(statinfo.st_mtime_ns):
+                    manifest[relativeName] = row
+                    continue
+            except Exception as e:
+                logging.error(e)
+
+            toCheck.append(fileName)
+
+        logging.info(f'Files to check: {len(toCheck)}. Unchanged since last check: {len(manifest)}.')
+
+        if toCheck:
+            with multiprocessing.Pool(self.processes or None) as pool:
+                for i, result in enumerate(pool.imap_unordered(verifyPdfFile, toCheck, chunksize=16)):
+                    relativeName = os.path.relpath(result['fileName'], self.directory)
+
+                    if result['status'] != 'OK':
+                        logging.error(f'{relativeName}: {result["status"]}')
+
+                    manifest[relativeName] = {
+                        'File': relativeName,
+                        'Size': result['size'],
+                        'Modified': result['modified'],
+                        'SHA-256': result['sha256'],
+                        'Status': result['status']
+                    }
+
+                    if (i + 1) % 1000 == 0:
+                        logging.info(f'Checked {i + 1} of {len(toCheck)}')
+
+        self.writeManifest(manifest)
+
+        bad = [row for row in manifest.values() if row.get('Status') != 'OK']
+
+        logging.info(f'Verified {len(manifest)} pdf files. Problems: {len(bad)}. Manifest: {self.manifestFileName}.')
+
+        return manifest
+
+    def readManifest(self):
+        result = {}
+
+        if not os.path.exists(self.manifestFileName):
+            return result
+
+        try:
+            with open(self.manifestFileName, newline='', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    result[row.get('File', '')] = row
+        except Exception as e:
+            logging.error(e)
+
+        return result
+
+    def writeManifest(self, manifest):
+        temporaryFileName = self.manifestFileName + '.part'
+
+        with open(temporaryFileName, 'w', newline='\n', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=self.fields, extrasaction='ignore')
+            writer.writeheader()
+
+            for key in sorted(manifest):
+                writer.writerow(manifest[key])
+
+        os.replace(temporaryFileName, self.manifestFileName)
+
+    def __init__(self, directory, processes=0):
+        self.directory = directory
+        self.processes = processes
+        self.manifestFileName = os.path.join(directory, 'output_pdf_manifest.csv')
+        self.fields = ['File', 'Size', 'Modified', 'SHA-256', 'Status']